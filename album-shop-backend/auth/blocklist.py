@@ -0,0 +1,155 @@
+from datetime import datetime, timedelta
+from sqlalchemy import select, delete, or_, and_
+from sqlalchemy.exc import SQLAlchemyError
+from db.app import db, BlacklistToken
+from db.jobs import job_queue
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+# In-process cache of revoked token ids (jti -> expiry timestamp).
+# Lookups don't touch the database while the cache is fresh: it is loaded from
+# the BlacklistToken table on its first lookup in each process (or at worker
+# warm-up), updated directly on /logout, and a background thread reloads every
+# unexpired row every `sync_interval` seconds, which picks up revocations by other
+# workers whatever order their rows committed in. If the last successful load is
+# older than `max_staleness` seconds (the database was unreachable, say), tokens
+# the cache doesn't know are looked up in the table instead. Expired rows are
+# deleted by the scheduled prune-blocklist job, so the table stays small.
+class RevokedTokenCache:
+    def __init__(self, sync_interval=2, max_staleness=10):
+        self.sync_interval = sync_interval
+        self.max_staleness = max_staleness
+        self.token_lifetime = timedelta(minutes=15)
+        self._lock = threading.Lock()
+        self._expiry = {}
+        self._synced_at = None  # time.monotonic() of the last successful load
+        self._app = None
+        self._db = None
+        self._worker_pid = None
+
+    def init_app(self, app, db):
+        self._app = app
+        self._db = db
+        self.sync_interval = app.config.get('BLOCKLIST_SYNC_SECONDS', self.sync_interval)
+        self.max_staleness = app.config.get('BLOCKLIST_MAX_STALENESS_SECONDS', self.max_staleness)
+        lifetime = app.config.get('JWT_ACCESS_TOKEN_EXPIRES', self.token_lifetime)
+        if isinstance(lifetime, timedelta):
+            self.token_lifetime = lifetime
+
+    def __len__(self):
+        return len(self._expiry)
+
+    # Record a revocation made by this worker (expires_at is the JWT `exp` claim)
+    def add(self, jti, expires_at):
+        with self._lock:
+            self._expiry[jti] = float(expires_at)
+
+    def is_revoked(self, jti, now=None):
+        self.start()
+        now = time.time() if now is None else now
+        expires_at = self._expiry.get(jti)
+        if expires_at is None:
+            return self.stale() and self._lookup(jti, now)
+        if expires_at <= now:
+            # The token is past its own expiry, so the entry is no longer needed
+            with self._lock:
+                self._expiry.pop(jti, None)
+            return False
+        return True
+
+    # True when revocations by other workers may be missing from the cache
+    def stale(self):
+        synced_at = self._synced_at
+        return synced_at is None or time.monotonic() - synced_at > self.max_staleness
+
+    # Check one token against the table, for when the cache can't be trusted
+    def _lookup(self, jti, now):
+        table = BlacklistToken.__table__
+        row = self._db.session.execute(
+            select(table.c.expires_at, table.c.created_at).where(table.c.jti == jti)
+        ).first()
+        if row is None:
+            return False
+        expires_at = self._expires_at(row)
+        if expires_at <= now:
+            return False
+        self.add(jti, expires_at)
+        return True
+
+    def _expires_at(self, row):
+        return _timestamp(row.expires_at or (row.created_at or datetime.utcnow()) + self.token_lifetime)
+
+    # Reload every unexpired revocation, including those written by other workers,
+    # and drop expired entries
+    def sync(self, engine, now=None):
+        now = time.time() if now is None else now
+        started = time.monotonic()
+        table = BlacklistToken.__table__
+        with engine.connect() as conn:
+            rows = conn.execute(
+                select(table.c.jti, table.c.expires_at, table.c.created_at)
+                .where(or_(table.c.expires_at.is_(None), table.c.expires_at > datetime.utcfromtimestamp(now)))
+            ).all()
+
+        with self._lock:
+            for row in rows:
+                self._expiry[row.jti] = self._expires_at(row)
+            for jti in [jti for jti, exp in self._expiry.items() if exp <= now]:
+                del self._expiry[jti]
+            self._synced_at = started
+
+    # Delete rows whose tokens have expired; legacy rows without expires_at
+    # are aged out using the configured access token lifetime
+    def purge_table(self, engine):
+        table = BlacklistToken.__table__
+        cutoff = datetime.utcnow()
+        with engine.begin() as conn:
+            conn.execute(delete(table).where(or_(
+                table.c.expires_at < cutoff,
+                and_(table.c.expires_at.is_(None), table.c.created_at < cutoff - self.token_lifetime)
+            )))
+
+    # Warm the cache and start this process's sync thread. Threads do not survive a
+    # fork, so each worker process does this on its first lookup (or at warm-up).
+    def start(self):
+        if self._app is None or self._worker_pid == os.getpid():
+            return
+        with self._lock:
+            if self._worker_pid == os.getpid():
+                return
+            self._worker_pid = os.getpid()
+        try:
+            with self._app.app_context():
+                self.sync(self._db.engine)
+        except SQLAlchemyError as e:
+            # e.g. migrations not applied yet; the background sync keeps retrying
+            logger.warning('Could not warm the revoked token cache: %s', getattr(e, 'orig', e))
+        threading.Thread(target=self._sync_loop, name='blocklist-sync', daemon=True).start()
+
+    def _sync_loop(self):
+        while True:
+            time.sleep(self.sync_interval)
+            try:
+                with self._app.app_context():
+                    self.sync(self._db.engine)
+            except Exception:
+                logger.exception('Blocklist sync failed')
+
+
+# BlacklistToken timestamps are naive UTC
+def _timestamp(value):
+    return (value - datetime(1970, 1, 1)).total_seconds()
+
+
+revoked_tokens = RevokedTokenCache()
+
+
+# Scheduled every BLOCKLIST_PURGE_SECONDS
+@job_queue.task('prune-blocklist')
+def prune_blocklist(payload):
+    revoked_tokens.purge_table(db.engine)
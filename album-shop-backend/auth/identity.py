@@ -0,0 +1,56 @@
+from functools import wraps
+from flask import g, jsonify
+from flask_jwt_extended import jwt_required, get_jwt, get_jwt_identity
+from db.app import User
+
+
+# Claims embedded in every access token at login
+def identity_claims(user):
+    return {'user_id': user.id, 'role': user.role}
+
+
+# Load the current user at most once per request
+def get_current_user():
+    if 'current_user' not in g:
+        user_id = get_jwt().get('user_id')
+        if user_id is not None:
+            g.current_user = User.query.get(user_id)
+        else:
+            # Tokens issued before role claims existed only carry the username
+            g.current_user = User.query.filter_by(username=get_jwt_identity()).first()
+    return g.current_user
+
+
+# Current user's id, straight from the token when possible
+def current_user_id():
+    user_id = get_jwt().get('user_id')
+    if user_id is not None:
+        return user_id
+    user = get_current_user()
+    return user.id if user else None
+
+
+# Current user's role, straight from the token when possible
+def current_role():
+    role = get_jwt().get('role')
+    if role is not None:
+        return role
+    user = get_current_user()
+    return user.role if user else None
+
+
+def is_admin():
+    return current_role() == 'admin'
+
+
+# Decorator: valid JWT and the admin role, checked without a database query
+def admin_required(message='Admins only'):
+    def decorator(fn):
+        @wraps(fn)
+        @jwt_required()
+        def wrapper(*args, **kwargs):
+            if not is_admin():
+                return jsonify({'error': message}), 403
+            return fn(*args, **kwargs)
+        return wrapper
+    return decorator
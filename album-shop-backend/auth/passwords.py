@@ -0,0 +1,113 @@
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
+import os
+import threading
+import bcrypt
+
+# bcrypt only looks at the first 72 bytes; older bcrypt releases truncated silently
+BCRYPT_MAX_BYTES = 72
+
+
+class PasswordHasherBusy(Exception):
+    pass
+
+
+def _hash_password(password, rounds):
+    return bcrypt.hashpw(password.encode('utf-8')[:BCRYPT_MAX_BYTES], bcrypt.gensalt(rounds)).decode('utf-8')
+
+
+def _check_password(password_hash, password):
+    try:
+        return bcrypt.checkpw(password.encode('utf-8')[:BCRYPT_MAX_BYTES], password_hash.encode('utf-8'))
+    except ValueError:
+        # Malformed stored hash
+        return False
+
+
+# Runs bcrypt on a small dedicated process pool so CPU-bound hashing never holds
+# a request worker's thread or GIL. At most `max_pending` jobs may be queued per
+# process; beyond that callers get PasswordHasherBusy instead of piling up.
+class PasswordHasher:
+    def __init__(self, rounds=12, workers=2, max_pending=32, wait_timeout=5):
+        self.rounds = rounds
+        self.workers = workers
+        self.max_pending = max_pending
+        self.wait_timeout = wait_timeout
+        self._lock = threading.Lock()
+        self._pool = None
+        self._pool_pid = None
+        self._slots = threading.BoundedSemaphore(max_pending)
+
+    def init_app(self, app):
+        self.rounds = app.config.get('BCRYPT_LOG_ROUNDS', self.rounds)
+        self.workers = app.config.get('PASSWORD_HASH_WORKERS', self.workers)
+        self.max_pending = app.config.get('PASSWORD_HASH_MAX_PENDING', self.max_pending)
+        self._slots = threading.BoundedSemaphore(self.max_pending)
+
+    def hash(self, password):
+        return self._run(_hash_password, password, self.rounds)
+
+    def check(self, password_hash, password):
+        return self._run(_check_password, password_hash, password)
+
+    # True when a stored hash uses a different cost factor than the configured one
+    def needs_rehash(self, password_hash):
+        try:
+            return int(password_hash.split('$')[2]) != self.rounds
+        except (IndexError, ValueError):
+            return True
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None and self._pool_pid == os.getpid():
+                self._pool.shutdown(wait=True)
+            self._pool = None
+
+    def _run(self, fn, *args):
+        # workers=0 hashes inline (handy for scripts and single-threaded dev runs)
+        if not self.workers:
+            return fn(*args)
+        if not self._slots.acquire(timeout=self.wait_timeout):
+            raise PasswordHasherBusy()
+        try:
+            pool = self._executor()
+            try:
+                return pool.submit(fn, *args).result()
+            except BrokenProcessPool:
+                # A hashing process died (e.g. OOM-killed): replace the pool and retry once
+                return self._executor(replace=pool).submit(fn, *args).result()
+        finally:
+            self._slots.release()
+
+    # Fork the hashing processes up front (e.g. at worker warm-up) rather than on the first login
+    def start(self):
+        if self.workers:
+            list(self._executor().map(int, range(self.workers)))
+
+    # Pools are per process and created lazily, so gunicorn workers each get their own.
+    # Children come from a forkserver rather than a plain fork: by the time the pool
+    # starts (or is replaced) the worker already runs threads (job workers, revoked
+    # token sync), and forking a threaded process can copy a held lock into the child.
+    # `replace` is a broken pool to swap out, unless another thread already has.
+    def _executor(self, replace=None):
+        if self._pool is None or self._pool_pid != os.getpid() or self._pool is replace:
+            with self._lock:
+                if self._pool is None or self._pool_pid != os.getpid() or self._pool is replace:
+                    if replace is not None and self._pool is replace:
+                        replace.shutdown(wait=False)
+                    self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=_pool_context())
+                    self._pool_pid = os.getpid()
+        return self._pool
+
+
+# forkserver where the platform has it (Linux, macOS), spawn elsewhere
+def _pool_context():
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('forkserver')
+        context.set_forkserver_preload([__name__])
+        return context
+    return multiprocessing.get_context('spawn')
+
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,39 @@
+from collections import deque
+import threading
+import time
+
+
+# Sliding-window rate limiter keyed by an arbitrary string (IP, account, ...).
+# State is per process, so the effective limit is `limit` times the worker count.
+class RateLimiter:
+    def __init__(self, limit, window):
+        self.limit = limit
+        self.window = window
+        self._lock = threading.Lock()
+        self._hits = {}
+        self._next_sweep = 0.0
+
+    # Record an attempt; returns 0 if allowed, otherwise seconds until a slot frees up
+    def hit(self, key, now=None):
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            if now >= self._next_sweep:
+                self._sweep(now)
+            hits = self._hits.setdefault(key, deque())
+            while hits and hits[0] <= now - self.window:
+                hits.popleft()
+            if len(hits) >= self.limit:
+                return hits[0] + self.window - now
+            hits.append(now)
+            return 0
+
+    def reset(self, key):
+        with self._lock:
+            self._hits.pop(key, None)
+
+    # Drop idle keys so the table doesn't grow with every address ever seen
+    def _sweep(self, now):
+        cutoff = now - self.window
+        for key in [k for k, hits in self._hits.items() if not hits or hits[-1] <= cutoff]:
+            del self._hits[key]
+        self._next_sweep = now + self.window
@@ -0,0 +1,91 @@
+"""Concurrent checkout load test against a single "hot" album.
+
+Run against a live server (ideally backed by Postgres, since SQLite serializes writers):
+
+    python3 bench/hot_album.py --base-url http://localhost:5000 --orders 500 --stock 200
+
+Creates one album with limited stock, fires concurrent single-unit orders at it and
+checks that exactly `stock` orders succeed, the rest are rejected, and stock never
+goes negative. Exits non-zero on oversell.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+import argparse
+import json
+import os
+import sys
+import time
+import uuid
+
+
+def call(base_url, method, path, body=None, token=None):
+    headers = {'Content-Type': 'application/json'}
+    if token:
+        headers['Authorization'] = f'Bearer {token}'
+    data = json.dumps(body).encode('utf-8') if body is not None else None
+    req = Request(base_url + path, data=data, headers=headers, method=method)
+    try:
+        with urlopen(req) as res:
+            return res.status, json.loads(res.read() or b'null')
+    except HTTPError as e:
+        return e.code, json.loads(e.read() or b'null')
+
+
+def login(base_url, prefix, admin_code=None):
+    name = f'{prefix}-{uuid.uuid4().hex[:8]}'
+    user = {'username': name, 'email': f'{name}@bench.local', 'password': 'bench-password'}
+    if admin_code:
+        user.update(role='admin', admin_code=admin_code)
+    call(base_url, 'POST', '/register', user)
+    status, body = call(base_url, 'POST', '/login', {'email': user['email'], 'password': user['password']})
+    if status != 200:
+        sys.exit(f'login failed: {status} {body}')
+    return body['access_token']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--base-url', default='http://localhost:5000')
+    parser.add_argument('--orders', type=int, default=500, help='number of concurrent order attempts')
+    parser.add_argument('--stock', type=int, default=200, help='initial stock of the hot album')
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--admin-code', default=os.getenv('ADMIN_CODE', 'supersecretadmincode'))
+    args = parser.parse_args()
+
+    admin = login(args.base_url, 'bench-admin', args.admin_code)
+    buyers = [login(args.base_url, 'bench-buyer') for _ in range(min(args.concurrency, 16))]
+
+    status, body = call(args.base_url, 'POST', '/albums/', {
+        # Fresh title per run: albums are unique on (artist, title, release_date)
+        'title': f'Hot Album {int(time.time())}', 'artist': 'Bench', 'release_date': '2020-01-01',
+        'genre': 'Bench', 'price': 9.99, 'quantity': args.stock,
+    }, admin)
+    if status != 201:
+        sys.exit(f'album creation failed: {status} {body}')
+    album_id = body['album']['id']
+
+    def place(i):
+        return call(args.base_url, 'POST', '/orders/', {'album_id': album_id, 'quantity': 1}, buyers[i % len(buyers)])[0]
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        statuses = list(pool.map(place, range(args.orders)))
+    elapsed = time.perf_counter() - started
+
+    created = statuses.count(201)
+    rejected = statuses.count(400)
+    _, album = call(args.base_url, 'GET', f'/albums/{album_id}')
+
+    print(f'orders attempted: {args.orders}  created: {created}  rejected: {rejected}  '
+          f'other: {args.orders - created - rejected}')
+    print(f'final stock: {album["quantity"]}  elapsed: {elapsed:.2f}s  throughput: {args.orders / elapsed:.1f} req/s')
+
+    expected_created = min(args.stock, args.orders)
+    if album['quantity'] < 0 or created != args.stock - album['quantity'] or created > expected_created:
+        sys.exit('OVERSELL DETECTED')
+    print('no oversell')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""Catalog latency during a login storm.
+
+Measures GET /albums/ latency on its own, then again while other threads hammer
+POST /login, to show that bcrypt work on the hashing pool doesn't starve catalog
+traffic. Uses a dataset seeded by api_bench.py:
+
+    python3 bench/api_bench.py --database-url sqlite:////tmp/bench.db --seed
+    python3 bench/login_burst.py --database-url sqlite:////tmp/bench.db
+"""
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import os
+import threading
+import time
+
+from api_bench import PASSWORD, load_app, percentile
+
+
+def catalog_latencies(client, requests, concurrency):
+    def fetch(_):
+        started = time.perf_counter()
+        client.get('/albums/?sort=price&limit=50')
+        return (time.perf_counter() - started) * 1000
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        return sorted(pool.map(fetch, range(requests)))
+
+
+def report(label, latencies):
+    print(f'{label:<28} p50 {percentile(latencies, 50):8.2f} ms   p95 {percentile(latencies, 95):8.2f} ms   '
+          f'p99 {percentile(latencies, 99):8.2f} ms')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database-url', default=os.getenv('DATABASE_URL', 'sqlite:////tmp/album_shop_bench.db'))
+    parser.add_argument('--requests', type=int, default=300, help='catalog requests per phase')
+    parser.add_argument('--concurrency', type=int, default=4, help='catalog client threads')
+    parser.add_argument('--login-threads', type=int, default=8)
+    args = parser.parse_args()
+
+    app = load_app(args.database_url)
+    from auth.app import ip_limiter, account_limiter
+    from auth.passwords import password_hasher
+    from routes.cache import response_cache
+
+    # Measure the real handler, not response cache hits
+    response_cache.ttl = 0
+
+    # The burst comes from one address at a handful of accounts; lift the limits for the benchmark
+    ip_limiter.limit = account_limiter.limit = 10 ** 9
+    password_hasher.start()
+
+    client = app.test_client()
+    catalog_latencies(client, 20, args.concurrency)  # warm up
+    report('catalog, idle', catalog_latencies(client, args.requests, args.concurrency))
+
+    stop = threading.Event()
+    logins = [0]
+
+    def login_storm(index):
+        login_client = app.test_client()
+        while not stop.is_set():
+            login_client.post('/login', json={'email': f'bench{1 + index}@bench.local', 'password': PASSWORD})
+            logins[0] += 1
+
+    threads = [threading.Thread(target=login_storm, args=(i,), daemon=True) for i in range(args.login_threads)]
+    for thread in threads:
+        thread.start()
+    started = time.perf_counter()
+    latencies = catalog_latencies(client, args.requests, args.concurrency)
+    elapsed = time.perf_counter() - started
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    report('catalog, during login burst', latencies)
+    print(f'{logins[0]} logins in {elapsed:.1f}s ({logins[0] / elapsed:.1f}/s) on '
+          f'{password_hasher.workers} hashing process(es)')
+    password_hasher.shutdown()
+
+
+if __name__ == '__main__':
+    main()
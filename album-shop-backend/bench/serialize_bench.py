@@ -0,0 +1,96 @@
+"""Per-row cost of building and encoding album list responses.
+
+Compares the old path (load ORM objects, build dicts by hand with .isoformat(),
+encode with the stdlib json provider) against the shared serializers (select
+only ALBUM_COLUMNS, build payloads from rows, encode with orjson or
+MessagePack). Reports microseconds per row and peak allocated memory:
+
+    python3 bench/serialize_bench.py --rows 20000
+"""
+from datetime import date, timedelta
+import argparse
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+
+from api_bench import GENRES, insert_chunked, load_app
+
+
+def legacy_rows(db, Album):
+    return [{
+        'id': album.id,
+        'title': album.title,
+        'artist': album.artist,
+        'release_date': album.release_date.isoformat(),
+        'genre': album.genre,
+        'price': album.price,
+        'quantity': album.quantity,
+        'image_url': album.image_url,
+        'rating_count': album.rating_count,
+        'average_rating': round(album.rating_sum / album.rating_count, 2) if album.rating_count else None,
+        'rating_histogram': {str(r): getattr(album, f'rating_{r}') for r in range(1, 6)}
+    } for album in db.session.execute(db.select(Album)).scalars()]
+
+
+def column_rows(db, Album):
+    from routes.serializers import ALBUM_COLUMNS, album_payload
+    return [album_payload(row) for row in db.session.execute(db.select(*ALBUM_COLUMNS))]
+
+
+def measure(app, build, encode, repeat):
+    from db.app import db, Album
+    best = float('inf')
+    with app.app_context():
+        for _ in range(repeat):
+            db.session.expunge_all()
+            started = time.perf_counter()
+            body = encode(build(db, Album))
+            best = min(best, time.perf_counter() - started)
+        db.session.expunge_all()
+        tracemalloc.start()
+        encode(build(db, Album))
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return best, peak, len(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    path = os.path.join(tempfile.mkdtemp(), 'serialize_bench.db')
+    app = load_app(f'sqlite:///{path}')
+    from flask.json.provider import DefaultJSONProvider
+    from flask_migrate import upgrade
+    from db.app import db, Album
+    from routes.serializers import encode_default, msgpack, orjson
+
+    with app.app_context():
+        upgrade()
+        insert_chunked(db, Album, [{
+            'title': f'Album {i}', 'artist': f'Artist {i % 500}', 'release_date': date(1960, 1, 1) + timedelta(days=i % 23000),
+            'genre': GENRES[i % len(GENRES)], 'price': 9.99, 'quantity': 10, 'image_url': None
+        } for i in range(args.rows)])
+
+    stdlib = DefaultJSONProvider(app)
+    cases = [
+        ('ORM objects + stdlib json', legacy_rows, lambda obj: stdlib.dumps(obj, separators=(',', ':')).encode()),
+        ('columns + stdlib json', column_rows, lambda obj: json.dumps(obj, default=encode_default, separators=(',', ':')).encode()),
+    ]
+    if orjson:
+        cases.append(('columns + orjson', column_rows, lambda obj: orjson.dumps(obj, default=encode_default)))
+    if msgpack:
+        cases.append(('columns + msgpack', column_rows, lambda obj: msgpack.packb(obj, default=encode_default)))
+
+    print(f'{args.rows} albums, best of {args.repeat}')
+    for name, build, encode in cases:
+        seconds, peak, size = measure(app, build, encode, args.repeat)
+        print(f'{name:<28} {seconds * 1e6 / args.rows:7.2f} us/row   peak {peak / 2**20:7.1f} MiB   body {size / 2**20:6.1f} MiB')
+
+
+if __name__ == '__main__':
+    main()
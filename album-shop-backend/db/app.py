@@ -1,8 +1,25 @@
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
 from flask_bcrypt import Bcrypt
+from sqlalchemy.dialects import sqlite
 from datetime import datetime
 
-db = SQLAlchemy()
+
+# Session that sends SELECTs to session.info['read_engine'] when one is set, i.e. to
+# a read replica for requests db.replicas routes there; everything else (writes,
+# flushes, get_bind() without a statement) stays on the primary. A session created
+# with bind= (a test's outer transaction, see testing.py) uses only that connection.
+class RoutingSession(Session):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self.bind is not None:
+            return self.bind
+        engine = self.info.get('read_engine')
+        if engine is not None and bind is None and not self._flushing and getattr(clause, 'is_select', False):
+            return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 bcrypt = Bcrypt()
 
 # User Model
@@ -13,10 +30,11 @@ class User(db.Model):
     password_hash = db.Column(db.String(128), nullable=False)
     role = db.Column(db.String(10), default='user', nullable=False)  # 'user' or 'admin'
 
-    def __init__(self, username, email, password, role='user'):
+    def __init__(self, username, email, password=None, role='user', password_hash=None):
         self.username = username
         self.email = email
-        self.password_hash = bcrypt.generate_password_hash(password).decode('utf-8')
+        # Request handlers pass a hash computed off the request thread (see auth/passwords.py)
+        self.password_hash = password_hash or bcrypt.generate_password_hash(password).decode('utf-8')
         self.role = role
 
 # Blacklisted Tokens Model
@@ -24,13 +42,25 @@ class BlacklistToken(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     jti = db.Column(db.String(128), unique=True, nullable=False)  # JWT Token Identifier
     created_at = db.Column(db.DateTime, server_default=db.func.now())  # Timestamp
+    expires_at = db.Column(db.DateTime, index=True)  # Token's own expiry (UTC), after which the row can be purged
 
-    def __init__(self, jti):
+    def __init__(self, jti, expires_at=None):
         self.jti = jti
+        self.expires_at = expires_at
 
 # Album Model
 class Album(db.Model):
     __tablename__ = 'album'
+    # Composite (column, id) indexes back the keyset-paginated catalog filters and sorts
+    __table_args__ = (
+        db.Index('ix_album_title_id', 'title', 'id'),
+        db.Index('ix_album_artist_id', 'artist', 'id'),
+        db.Index('ix_album_genre_id', 'genre', 'id'),
+        db.Index('ix_album_price_id', 'price', 'id'),
+        db.Index('ix_album_release_date_id', 'release_date', 'id'),
+        # Natural key used by the bulk catalog import to upsert albums
+        db.Index('uq_album_artist_title_release_date', 'artist', 'title', 'release_date', unique=True),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(120), nullable=False)
@@ -41,6 +71,15 @@ class Album(db.Model):
     quantity = db.Column(db.Integer, nullable=False, default=0)
     image_url = db.Column(db.String(255))  # ✅ NEW: Image URL
 
+    # Review aggregates, maintained incrementally by the review routes (see db/ratings.py)
+    rating_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_sum = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_1 = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_2 = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_3 = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_4 = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rating_5 = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
     def __init__(self, title, artist, release_date, genre, price, quantity, image_url=None):
         self.title = title
         self.artist = artist
@@ -52,6 +91,12 @@ class Album(db.Model):
 
 #Review Model
 class Review(db.Model):
+    # Match the per-album and per-user review listings (filter + created_at order)
+    __table_args__ = (
+        db.Index('ix_review_album_id_created_at', 'album_id', 'created_at'),
+        db.Index('ix_review_user_id_created_at', 'user_id', 'created_at'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     rating = db.Column(db.Integer, nullable=False)
     comment = db.Column(db.Text, nullable=True)
@@ -67,11 +112,24 @@ class Review(db.Model):
         self.user_id = user_id
 
 # Order Model
+# On PostgreSQL the table is range-partitioned by month on order_date, with a
+# primary key of (id, order_date); see db/partitions.py and its migration
 class Order(db.Model):
+    # Match order history (per user, by date) and per-album order lookups
+    __table_args__ = (
+        db.Index('ix_order_user_id_order_date', 'user_id', 'order_date'),
+        db.Index('ix_order_album_id_order_date', 'album_id', 'order_date'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     album_id = db.Column(db.Integer, db.ForeignKey('album.id'), nullable=False)
-    order_date = db.Column(db.DateTime, server_default=db.func.now(), nullable=False)
+    # On SQLite, store whole seconds like the CURRENT_TIMESTAMP default does, so that
+    # order_date keyset comparisons against bound values sort correctly
+    order_date = db.Column(
+        db.DateTime().with_variant(sqlite.DATETIME(truncate_microseconds=True), 'sqlite'),
+        server_default=db.func.now(), nullable=False
+    )
     quantity = db.Column(db.Integer, nullable=False)
     total_price = db.Column(db.Float, nullable=False)
 
@@ -85,3 +143,73 @@ class Order(db.Model):
         self.quantity = quantity
         self.total_price = total_price
 
+
+# Sales rollups, maintained incrementally with each order (see db/sales.py).
+# Album rows copy the album's genre in when first written, so genre filters
+# need no join. Monthly album rows keep long-range bestseller queries small.
+class AlbumSalesDaily(db.Model):
+    __tablename__ = 'album_sales_daily'
+    __table_args__ = (
+        db.Index('ix_album_sales_daily_album_id_day', 'album_id', 'day'),
+        db.Index('ix_album_sales_daily_genre_day', 'genre', 'day'),
+    )
+
+    day = db.Column(db.Date, primary_key=True)
+    album_id = db.Column(db.Integer, db.ForeignKey('album.id', ondelete='CASCADE'), primary_key=True)
+    genre = db.Column(db.String(50), nullable=False)
+    units = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0)
+    orders = db.Column(db.Integer, nullable=False, default=0)
+
+class AlbumSalesMonthly(db.Model):
+    __tablename__ = 'album_sales_monthly'
+    __table_args__ = (
+        db.Index('ix_album_sales_monthly_genre_month', 'genre', 'month'),
+    )
+
+    month = db.Column(db.Date, primary_key=True)  # First day of the month
+    album_id = db.Column(db.Integer, db.ForeignKey('album.id', ondelete='CASCADE'), primary_key=True)
+    genre = db.Column(db.String(50), nullable=False)
+    units = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0)
+    orders = db.Column(db.Integer, nullable=False, default=0)
+
+class GenreSalesDaily(db.Model):
+    __tablename__ = 'genre_sales_daily'
+
+    day = db.Column(db.Date, primary_key=True)
+    genre = db.Column(db.String(50), primary_key=True)
+    units = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0)
+    orders = db.Column(db.Integer, nullable=False, default=0)
+
+# A month of orders moved out of the order table into a compressed file (see
+# db/partitions.py). Sales rollups for archived months are kept as they are.
+class OrderArchive(db.Model):
+    __tablename__ = 'order_archive'
+
+    month = db.Column(db.Date, primary_key=True)  # First day of the month
+    path = db.Column(db.String(512), nullable=False)
+    orders = db.Column(db.Integer, nullable=False)
+    archived_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+# Background job, run by the queue workers in db/jobs.py. Naive UTC timestamps.
+class Job(db.Model):
+    __tablename__ = 'job'
+    __table_args__ = (
+        # Workers look for the oldest due job in a given status
+        db.Index('ix_job_status_run_at', 'status', 'run_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(64), nullable=False)
+    payload = db.Column(db.JSON)
+    status = db.Column(db.String(10), nullable=False, default='queued')  # 'queued', 'running', 'done' or 'failed'
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=5)
+    run_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)  # Not picked up before this time
+    locked_at = db.Column(db.DateTime)  # When a worker claimed it; stale claims are picked up again
+    finished_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    unique_key = db.Column(db.String(128), unique=True)  # Dedupes periodic runs across processes
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
@@ -0,0 +1,167 @@
+from datetime import datetime
+from flask.cli import with_appcontext
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import DBAPIError
+from db.app import db, Album
+import click
+import csv
+import json
+import math
+import os
+
+DEFAULT_BATCH_SIZE = 2000
+MAX_REPORTED_ERRORS = 1000
+
+# Albums are matched on this natural key; see migration 5a9c1e3f7b24
+IMPORT_KEY = ('artist', 'title', 'release_date')
+REQUIRED_FIELDS = ('title', 'artist', 'release_date', 'genre', 'price', 'quantity')
+MAX_LENGTHS = {'title': 120, 'artist': 120, 'genre': 50, 'image_url': 255}
+IMPORT_FORMATS = ('csv', 'ndjson')
+
+
+# Yield (row_number, record) from a text stream, one record at a time so memory
+# stays flat however large the file is. Row numbers count data records from 1.
+# Unparseable NDJSON lines are yielded as (row_number, None).
+def read_rows(stream, fmt):
+    if fmt == 'csv':
+        yield from enumerate(csv.DictReader(stream), start=1)
+        return
+    row_number = 0
+    for line in stream:
+        if not line.strip():
+            continue
+        row_number += 1
+        try:
+            record = json.loads(line)
+        except ValueError:
+            record = None
+        yield row_number, record if isinstance(record, dict) else None
+
+
+# Turn one raw record into column values; returns (values, None) or (None, error)
+def validate_row(record):
+    if record is None:
+        return None, 'Row is not a JSON object'
+    missing = [field for field in REQUIRED_FIELDS if record.get(field) in (None, '')]
+    if missing:
+        return None, f'Missing fields: {", ".join(missing)}'
+
+    try:
+        values = {
+            'title': str(record['title']).strip(),
+            'artist': str(record['artist']).strip(),
+            'release_date': datetime.strptime(str(record['release_date']), '%Y-%m-%d').date(),
+            'genre': str(record['genre']).strip(),
+            'price': float(record['price']),
+            'quantity': int(record['quantity']),
+            'image_url': str(record['image_url']).strip() if record.get('image_url') else None,
+        }
+    except (ValueError, TypeError) as e:
+        return None, str(e)
+
+    if not math.isfinite(values['price']) or values['price'] < 0:
+        return None, 'price must be a non-negative number'
+    if values['quantity'] < 0:
+        return None, 'quantity must be a non-negative integer'
+    for field, limit in MAX_LENGTHS.items():
+        if values[field] is not None and len(values[field]) > limit:
+            return None, f'{field} is longer than {limit} characters'
+    return values, None
+
+
+def _upsert_statement():
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        insert = pg_insert
+    elif dialect == 'sqlite':
+        insert = sqlite_insert
+    else:
+        raise RuntimeError(f'Bulk import is not supported on {dialect}')
+    stmt = insert(Album)
+    # Existing albums get the supplier's price, stock and artwork; ratings are left alone
+    return stmt.on_conflict_do_update(
+        index_elements=list(IMPORT_KEY),
+        set_={column: stmt.excluded[column] for column in ('genre', 'price', 'quantity', 'image_url')},
+    ).returning(Album.id)
+
+
+# Upsert validated records in chunks of `batch_size`, committing each chunk.
+# Rows sharing a key within a chunk collapse to the last one (ON CONFLICT can't
+# touch a row twice in one statement). If the database rejects a chunk it is
+# retried row by row so only the offending rows are reported.
+# `on_batch(ids)` is called after each commit with the ids that were written.
+def import_albums(rows, batch_size=DEFAULT_BATCH_SIZE, on_batch=None):
+    report = {'received': 0, 'imported': 0, 'failed': 0, 'errors': []}
+    stmt = _upsert_statement()
+
+    def fail(row_number, error):
+        report['failed'] += 1
+        if len(report['errors']) < MAX_REPORTED_ERRORS:
+            report['errors'].append({'row': row_number, 'error': error})
+
+    def flush(batch):
+        try:
+            ids = db.session.execute(stmt, list(batch.values())).scalars().all()
+            db.session.commit()
+        except DBAPIError:
+            db.session.rollback()
+            ids = []
+            for row_number, values in batch.items():
+                try:
+                    ids.extend(db.session.execute(stmt, [values]).scalars().all())
+                    db.session.commit()
+                except DBAPIError as e:
+                    db.session.rollback()
+                    fail(row_number, str(e.orig))
+        report['imported'] += len(ids)
+        if on_batch and ids:
+            on_batch(ids)
+
+    batch = {}
+    keys = {}
+    for row_number, record in rows:
+        report['received'] += 1
+        values, error = validate_row(record)
+        if error:
+            fail(row_number, error)
+            continue
+        key = tuple(values[column] for column in IMPORT_KEY)
+        if key in keys:
+            # The earlier row is superseded by this one, as if both had been applied in order
+            del batch[keys[key]]
+            report['imported'] += 1
+        keys[key] = row_number
+        batch[row_number] = values
+        if len(batch) >= batch_size:
+            flush(batch)
+            batch, keys = {}, {}
+    if batch:
+        flush(batch)
+    return report
+
+
+# Pick csv/ndjson from an explicit format or a file name
+def detect_format(fmt=None, filename=None):
+    if fmt:
+        return fmt if fmt in IMPORT_FORMATS else None
+    extension = os.path.splitext(filename or '')[1].lower()
+    return {'.csv': 'csv', '.ndjson': 'ndjson', '.jsonl': 'ndjson'}.get(extension)
+
+
+@click.command('import-albums')
+@click.argument('source', type=click.File('r', encoding='utf-8'))
+@click.option('--format', 'fmt', type=click.Choice(IMPORT_FORMATS), help='Defaults to the file extension.')
+@click.option('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, show_default=True)
+@with_appcontext
+def import_albums_command(source, fmt, batch_size):
+    fmt = detect_format(fmt, source.name)
+    if fmt is None:
+        raise click.ClickException('Cannot tell the format from the file name; pass --format csv or --format ndjson')
+
+    report = import_albums(read_rows(source, fmt), batch_size=batch_size)
+    for error in report['errors']:
+        click.echo(f'row {error["row"]}: {error["error"]}', err=True)
+    if report['failed'] > len(report['errors']):
+        click.echo(f'... {report["failed"] - len(report["errors"])} more error(s) not shown', err=True)
+    click.echo(f'Imported {report["imported"]} of {report["received"]} row(s); {report["failed"]} failed.')
@@ -0,0 +1,102 @@
+from datetime import date, datetime
+from flask.cli import with_appcontext
+from sqlalchemy import select, tuple_
+from db.app import db, Album, Review, Order, BlacklistToken, AlbumSalesDaily, AlbumSalesMonthly, Job
+import click
+import json
+
+
+# Hot query shapes and the index each one must use: (name, statement, index, migration)
+def hot_queries():
+    return [
+        ('catalog filtered by genre',
+         select(Album).where(Album.genre == 'Rock').order_by(Album.id).limit(51),
+         'ix_album_genre_id', '8d4e2f6a1c93'),
+        ('catalog sorted by price',
+         select(Album).where(Album.price > 10).order_by(Album.price, Album.id).limit(51),
+         'ix_album_price_id', '8d4e2f6a1c93'),
+        ('expired revoked tokens',
+         select(BlacklistToken.id).where(BlacklistToken.expires_at < datetime(2000, 1, 1)),
+         'ix_blacklist_token_expires_at', '8d4e2f6a1c93'),
+        ('reviews for album',
+         select(Review).where(Review.album_id == 1).order_by(Review.created_at, Review.id),
+         'ix_review_album_id_created_at', 'c52a7e0b9f14'),
+        ('reviews by user',
+         select(Review).where(Review.user_id == 1).order_by(Review.created_at, Review.id),
+         'ix_review_user_id_created_at', 'c52a7e0b9f14'),
+        ('order history for user',
+         select(Order.id, Album.title).join(Order.album)
+         .where(Order.user_id == 1, tuple_(Order.order_date, Order.id) > (datetime(2000, 1, 1), 0))
+         .order_by(Order.order_date, Order.id).limit(51),
+         'ix_order_user_id_order_date', 'c52a7e0b9f14'),
+        ('daily sales for one album',
+         select(AlbumSalesDaily.day, AlbumSalesDaily.revenue)
+         .where(AlbumSalesDaily.album_id == 1, AlbumSalesDaily.day.between(date(2000, 1, 1), date(2000, 12, 31))),
+         'ix_album_sales_daily_album_id_day', '9b6d2f8e4a17'),
+        ('daily sales for one genre',
+         select(AlbumSalesDaily.day, AlbumSalesDaily.revenue)
+         .where(AlbumSalesDaily.genre == 'Rock', AlbumSalesDaily.day.between(date(2000, 1, 1), date(2000, 12, 31))),
+         'ix_album_sales_daily_genre_day', '9b6d2f8e4a17'),
+        ('monthly sales for one genre',
+         select(AlbumSalesMonthly.album_id, AlbumSalesMonthly.units)
+         .where(AlbumSalesMonthly.genre == 'Rock', AlbumSalesMonthly.month.between(date(2000, 1, 1), date(2000, 12, 1))),
+         'ix_album_sales_monthly_genre_month', '9b6d2f8e4a17'),
+        ('next due job',
+         select(Job.id).where(Job.status == 'queued', Job.run_at <= datetime(2000, 1, 1)).order_by(Job.run_at, Job.id).limit(1),
+         'ix_job_status_run_at', 'd7e3a9c5f2b8'),
+    ]
+
+
+# Return the names of the indexes the planner picks for `statement`
+def plan_indexes(conn, statement):
+    compiled = statement.compile(dialect=conn.dialect)
+    params = compiled.params
+    if compiled.positional:
+        params = tuple(params[name] for name in compiled.positiontup)
+
+    if conn.dialect.name == 'postgresql':
+        # Tiny dev tables make a seq scan cheapest; we only care that the index is usable
+        conn.exec_driver_sql('SET LOCAL enable_seqscan = off')
+        plan = conn.exec_driver_sql('EXPLAIN (FORMAT JSON) ' + str(compiled), params).scalar()
+        plan = json.loads(plan) if isinstance(plan, str) else plan
+        # A partition's index is reported under its own name; map it to the
+        # partitioned index the migration created (db/partitions.py)
+        names = list(set(_index_names(plan)))
+        return set(conn.exec_driver_sql(
+            'SELECT COALESCE(pg_partition_root(c.oid), c.oid)::regclass::text '
+            'FROM pg_class c WHERE c.relname = ANY(%(names)s)', {'names': names}
+        ).scalars()) if names else set()
+
+    if conn.dialect.name == 'sqlite':
+        rows = conn.exec_driver_sql('EXPLAIN QUERY PLAN ' + str(compiled), params).all()
+        return {word for row in rows for word in row[-1].split() if word.startswith('ix_')}
+
+    raise click.ClickException(f'EXPLAIN check not supported on {conn.dialect.name}')
+
+
+def _index_names(node):
+    if isinstance(node, list):
+        for item in node:
+            yield from _index_names(item)
+    elif isinstance(node, dict):
+        if 'Index Name' in node:
+            yield node['Index Name']
+        for value in node.values():
+            yield from _index_names(value)
+
+
+# Verify that every hot query is served by the index its migration added
+@click.command('check-query-plans')
+@with_appcontext
+def check_query_plans_command():
+    failures = 0
+    with db.engine.connect() as conn:
+        for name, statement, index, revision in hot_queries():
+            with conn.begin():
+                used = plan_indexes(conn, statement)
+            ok = index in used
+            failures += not ok
+            status = 'ok  ' if ok else 'FAIL'
+            click.echo(f'{status} {name}: expected {index} (migration {revision}), plan uses {sorted(used) or "no index"}')
+    if failures:
+        raise click.ClickException(f'{failures} hot quer{"y" if failures == 1 else "ies"} not using their index')
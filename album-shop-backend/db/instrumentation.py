@@ -0,0 +1,182 @@
+from contextlib import contextmanager
+from flask import g, request, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+import bisect
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Histogram buckets (Prometheus `le` bounds)
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+_local = threading.local()
+
+
+class Histogram:
+    __slots__ = ('buckets', 'counts', 'total', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.counts):
+            self.counts[index] += 1
+        self.total += value
+        self.count += 1
+
+    def render(self, name, labels):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {self.count}')
+        lines.append(f'{name}_sum{{{labels}}} {self.total:.6f}')
+        lines.append(f'{name}_count{{{labels}}} {self.count}')
+        return lines
+
+
+# Per-endpoint request metrics: handler time, DB time and query count.
+# SQLAlchemy engine events attribute each statement to the request running on
+# the current thread; statements slower than SLOW_QUERY_MS are logged with their
+# parameters. Metrics are rendered in Prometheus text format by /metrics.
+class RequestMetrics:
+    def __init__(self):
+        self.slow_query_seconds = 0.1
+        self._lock = threading.Lock()
+        self._endpoints = {}
+        self._collectors = []
+
+    def init_app(self, app):
+        self.slow_query_seconds = app.config.get('SLOW_QUERY_MS', 100) / 1000
+        app.before_request(self._before_request)
+        # teardown (not after_request) so streamed responses are measured to the last row
+        app.teardown_request(self._teardown_request)
+        install_query_hooks()
+        global _metrics
+        _metrics = self
+
+    # Extra `() -> [lines]` callables rendered after the request metrics
+    def add_collector(self, collector):
+        self._collectors.append(collector)
+
+    def _before_request(self):
+        g.request_started = time.perf_counter()
+        g.query_count = 0
+        g.query_time = 0.0
+
+    def _teardown_request(self, exc=None):
+        started = g.get('request_started')
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started
+        endpoint = request.endpoint or 'unmatched'
+        with self._lock:
+            stats = self._endpoints.get((endpoint, request.method))
+            if stats is None:
+                stats = self._endpoints[(endpoint, request.method)] = (
+                    Histogram(DURATION_BUCKETS), Histogram(DURATION_BUCKETS), Histogram(QUERY_COUNT_BUCKETS)
+                )
+            stats[0].observe(elapsed)
+            stats[1].observe(g.query_time)
+            stats[2].observe(g.query_count)
+
+    def record_query(self, statement, parameters, duration):
+        if not has_request_context() or 'query_count' not in g:
+            return
+        g.query_count += 1
+        g.query_time += duration
+        if duration >= self.slow_query_seconds:
+            logger.warning('Slow query (%.1f ms) in %s %s: %s | params=%r',
+                           duration * 1000, request.method, request.endpoint, statement, parameters)
+
+    def render(self):
+        lines = [
+            '# HELP http_request_duration_seconds Total handler time per request.',
+            '# TYPE http_request_duration_seconds histogram',
+        ]
+        with self._lock:
+            items = sorted(self._endpoints.items())
+            rendered = [(f'endpoint="{endpoint}",method="{method}"', stats) for (endpoint, method), stats in items]
+            for labels, stats in rendered:
+                lines += stats[0].render('http_request_duration_seconds', labels)
+            lines += ['# HELP db_time_per_request_seconds Time spent in SQL per request.',
+                      '# TYPE db_time_per_request_seconds histogram']
+            for labels, stats in rendered:
+                lines += stats[1].render('db_time_per_request_seconds', labels)
+            lines += ['# HELP db_queries_per_request SQL statements issued per request.',
+                      '# TYPE db_queries_per_request histogram']
+            for labels, stats in rendered:
+                lines += stats[2].render('db_queries_per_request', labels)
+        for collector in self._collectors:
+            lines += collector()
+        return '\n'.join(lines) + '\n'
+
+
+_metrics = None
+_hooks_installed = False
+
+
+# Listen on the Engine class so engines Flask-SQLAlchemy creates lazily are covered too
+def install_query_hooks():
+    global _hooks_installed
+    if _hooks_installed:
+        return
+    _hooks_installed = True
+
+    @event.listens_for(Engine, 'before_cursor_execute')
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info['query_started'] = time.perf_counter()
+        for counter in getattr(_local, 'counters', ()):
+            counter.append(statement)
+
+    @event.listens_for(Engine, 'after_cursor_execute')
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.pop('query_started', None)
+        if started is not None and _metrics is not None:
+            _metrics.record_query(statement, parameters, time.perf_counter() - started)
+
+    # A failed statement gets no after_cursor_execute; don't leave its start time on
+    # the pooled connection
+    @event.listens_for(Engine, 'handle_error')
+    def _handle_error(context):
+        if context.connection is not None:
+            context.connection.info.pop('query_started', None)
+
+
+# Collect the SQL statements issued by the current thread inside the block
+@contextmanager
+def count_queries():
+    install_query_hooks()
+    statements = []
+    counters = getattr(_local, 'counters', None)
+    if counters is None:
+        counters = _local.counters = []
+    counters.append(statements)
+    try:
+        yield statements
+    finally:
+        counters.pop()
+
+
+# Test helper: fail if the block issues more than `max_queries` statements, e.g.
+#     with assert_max_queries(2):
+#         client.get('/orders/my', headers=auth)
+@contextmanager
+def assert_max_queries(max_queries):
+    with count_queries() as statements:
+        yield statements
+    if len(statements) > max_queries:
+        listing = '\n'.join(f'  {i + 1}. {s}' for i, s in enumerate(statements))
+        raise AssertionError(f'{len(statements)} queries issued, at most {max_queries} expected:\n{listing}')
+
+
+request_metrics = RequestMetrics()
@@ -0,0 +1,281 @@
+from datetime import datetime, timedelta
+from flask.cli import with_appcontext
+from sqlalchemy import and_, delete, event, or_, select, update
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from db.app import db, Job
+import click
+import logging
+import os
+import threading
+import time
+import traceback
+
+logger = logging.getLogger(__name__)
+
+MAX_ERROR_LENGTH = 4000
+
+
+# Database-backed queue for work that shouldn't hold up a request.
+# A job is a row in the job table, added in the caller's transaction, so it exists
+# exactly when the request's own writes commit. Worker threads (in each web process,
+# or in a separate `flask --app run jobs-worker`) claim the oldest due job, run its
+# handler and mark it done in the same transaction as the handler's writes. A job
+# that raises is retried with exponential backoff until it runs out of attempts;
+# a claim left behind by a crashed worker is picked up again after `lease` seconds.
+# Periodic jobs are enqueued once per interval across all processes.
+class JobQueue:
+    def __init__(self, workers=1, poll_interval=2.0, lease=600, retry_delay=5, max_retry_delay=3600,
+                 retention_days=7):
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.lease = lease
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.retention_days = retention_days
+        self.stats = {'completed': 0, 'retried': 0, 'failed': 0}
+        self._tasks = {}
+        self._schedules = {}
+        self._scheduled_slots = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._threads = []
+        self._worker_pid = None
+        self._app = None
+
+    def init_app(self, app):
+        self._app = app
+        self.workers = app.config.get('JOB_WORKERS', self.workers)
+        self.poll_interval = app.config.get('JOB_POLL_SECONDS', self.poll_interval)
+        self.lease = app.config.get('JOB_LEASE_SECONDS', self.lease)
+        self.retention_days = app.config.get('JOB_RETENTION_DAYS', self.retention_days)
+        # An in-memory SQLite database lives on a single shared connection that
+        # worker threads can't use alongside requests; run `jobs-worker --burst` instead
+        url = make_url(app.config['SQLALCHEMY_DATABASE_URI'])
+        if url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:'):
+            self.workers = 0
+        app.before_request(self.start)
+
+    # Decorator registering `fn(payload)` as the handler for jobs named `name`
+    def task(self, name, max_attempts=5):
+        def decorator(fn):
+            self._tasks[name] = (fn, max_attempts)
+            return fn
+        return decorator
+
+    # Enqueue `name` once every `seconds` (0 turns the schedule off)
+    def schedule(self, name, seconds):
+        if seconds and seconds > 0:
+            self._schedules[name] = seconds
+        else:
+            self._schedules.pop(name, None)
+
+    # Add a job to the current transaction; workers see it once the caller commits
+    def enqueue(self, name, payload=None, delay=0, run_at=None, unique_key=None):
+        if name not in self._tasks:
+            raise KeyError(f'No handler registered for job {name}')
+        run_at = run_at or datetime.utcnow() + timedelta(seconds=delay)
+        job = Job(name=name, payload=payload, run_at=run_at,
+                  max_attempts=self._tasks[name][1], unique_key=unique_key)
+        db.session.add(job)
+        db.session.info['jobs_enqueued'] = True
+        return job
+
+    # Run every queued or claimed job named `name` right now, in the current
+    # transaction, and mark them done. Lets a job that recomputes state from
+    # scratch absorb pending incremental updates instead of racing them.
+    def drain(self, name):
+        handler = self._tasks[name][0]
+        payloads = db.session.execute(
+            update(Job)
+            .where(Job.name == name, Job.status.in_(('queued', 'running')))
+            .values(status='done', finished_at=datetime.utcnow())
+            .returning(Job.payload)
+            .execution_options(synchronize_session=False)
+        ).scalars().all()
+        for payload in payloads:
+            handler(payload)
+        return len(payloads)
+
+    # Claim and run the oldest due job; returns False when there was none
+    def run_next(self):
+        now = datetime.utcnow()
+        claimable = or_(
+            and_(Job.status == 'queued', Job.run_at <= now),
+            and_(Job.status == 'running', Job.locked_at < now - timedelta(seconds=self.lease)),
+        )
+        # A single UPDATE ... WHERE id = (SELECT ... FOR UPDATE SKIP LOCKED), so two
+        # workers never claim the same job
+        due = (
+            select(Job.id).where(claimable).order_by(Job.run_at, Job.id).limit(1)
+            .with_for_update(skip_locked=True).scalar_subquery()
+        )
+        job = db.session.execute(
+            update(Job)
+            .where(Job.id == due, claimable)
+            .values(status='running', locked_at=now, attempts=Job.attempts + 1)
+            .returning(Job.id, Job.name, Job.payload, Job.attempts, Job.max_attempts)
+            .execution_options(synchronize_session=False)
+        ).first()
+        db.session.commit()
+        if job is None:
+            return False
+
+        try:
+            if job.name not in self._tasks:
+                raise LookupError(f'No handler registered for job {job.name}')
+            self._tasks[job.name][0](job.payload)
+            # Only commit the handler's writes if the job is still ours (drain() may have taken it)
+            finished = db.session.execute(
+                update(Job)
+                .where(Job.id == job.id, Job.status == 'running')
+                .values(status='done', finished_at=datetime.utcnow())
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            if finished:
+                db.session.commit()
+                self._count('completed')
+            else:
+                db.session.rollback()
+        except Exception as e:
+            db.session.rollback()
+            self._retry_or_fail(job, e)
+        return True
+
+    def _retry_or_fail(self, job, error):
+        now = datetime.utcnow()
+        values = {'last_error': traceback.format_exc()[-MAX_ERROR_LENGTH:]}
+        if job.attempts >= job.max_attempts:
+            values.update(status='failed', finished_at=now)
+            logger.error('Job %s #%s failed after %s attempt(s): %s', job.name, job.id, job.attempts, error)
+            self._count('failed')
+        else:
+            delay = min(self.retry_delay * 2 ** (job.attempts - 1), self.max_retry_delay)
+            values.update(status='queued', run_at=now + timedelta(seconds=delay))
+            logger.warning('Job %s #%s failed (attempt %s), retrying in %ss: %s',
+                           job.name, job.id, job.attempts, delay, error)
+            self._count('retried')
+        db.session.execute(
+            update(Job)
+            .where(Job.id == job.id, Job.status == 'running')
+            .values(**values)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+
+    # Enqueue scheduled jobs whose current interval hasn't been enqueued yet. The
+    # unique key makes sure only one process gets to add each run.
+    def enqueue_scheduled(self, now=None):
+        now = time.time() if now is None else now
+        for name, seconds in list(self._schedules.items()):
+            slot = int(now // seconds)
+            if self._scheduled_slots.get(name) == slot:
+                continue
+            self.enqueue(name, run_at=datetime.utcfromtimestamp(slot * seconds), unique_key=f'{name}:{slot}')
+            try:
+                db.session.commit()
+            except IntegrityError:
+                db.session.rollback()
+            self._scheduled_slots[name] = slot
+
+    def _count(self, outcome):
+        with self._lock:
+            self.stats[outcome] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.stats)
+
+    # Wake this process's workers, e.g. right after a job was committed
+    def wake(self):
+        self._wakeup.set()
+
+    def work(self, burst=False):
+        while not self._stop.is_set():
+            try:
+                with self._app.app_context():
+                    self.enqueue_scheduled()
+                    ran = self.run_next()
+            except Exception:
+                logger.exception('Job worker error')
+                ran = False
+            if ran:
+                continue
+            if burst:
+                return
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+
+    # Start this process's worker threads. Threads do not survive a fork, so each
+    # worker process starts its own on its first request (or at warm-up).
+    def start(self):
+        if self._app is None or not self.workers or self._worker_pid == os.getpid():
+            return
+        with self._lock:
+            if self._worker_pid == os.getpid():
+                return
+            self._worker_pid = os.getpid()
+            self._stop.clear()
+            self._threads = [
+                threading.Thread(target=self.work, name=f'job-worker-{i}', daemon=True) for i in range(self.workers)
+            ]
+        for thread in self._threads:
+            thread.start()
+
+    # Let running jobs finish, then stop this process's workers
+    def shutdown(self, timeout=30):
+        self._stop.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            if thread.ident is not None:
+                thread.join(timeout)
+        self._threads = []
+        self._worker_pid = None
+
+
+job_queue = JobQueue()
+
+
+# Jobs added in a transaction are worth picking up as soon as it commits
+@event.listens_for(Session, 'after_commit')
+def _wake_job_workers(session):
+    if session.info.pop('jobs_enqueued', False):
+        job_queue.wake()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_enqueued_jobs(session):
+    session.info.pop('jobs_enqueued', None)
+
+
+# Delete finished jobs older than the retention period
+@job_queue.task('prune-jobs')
+def prune_jobs(payload):
+    cutoff = datetime.utcnow() - timedelta(days=job_queue.retention_days)
+    db.session.execute(delete(Job).where(Job.status.in_(('done', 'failed')), Job.finished_at < cutoff))
+
+
+# Dedicated worker process, for deployments that set JOB_WORKERS=0 on the web
+# processes: `flask --app run jobs-worker`. --burst runs due jobs and exits.
+@click.command('jobs-worker')
+@click.option('--threads', type=int, default=1, show_default=True)
+@click.option('--burst', is_flag=True, help='Exit once no job is due.')
+@with_appcontext
+def jobs_worker_command(threads, burst):
+    if burst:
+        job_queue.work(burst=True)
+        return
+    click.echo(f'Running {threads} job worker thread(s); Ctrl+C to stop.')
+    workers = [threading.Thread(target=job_queue.work, daemon=True) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    try:
+        while any(worker.is_alive() for worker in workers):
+            time.sleep(1)
+    except KeyboardInterrupt:
+        click.echo('Stopping after the running jobs finish...')
+        job_queue.shutdown()
+        for worker in workers:
+            worker.join()
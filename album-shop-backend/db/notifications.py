@@ -0,0 +1,109 @@
+from sqlalchemy import func, select
+from db.app import db
+import json
+import logging
+import os
+import select as selectors
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+# PostgreSQL LISTEN/NOTIFY between worker processes, on one listening connection
+# per process, started on first use (threads don't survive a fork). Modules
+# register a handler per channel; each notification's JSON payload is passed to it
+# on the listener thread. A listener that reconnects may have missed notifications,
+# so it calls the on_connect callbacks once it is listening again. Elsewhere there
+# is no listener and send() does nothing.
+class Notifications:
+    def __init__(self, poll_interval=15):
+        self.poll_interval = poll_interval
+        self.enabled = False
+        self._app = None
+        self._handlers = {}
+        self._on_connect = {}
+        self._lock = threading.Lock()
+        self._listener_pid = None
+        self._listening_pid = None
+
+    def init_app(self, app):
+        self._app = app
+        with app.app_context():
+            self.enabled = db.engine.dialect.name == 'postgresql'
+
+    # Call handler(payload) for every notification on `channel`, and on_connect()
+    # every time the listener has (re)connected
+    def subscribe(self, channel, handler, on_connect=None):
+        self._handlers[channel] = handler
+        if on_connect is not None:
+            self._on_connect[channel] = on_connect
+
+    # True once this process's listener is connected
+    def listening(self):
+        return self._listening_pid == os.getpid()
+
+    # Start this process's listener, if it hasn't been started yet
+    def start(self):
+        if not self.enabled or self._listener_pid == os.getpid():
+            return
+        with self._lock:
+            if self._listener_pid == os.getpid():
+                return
+            self._listener_pid = os.getpid()
+        threading.Thread(target=self._listen, name='notification-listener', daemon=True).start()
+
+    # NOTIFY as part of `session`'s transaction; delivered when it commits
+    def notify(self, session, channel, payload):
+        session.execute(select(func.pg_notify(channel, json.dumps(payload, separators=(',', ':')))))
+
+    # NOTIFY straight away, outside any transaction
+    def send(self, channel, payload):
+        if not self.enabled:
+            return
+        with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as connection:
+            self.notify(connection, channel, payload)
+
+    def _listen(self):
+        while True:
+            try:
+                with self._app.app_context():
+                    connection = db.engine.raw_connection()
+                driver = connection.driver_connection  # Unavailable once detached
+                connection.detach()  # Kept out of the pool: it is switched to autocommit
+                try:
+                    driver.autocommit = True
+                    cursor = driver.cursor()
+                    for channel in self._handlers:
+                        cursor.execute(f'LISTEN {channel}')
+                    self._listening_pid = os.getpid()
+                    for callback in self._on_connect.values():
+                        callback()
+                    while True:
+                        for notify in self._receive(driver):
+                            self._dispatch(notify.channel, notify.payload)
+                finally:
+                    self._listening_pid = None
+                    connection.close()
+            except Exception:
+                logger.exception('Notification listener failed; reconnecting')
+                time.sleep(1)
+
+    # Notifications as they arrive, for up to poll_interval (psycopg 3 or psycopg2)
+    def _receive(self, driver):
+        if not hasattr(driver, 'poll'):
+            yield from driver.notifies(timeout=self.poll_interval)
+            return
+        if selectors.select([driver], [], [], self.poll_interval)[0]:
+            driver.poll()
+            while driver.notifies:
+                yield driver.notifies.pop(0)
+
+    def _dispatch(self, channel, payload):
+        try:
+            self._handlers[channel](json.loads(payload))
+        except Exception:
+            logger.exception('Could not handle notification on %s', channel)
+
+
+notifications = Notifications()
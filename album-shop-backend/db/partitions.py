@@ -0,0 +1,223 @@
+from datetime import date, datetime
+from flask.cli import with_appcontext
+from sqlalchemy import delete, func, select, text
+from db.app import db, Order, OrderArchive
+from db.jobs import job_queue
+import click
+import csv
+import gzip
+import logging
+import os
+import re
+
+logger = logging.getLogger(__name__)
+
+PARTITION_NAME = re.compile(r'^order_p(\d{4})_(\d{2})$')
+DEFAULT_PARTITION = 'order_default'  # Created by migration e2a8c4f6b9d1
+ARCHIVE_COLUMNS = (Order.id, Order.user_id, Order.album_id, Order.order_date, Order.quantity, Order.total_price)
+READ_BATCH_SIZE = 10000  # Rows per fetch while writing an archive
+LOCK_TIMEOUT = '5s'  # Give up detaching (and retry later) rather than queue writes behind the lock
+
+# Partitions of the order table, with the name of each one's relation
+PG_PARTITIONS = text(
+    "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+    "WHERE i.inhparent = '\"order\"'::regclass"
+)
+PG_IS_PARTITIONED = text("SELECT relkind = 'p' FROM pg_class WHERE oid = '\"order\"'::regclass")
+# Months with orders in the default partition, i.e. outside every monthly partition
+PG_DEFAULT_MONTHS = text(f"SELECT DISTINCT date_trunc('month', order_date)::date FROM {DEFAULT_PARTITION}")
+
+
+def month_start(day):
+    return date(day.year, day.month, 1)
+
+
+def add_months(month, months):
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f'order_p{month:%Y_%m}'
+
+
+# Orders by month. On PostgreSQL the order table is partitioned by range on
+# order_date, one partition per month (order_p2026_01, ...) plus a default one for
+# anything outside them; queries that filter on order_date only touch the months
+# they ask for, and the per-partition indexes stay the size of one month.
+# A daily job creates the partitions for the coming `ahead` months, and for any
+# month whose orders ended up in the default partition, moving those orders into
+# it. It then archives months older than `archive_after` months: their orders are
+# written to a gzipped CSV file, then the partition is detached and dropped (on
+# other databases, and for orders still in the default partition, the month is
+# deleted), and the month is recorded in order_archive.
+class OrderPartitions:
+    def __init__(self, ahead=3, archive_after=0):
+        self.ahead = ahead
+        self.archive_after = archive_after  # Months; 0 keeps every order in the database
+        self.path = None
+
+    def init_app(self, app):
+        self.path = app.config.get('ORDER_ARCHIVE_PATH') or os.path.join(app.instance_path, 'order-archive')
+        self.ahead = app.config.get('ORDER_PARTITIONS_AHEAD', self.ahead)
+        self.archive_after = app.config.get('ORDER_ARCHIVE_AFTER_MONTHS', self.archive_after)
+
+    # True once the migration has turned the order table into a partitioned one
+    def partitioned(self):
+        if db.session.get_bind().dialect.name != 'postgresql':
+            return False
+        return bool(db.session.execute(PG_IS_PARTITIONED).scalar())
+
+    # Months that have a partition, oldest first
+    def partitions(self):
+        months = []
+        for name in db.session.execute(PG_PARTITIONS).scalars():
+            match = PARTITION_NAME.match(name)
+            if match:
+                months.append(date(int(match[1]), int(match[2]), 1))
+        return sorted(months)
+
+    # Months that have orders in the default partition, oldest first
+    def default_months(self):
+        return sorted(db.session.execute(PG_DEFAULT_MONTHS).scalars())
+
+    # Create the partitions for this month, the next `ahead` months and every month
+    # with orders in the default partition, one transaction each
+    def create_ahead(self, today):
+        existing = set(self.partitions())
+        wanted = {add_months(month_start(today), i) for i in range(self.ahead + 1)}
+        wanted.update(self.default_months())
+        created = []
+        for month in sorted(wanted - existing):
+            self.create_partition(month)
+            created.append(month)
+        return created
+
+    # Attaching a partition fails while the default partition holds orders in its
+    # range, so they are moved over first. The new month is built as a plain table
+    # with a CHECK constraint matching its range, which lets ATTACH skip scanning it.
+    # The default partition stays locked until commit, so no order for the month
+    # can land there in between.
+    def create_partition(self, month):
+        name = partition_name(month)
+        start, end = month, add_months(month, 1)
+        in_range = f"order_date >= '{start}' AND order_date < '{end}'"
+        columns = ', '.join(column.name for column in ARCHIVE_COLUMNS)
+        db.session.execute(text(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'"))
+        db.session.execute(text(f'LOCK TABLE {DEFAULT_PARTITION} IN ACCESS EXCLUSIVE MODE'))
+        db.session.execute(text(f'CREATE TABLE {name} (LIKE "order" INCLUDING DEFAULTS)'))
+        moved = db.session.execute(text(
+            f'WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE {in_range} RETURNING {columns}) '
+            f'INSERT INTO {name} ({columns}) SELECT {columns} FROM moved'
+        )).rowcount
+        db.session.execute(text(f'ALTER TABLE {name} ADD CONSTRAINT {name}_range CHECK ({in_range})'))
+        db.session.execute(text(f"ALTER TABLE \"order\" ATTACH PARTITION {name} FOR VALUES FROM ('{start}') TO ('{end}')"))
+        db.session.execute(text(f'ALTER TABLE {name} DROP CONSTRAINT {name}_range'))
+        db.session.commit()
+        if moved:
+            logger.info('Moved %s order(s) from %s to %s', moved, DEFAULT_PARTITION, name)
+        return moved
+
+    # Months older than archive_after months that still have orders in the database
+    def cold_months(self, today):
+        cutoff = add_months(month_start(today), -self.archive_after)
+        archived = set(db.session.execute(select(OrderArchive.month)).scalars())
+        if self.partitioned():
+            months = set(self.partitions()) | set(self.default_months())
+            return sorted(month for month in months if month < cutoff and month not in archived)
+        oldest = db.session.execute(select(func.min(Order.order_date))).scalar()
+        months = []
+        month = month_start(oldest) if oldest else cutoff
+        while month < cutoff:
+            if month not in archived:
+                months.append(month)
+            month = add_months(month, 1)
+        return months
+
+    def archive_file(self, month):
+        return os.path.join(self.path, f'orders-{month:%Y-%m}.csv.gz')
+
+    # Move one month of orders to its archive file, in one transaction: the rows
+    # are written out and fsynced before they are removed, and only committed as
+    # archived once they are gone. Returns the number of orders archived.
+    def archive_month(self, month):
+        start = datetime.combine(month, datetime.min.time())
+        end = datetime.combine(add_months(month, 1), datetime.min.time())
+        partition = partition_name(month) if self.partitioned() and month in self.partitions() else None
+        if partition:
+            # Holds off writes to this month (not others) until it is dropped
+            db.session.execute(text(f'LOCK TABLE {partition} IN SHARE MODE'))
+
+        rows = db.session.execute(
+            select(*ARCHIVE_COLUMNS)
+            .where(Order.order_date >= start, Order.order_date < end)
+            .order_by(Order.id)
+            .execution_options(yield_per=READ_BATCH_SIZE)
+        )
+        path = self.archive_file(month)
+        os.makedirs(self.path, exist_ok=True)
+        temporary = f'{path}.{os.getpid()}.tmp'
+        count = 0
+        with open(temporary, 'wb') as raw:
+            with gzip.open(raw, 'wt', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow([column.name for column in ARCHIVE_COLUMNS])
+                for row in rows:
+                    writer.writerow([row.id, row.user_id, row.album_id, row.order_date.isoformat(),
+                                     row.quantity, row.total_price])
+                    count += 1
+            raw.flush()
+            os.fsync(raw.fileno())
+
+        if not count and not partition:
+            os.remove(temporary)
+            db.session.rollback()
+            return 0
+        os.replace(temporary, path)
+
+        if partition:
+            db.session.execute(text(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT}'"))
+            db.session.execute(text(f'ALTER TABLE "order" DETACH PARTITION {partition}'))
+            db.session.execute(text(f'DROP TABLE {partition}'))
+        else:
+            db.session.execute(
+                delete(Order)
+                .where(Order.order_date >= start, Order.order_date < end)
+                .execution_options(synchronize_session=False)
+            )
+        db.session.add(OrderArchive(month=month, path=path, orders=count))
+        db.session.commit()
+        logger.info('Archived %s order(s) from %s to %s', count, f'{month:%Y-%m}', path)
+        return count
+
+    # Everything the daily job does; returns what changed
+    def maintain(self, today=None):
+        today = today or datetime.utcnow().date()
+        created = self.create_ahead(today) if self.partitioned() else []
+        archived = {}
+        if self.archive_after > 0:
+            for month in self.cold_months(today):
+                archived[month] = self.archive_month(month)
+        return {'created': created, 'archived': archived}
+
+
+order_partitions = OrderPartitions()
+
+
+# Scheduled (ORDER_PARTITION_MAINTENANCE_SECONDS)
+@job_queue.task('maintain-order-partitions', max_attempts=3)
+def maintain_order_partitions_job(payload):
+    order_partitions.maintain()
+
+
+# Manual run: `flask --app run maintain-order-partitions`
+@click.command('maintain-order-partitions')
+@with_appcontext
+def maintain_order_partitions_command():
+    changes = order_partitions.maintain()
+    for month in changes['created']:
+        click.echo(f'Created partition {partition_name(month)}')
+    for month, count in changes['archived'].items():
+        click.echo(f'Archived {count} order(s) from {month:%Y-%m} to {order_partitions.archive_file(month)}')
+    if not changes['created'] and not changes['archived']:
+        click.echo('Order partitions are up to date.')
@@ -0,0 +1,119 @@
+from flask.cli import with_appcontext
+from sqlalchemy import update, select, func
+from db.app import db, Album, Review
+from db.jobs import job_queue
+import click
+import logging
+
+logger = logging.getLogger(__name__)
+
+RATINGS = (1, 2, 3, 4, 5)
+AGGREGATE_COLUMNS = ['rating_count', 'rating_sum'] + [f'rating_{r}' for r in RATINGS]
+NO_REVIEWS = dict.fromkeys(AGGREGATE_COLUMNS, 0)
+
+
+def valid_rating(rating):
+    return isinstance(rating, int) and not isinstance(rating, bool) and rating in RATINGS
+
+
+def histogram_column(rating):
+    return getattr(Album, f'rating_{rating}')
+
+
+# Adjust an album's review aggregates in one atomic UPDATE.
+# Pass `removed` for a deleted/old rating and `added` for a new one.
+def apply_rating_change(album_id, removed=None, added=None):
+    if removed == added:
+        return
+    values = {}
+    count_delta = 0
+    sum_delta = 0
+    if removed is not None:
+        count_delta -= 1
+        sum_delta -= removed
+        values[f'rating_{removed}'] = histogram_column(removed) - 1
+    if added is not None:
+        count_delta += 1
+        sum_delta += added
+        values[f'rating_{added}'] = histogram_column(added) + 1
+    if count_delta:
+        values['rating_count'] = Album.rating_count + count_delta
+    values['rating_sum'] = Album.rating_sum + sum_delta
+
+    db.session.execute(
+        update(Album)
+        .where(Album.id == album_id)
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+
+
+# Aggregates per album from Review: {album_id: {column: value}}
+def review_aggregates(album_id=None):
+    statement = select(Review.album_id, Review.rating, func.count()).group_by(Review.album_id, Review.rating)
+    if album_id is not None:
+        statement = statement.where(Review.album_id == album_id)
+    actual = {}
+    for row_album_id, rating, count in db.session.execute(statement):
+        stats = actual.setdefault(row_album_id, dict(NO_REVIEWS))
+        stats['rating_count'] += count
+        stats['rating_sum'] += rating * count
+        if rating in RATINGS:
+            stats[f'rating_{rating}'] = count
+    return actual
+
+
+def drifted_from(row, expected):
+    return any(getattr(row, c) != expected[c] for c in AGGREGATE_COLUMNS)
+
+
+# Recompute aggregates from Review and report (optionally fix) albums that drifted
+def reconcile_ratings(fix=False):
+    actual = review_aggregates()
+    stored = db.session.execute(select(Album.id, *[getattr(Album, c) for c in AGGREGATE_COLUMNS]))
+    drifted = [row.id for row in stored if drifted_from(row, actual.get(row.id, NO_REVIEWS))]
+    if not fix:
+        return drifted
+
+    # Reviews may have changed since the scan. Every review write also updates its
+    # album row, so with the row locked none can commit between the recount and
+    # the rewrite; albums that turn out to be consistent are left alone.
+    fixed = []
+    for album_id in drifted:
+        row = db.session.execute(
+            select(Album.id, *[getattr(Album, c) for c in AGGREGATE_COLUMNS])
+            .where(Album.id == album_id)
+            .with_for_update()
+        ).first()
+        expected = review_aggregates(album_id).get(album_id, NO_REVIEWS)
+        if row is not None and drifted_from(row, expected):
+            db.session.execute(
+                update(Album)
+                .where(Album.id == album_id)
+                .values(**expected)
+                .execution_options(synchronize_session=False)
+            )
+            fixed.append(album_id)
+        db.session.commit()
+    return fixed
+
+
+# Scheduled (RATINGS_RECONCILE_SECONDS)
+@job_queue.task('reconcile-ratings', max_attempts=3)
+def reconcile_ratings_job(payload):
+    fixed = reconcile_ratings(fix=True)
+    if fixed:
+        logger.warning('Fixed rating drift on %s album(s): %s', len(fixed), ', '.join(map(str, fixed)))
+
+
+# Manual drift check: `flask --app run reconcile-ratings [--fix]`
+@click.command('reconcile-ratings')
+@click.option('--fix', is_flag=True, help='Rewrite drifted aggregates from the Review table.')
+@with_appcontext
+def reconcile_ratings_command(fix):
+    drifted = reconcile_ratings(fix=fix)
+    if not drifted:
+        click.echo('Rating aggregates are consistent.')
+        return
+    action = 'Fixed' if fix else 'Found'
+    click.echo(f'{action} drift on {len(drifted)} album(s): {", ".join(map(str, drifted))}')
@@ -0,0 +1,253 @@
+from flask.cli import with_appcontext
+from sqlalchemy import func, select
+from db.app import db, Order
+from db.jobs import job_queue
+import click
+import logging
+import os
+import threading
+import time
+
+# Optional: recommendations need NumPy and SciPy; without them the endpoint answers 503.
+# They are imported on first use (see CoPurchaseIndex.available): together they
+# take longer to import than the rest of the app.
+np = sparse = None
+
+logger = logging.getLogger(__name__)
+
+READ_BATCH_SIZE = 100000  # Order rows per fetch while reading purchases
+
+# Arrays in the index file. Web workers only read the top_* ones.
+TOP_ARRAYS = ('top_indptr', 'top_indices', 'top_scores')
+
+
+# Per row of a CSR matrix, its k largest entries as CSR arrays, best first (ties go
+# to the lower column). One lexsort over all entries, no Python loop per row.
+def top_k(matrix, k):
+    counts = np.diff(matrix.indptr)
+    rows = np.repeat(np.arange(matrix.shape[0]), counts)
+    order = np.lexsort((matrix.indices, -matrix.data, rows))
+    keep = np.arange(len(order)) - matrix.indptr[rows] < k
+    indptr = np.concatenate(([0], np.cumsum(np.minimum(counts, k))))
+    return indptr, matrix.indices[order][keep], matrix.data[order][keep]
+
+
+# Replace the top-k rows listed in `rows` (sorted) with the rows of `sub`, a top_k()
+# result computed for just those rows; other rows are copied over unchanged.
+def splice_top_k(top, rows, sub, n_rows):
+    indptr, indices, scores = top
+    indptr = np.concatenate((indptr, np.full(n_rows + 1 - len(indptr), indptr[-1])))
+    lengths = np.diff(indptr)
+    owner = np.repeat(np.arange(n_rows), lengths)
+    kept = ~np.isin(owner, rows)
+    lengths[rows] = np.diff(sub[0])
+    # Stable sort by row keeps each row's entries in their best-first order
+    owners = np.concatenate((owner[kept], np.repeat(rows, np.diff(sub[0]))))
+    order = np.argsort(owners, kind='stable')
+    return (
+        np.concatenate(([0], np.cumsum(lengths))),
+        np.concatenate((indices[kept], sub[1]))[order],
+        np.concatenate((scores[kept], sub[2]))[order],
+    )
+
+
+# Albums bought together: C[a, b] counts the customers who bought both a and b.
+# With P the binary customer x album purchase matrix, C = P.T @ P minus its diagonal.
+#
+# A job rebuilds the index from the order table and saves it, together with each
+# album's top-k neighbours, to one .npz file. Between rebuilds the same job folds in
+# orders placed since the last run: only the new (customer, album) pairs N are read,
+# and C grows by P.T @ N + N.T @ P + N.T @ N over just the customers involved, so
+# only the albums they touch get their top-k recomputed. Cancelled orders, and
+# orders that commit after a later id was already indexed, wait for the next rebuild.
+#
+# Web workers load just the top-k arrays and reload them when the file changes;
+# a lookup is an array slice, without any SQL.
+class CoPurchaseIndex:
+    def __init__(self, top_k=20, reload_interval=5, rebuild_interval=86400):
+        self.top_k = top_k
+        self.reload_interval = reload_interval
+        self.rebuild_interval = rebuild_interval
+        self.path = None
+        self._lock = threading.Lock()
+        self._top = None
+        self._mtime = None
+        self._checked_at = None
+        self._state = None  # (mtime, arrays) kept by the process that refreshes the file
+
+    def init_app(self, app):
+        self.path = app.config.get('RECOMMENDATIONS_PATH') or os.path.join(app.instance_path, 'recommendations.npz')
+        self.top_k = app.config.get('RECOMMENDATIONS_TOP_K', self.top_k)
+        self.rebuild_interval = app.config.get('RECOMMENDATIONS_REBUILD_SECONDS', self.rebuild_interval)
+
+    # True once NumPy and SciPy are imported; check before any other call
+    @property
+    def available(self):
+        global np, sparse
+        if np is None:
+            try:
+                import numpy
+                from scipy import sparse as scipy_sparse
+            except ImportError:
+                return False
+            np, sparse = numpy, scipy_sparse
+        return True
+
+    # [(album_id, score)] for the albums most often bought with `album_id`, best first
+    def recommend(self, album_id, limit):
+        top = self._current()
+        if top is None or not 0 <= album_id < len(top[0]) - 1:
+            return []
+        indptr, indices, scores = top
+        start = indptr[album_id]
+        end = min(indptr[album_id + 1], start + limit)
+        return list(zip(indices[start:end].tolist(), scores[start:end].tolist()))
+
+    # The serving arrays, reloaded if the file changed (checked every reload_interval seconds)
+    def _current(self):
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < self.reload_interval:
+            return self._top
+        with self._lock:
+            if self._checked_at is not None and now - self._checked_at < self.reload_interval:
+                return self._top
+            self._checked_at = now
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+            except OSError:
+                return self._top
+            if mtime != self._mtime:
+                with np.load(self.path) as saved:
+                    self._top = tuple(saved[name] for name in TOP_ARRAYS)
+                self._mtime = mtime
+        return self._top
+
+    # (customer ids, album ids) of orders with from_id < id <= to_id. Fetched from the
+    # DBAPI cursor in large batches: building SQLAlchemy rows would cost more than
+    # the whole matrix computation. Duplicates are merged by _purchases().
+    def _read_pairs(self, from_id, to_id):
+        statement = select(Order.user_id, Order.album_id).where(Order.id > from_id, Order.id <= to_id)
+        connection = db.session.connection()
+        sql = str(statement.compile(dialect=connection.dialect, compile_kwargs={'literal_binds': True}))
+        cursor = connection.connection.cursor()
+        try:
+            cursor.execute(sql)
+            chunks = []
+            while rows := cursor.fetchmany(READ_BATCH_SIZE):
+                chunks.append(np.array(rows, dtype=np.int64))
+        finally:
+            cursor.close()
+        pairs = np.concatenate(chunks) if chunks else np.empty((0, 2), dtype=np.int64)
+        return pairs[:, 0], pairs[:, 1]
+
+    @staticmethod
+    def _purchases(users, albums, shape):
+        matrix = sparse.csr_matrix((np.ones(len(users), dtype=np.int32), (users, albums)), shape=shape)
+        matrix.data[:] = 1  # Bought at least once; repeat purchases don't count twice
+        return matrix
+
+    @staticmethod
+    def _without_diagonal(matrix):
+        matrix = (matrix - sparse.diags(matrix.diagonal(), dtype=matrix.dtype)).tocsr()
+        matrix.eliminate_zeros()
+        return matrix
+
+    # Recompute everything from the order table
+    def rebuild(self):
+        last_order_id = db.session.execute(select(func.max(Order.id))).scalar() or 0
+        users, albums = self._read_pairs(0, last_order_id)
+        shape = (int(users.max(initial=0)) + 1, int(albums.max(initial=0)) + 1)
+        purchases = self._purchases(users, albums, shape)
+        co = self._without_diagonal(purchases.T @ purchases)
+        self._save(purchases, co, top_k(co, self.top_k), last_order_id, time.time())
+        return {'last_order_id': last_order_id, 'pairs': purchases.nnz, 'albums': shape[1], 'entries': co.nnz}
+
+    # Fold in orders placed since the last save; rebuilds instead when there is no
+    # index yet or the last rebuild is older than rebuild_interval
+    def refresh(self):
+        state = self._load_state()
+        if state is None or time.time() - float(state['built_at']) >= self.rebuild_interval:
+            return self.rebuild()
+
+        purchases = sparse.csr_matrix(
+            (np.ones(len(state['purchases_indices']), dtype=np.int32), state['purchases_indices'],
+             state['purchases_indptr']), shape=tuple(state['purchases_shape'])
+        )
+        co = sparse.csr_matrix((state['co_data'], state['co_indices'], state['co_indptr']),
+                               shape=(purchases.shape[1],) * 2)
+        from_id = int(state['last_order_id'])
+        last_order_id = db.session.execute(select(func.max(Order.id))).scalar() or 0
+        users, albums = self._read_pairs(from_id, last_order_id)
+        if not len(users):
+            return {'last_order_id': from_id, 'pairs': 0, 'albums': 0}
+
+        shape = (max(purchases.shape[0], int(users.max()) + 1), max(purchases.shape[1], int(albums.max()) + 1))
+        purchases.resize(shape)
+        co.resize((shape[1], shape[1]))
+        new = self._purchases(users, albums, shape)
+        new = new - new.multiply(purchases)  # Only pairs the customer hadn't bought before
+        new.eliminate_zeros()
+
+        customers = np.unique(new.nonzero()[0])
+        before, added = purchases[customers], new[customers]
+        delta = self._without_diagonal(before.T @ added + added.T @ before + added.T @ added)
+        co = (co + delta).tocsr()
+        purchases = (purchases + new).tocsr()
+
+        touched = np.unique(delta.nonzero()[0])
+        top = (state['top_indptr'], state['top_indices'], state['top_scores'])
+        top = splice_top_k(top, touched, top_k(co[touched], self.top_k), shape[1])
+        self._save(purchases, co, top, last_order_id, float(state['built_at']))
+        return {'last_order_id': last_order_id, 'pairs': int(new.nnz), 'albums': len(touched)}
+
+    # The full saved index, cached in this process while the file is unchanged
+    def _load_state(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            return None
+        if self._state is None or self._state[0] != mtime:
+            with np.load(self.path) as saved:
+                self._state = (mtime, dict(saved))
+        return self._state[1]
+
+    # Written to a temporary file and renamed, so readers never see a partial index.
+    # Two refreshes racing each other both write a complete, valid index.
+    def _save(self, purchases, co, top, last_order_id, built_at):
+        arrays = {
+            'purchases_indptr': purchases.indptr, 'purchases_indices': purchases.indices,
+            'purchases_shape': np.array(purchases.shape),
+            'co_indptr': co.indptr, 'co_indices': co.indices, 'co_data': co.data,
+            'top_indptr': top[0], 'top_indices': top[1], 'top_scores': top[2],
+            'last_order_id': np.array(last_order_id), 'built_at': np.array(built_at),
+        }
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temporary = f'{self.path}.{os.getpid()}.tmp'
+        with open(temporary, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(temporary, self.path)
+        self._state = (os.stat(self.path).st_mtime_ns, arrays)
+
+
+co_purchases = CoPurchaseIndex()
+
+
+# Scheduled (RECOMMENDATIONS_REFRESH_SECONDS). Not retried: the next run catches up.
+@job_queue.task('refresh-recommendations', max_attempts=1)
+def refresh_recommendations_job(payload):
+    if not co_purchases.available:
+        logger.warning('Skipping refresh-recommendations: numpy and scipy are not installed')
+        return
+    co_purchases.refresh()
+
+
+# Manual rebuild: `flask --app run rebuild-recommendations`
+@click.command('rebuild-recommendations')
+@with_appcontext
+def rebuild_recommendations_command():
+    if not co_purchases.available:
+        raise click.ClickException('Recommendations need numpy and scipy: pip install numpy scipy')
+    started = time.perf_counter()
+    stats = co_purchases.rebuild()
+    click.echo(f"Indexed {stats['pairs']} customer/album pair(s) up to order #{stats['last_order_id']}: "
+               f"{stats['entries']} album pair(s) in {time.perf_counter() - started:.1f}s -> {co_purchases.path}")
@@ -0,0 +1,188 @@
+from flask import g, request, has_request_context
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+from db.app import db
+import itertools
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Writes answer with this header; clients send the latest value back on reads
+CONSISTENCY_HEADER = 'X-Read-Consistency'
+READ_METHODS = ('GET', 'HEAD')
+
+# Replay position and lag of a PostgreSQL standby (0 lag when it has replayed
+# everything it received, however long ago the last write was)
+PG_REPLICA_STATUS = text(
+    'SELECT COALESCE(pg_last_wal_replay_lsn(), pg_current_wal_lsn())::text, '
+    'CASE WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 '
+    'ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END'
+)
+PG_PRIMARY_POSITION = text('SELECT pg_current_wal_lsn()::text')
+
+
+# PostgreSQL WAL position '16/B374D848' as a comparable integer
+def parse_lsn(lsn):
+    high, _, low = lsn.partition('/')
+    return (int(high, 16) << 32) + int(low, 16)
+
+
+class Replica:
+    def __init__(self, name, engine):
+        self.name = name
+        self.engine = engine
+        self.postgres = engine.dialect.name == 'postgresql'
+        self.up = None
+        self.lag = None
+        self.position = None  # Replayed WAL position (PostgreSQL only)
+        self.checked_at = None
+        self.lock = threading.Lock()
+
+
+# Sends reads to read replicas (SQLALCHEMY_BINDS 'replica1', 'replica2', ...).
+# GET requests to the endpoints passed to route_reads() run their SELECTs on a
+# replica, round-robin, unless:
+#   - the replica is down or further behind than max_lag seconds (lag-aware fallback);
+#   - the client sent X-Read-Consistency from one of its own writes and the replica
+#     hasn't replayed that write yet (read-your-writes).
+# Each committed write answers with X-Read-Consistency: the primary's WAL position
+# on PostgreSQL. Other databases can't report replication progress, so there the
+# value is the write's time and reads stay on the primary for max_lag seconds.
+# Replica status is checked at most every check_interval seconds per process.
+class ReplicaRouter:
+    def __init__(self, max_lag=5.0, check_interval=1.0):
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.replicas = []
+        self.stats = {}
+        self.routing = {'replica': 0, 'lag': 0, 'unavailable': 0, 'read_your_writes': 0}
+        self._endpoints = set()
+        self._next = itertools.count()
+        self._lock = threading.Lock()
+        self._postgres = False
+
+    def init_app(self, app):
+        self.max_lag = app.config.get('REPLICA_MAX_LAG_SECONDS', self.max_lag)
+        self.check_interval = app.config.get('REPLICA_CHECK_SECONDS', self.check_interval)
+        with app.app_context():
+            self._postgres = db.engine.dialect.name == 'postgresql'
+            self.replicas = [Replica(key, engine) for key, engine in sorted(db.engines.items(), key=str)
+                             if key is not None and key.startswith('replica')]
+            self.stats = {name: 0 for name in ['primary'] + [replica.name for replica in self.replicas]}
+            for name, engine in [('primary', db.engine)] + [(r.name, r.engine) for r in self.replicas]:
+                event.listen(engine, 'before_cursor_execute', self._query_counter(name))
+        if self.replicas:
+            app.before_request(self._route_request)
+            app.after_request(self._stamp_write)
+
+    # Route GETs to these endpoints ('album_bp.get_albums', ...) to the replicas
+    def route_reads(self, *endpoints):
+        self._endpoints.update(endpoints)
+
+    def _query_counter(self, name):
+        def count(conn, cursor, statement, parameters, context, executemany):
+            with self._lock:
+                self.stats[name] += 1
+        return count
+
+    def _count(self, outcome):
+        with self._lock:
+            self.routing[outcome] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'queries': dict(self.stats),
+                'routing': dict(self.routing),
+                'replicas': {r.name: {'up': r.up, 'lag': r.lag} for r in self.replicas},
+            }
+
+    def _route_request(self):
+        if request.method not in READ_METHODS or request.endpoint not in self._endpoints:
+            return
+        replica, outcome = self.choose(request.headers.get(CONSISTENCY_HEADER))
+        self._count(outcome)
+        g.read_your_writes = outcome == 'read_your_writes'  # See ResponseCache.cached
+        if replica is not None:
+            db.session.info['read_engine'] = replica.engine
+
+    # A replica fit to serve a read after `token` (None: no write to wait for), with
+    # the routing outcome; (None, reason) when the read has to go to the primary
+    def choose(self, token=None):
+        start = next(self._next)
+        reason = 'unavailable'
+        for i in range(len(self.replicas)):
+            replica = self.replicas[(start + i) % len(self.replicas)]
+            self._check(replica)
+            # Read once: another thread's _check may be updating them. A replica
+            # whose lag isn't known (yet, or any more) is unavailable.
+            up, lag = replica.up, replica.lag
+            if not up or lag is None:
+                continue
+            if lag > self.max_lag:
+                reason = 'lag' if reason == 'unavailable' else reason
+                continue
+            if token and not self._has_replayed(replica, token):
+                reason = 'read_your_writes'
+                continue
+            return replica, 'replica'
+        return None, reason
+
+    def _has_replayed(self, replica, token):
+        try:
+            if '/' in token:
+                return replica.position is not None and replica.position >= parse_lsn(token)
+            return time.time() - float(token) >= self.max_lag
+        except ValueError:
+            return True  # Not a token we issued; nothing to wait for
+
+    # Refresh a replica's status if it is older than check_interval. Only one
+    # thread checks at a time; the others carry on with the last known status.
+    def _check(self, replica):
+        now = time.monotonic()
+        if replica.checked_at is not None and now - replica.checked_at < self.check_interval:
+            return
+        if not replica.lock.acquire(blocking=False):
+            return
+        try:
+            replica.checked_at = now
+            with replica.engine.connect() as connection:
+                if replica.postgres:
+                    position, lag = connection.execute(PG_REPLICA_STATUS).one()
+                    replica.position, replica.lag = parse_lsn(position), float(lag)
+                else:
+                    connection.execute(text('SELECT 1'))
+                    replica.lag = 0.0
+            if not replica.up:
+                logger.info('Read replica %s is up', replica.name)
+            replica.up = True
+        except Exception as e:
+            if replica.up is not False:
+                logger.warning('Read replica %s is unavailable, reading from the primary: %s', replica.name, e)
+            replica.up = False
+            replica.lag = None
+        finally:
+            replica.lock.release()
+
+    # Give responses to successful writes the token their reads should wait for
+    def _stamp_write(self, response):
+        if g.pop('database_written', False) and response.status_code < 400:
+            if self._postgres:
+                with db.engine.connect() as connection:
+                    token = connection.execute(PG_PRIMARY_POSITION).scalar()
+            else:
+                token = f'{time.time():.3f}'
+            response.headers[CONSISTENCY_HEADER] = token
+        return response
+
+
+replica_router = ReplicaRouter()
+
+
+# Note that a write request committed to the primary; see _stamp_write
+@event.listens_for(Session, 'after_commit')
+def _remember_write(session):
+    if replica_router.replicas and has_request_context() and request.method not in READ_METHODS:
+        g.database_written = True
@@ -0,0 +1,144 @@
+from datetime import date, datetime, timedelta
+from flask.cli import with_appcontext
+from sqlalchemy import bindparam, delete, func, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from db.app import db, Album, Order, OrderArchive, AlbumSalesDaily, AlbumSalesMonthly, GenreSalesDaily
+from db.jobs import job_queue
+import click
+
+# Each rollup table and the key columns its rows are grouped by
+ROLLUPS = (
+    (AlbumSalesDaily.__table__, ('day', 'album_id')),
+    (AlbumSalesMonthly.__table__, ('month', 'album_id')),
+    (GenreSalesDaily.__table__, ('day', 'genre')),
+)
+
+
+def _insert(table):
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        return pg_insert(table)
+    if dialect == 'sqlite':
+        return sqlite_insert(table)
+    raise RuntimeError(f'Sales rollup is not supported on {dialect}')
+
+
+# First day of the month of a date column, in SQL
+def month_of(column):
+    if db.session.get_bind().dialect.name == 'postgresql':
+        return func.date_trunc('month', column).cast(db.Date)
+    return func.date(column, 'start of month')
+
+
+def _upsert(table, keys):
+    genre = select(Album.genre).where(Album.id == bindparam('line_album_id')).scalar_subquery()
+    values = {
+        'day': bindparam('line_day'),
+        'month': bindparam('line_month'),
+        'album_id': bindparam('line_album_id'),
+        'genre': genre,
+        'units': bindparam('line_units'),
+        'revenue': bindparam('line_revenue'),
+        'orders': bindparam('line_orders'),
+    }
+    stmt = _insert(table).values({name: value for name, value in values.items() if name in table.c})
+    return stmt.on_conflict_do_update(
+        index_elements=[table.c[key] for key in keys],
+        set_={column: table.c[column] + stmt.excluded[column] for column in ('units', 'revenue', 'orders')},
+    )
+
+
+# Add order lines to every rollup, in the caller's transaction. `lines` is
+# [(day, album_id, units, revenue)] and each line counts as one order;
+# pass sign=-1 to take deleted orders back out.
+def record_sales(lines, sign=1):
+    if not lines:
+        return
+    params = [{
+        'line_day': day,
+        'line_month': day.replace(day=1),
+        'line_album_id': album_id,
+        'line_units': sign * units,
+        'line_revenue': sign * revenue,
+        'line_orders': sign,
+    } for day, album_id, units, revenue in lines]
+    for table, keys in ROLLUPS:
+        db.session.execute(_upsert(table, keys), params)
+
+
+# Queue the rollup update for order lines [(order_date, album_id, units, revenue)]
+# in the caller's transaction; a job worker applies it shortly after the commit
+def defer_sales(lines, sign=1):
+    if lines:
+        job_queue.enqueue('record-sales', {
+            'lines': [[order_date.date().isoformat(), album_id, units, revenue]
+                      for order_date, album_id, units, revenue in lines],
+            'sign': sign,
+        })
+
+
+@job_queue.task('record-sales')
+def record_sales_job(payload):
+    lines = [(date.fromisoformat(day), album_id, units, revenue) for day, album_id, units, revenue in payload['lines']]
+    record_sales(lines, payload['sign'])
+
+
+# Recompute the rollups from the Order table, for every day from `since` on (or
+# all days). Safe to run periodically; fixes any drift. A partial rebuild starts
+# at the beginning of `since`'s month so monthly rows stay whole. Months whose
+# orders were archived (db/partitions.py) keep their rollups as they are.
+def rebuild_sales_rollup(since=None):
+    # Updates still waiting in the queue are applied first, in this transaction, so
+    # none of them gets added on top of the rebuilt totals afterwards. On PostgreSQL
+    # the whole rebuild reads one snapshot, so orders and queued updates agree; the
+    # isolation level only applies if it is set before the transaction's first query.
+    if db.session.get_bind().dialect.name == 'postgresql':
+        db.session.connection(execution_options={'isolation_level': 'REPEATABLE READ'})
+    if since is not None:
+        since = since.replace(day=1)
+    last_archived = db.session.execute(select(func.max(OrderArchive.month))).scalar()
+    if last_archived is not None:
+        first_live = (last_archived.replace(day=28) + timedelta(days=4)).replace(day=1)
+        since = max(since, first_live) if since is not None else first_live
+    job_queue.drain('record-sales')
+    day = func.date(Order.order_date)
+    # Group-by columns in each table's column order, followed by the three sums
+    rebuilds = (
+        (AlbumSalesDaily.__table__, (day, Order.album_id, Album.genre)),
+        (AlbumSalesMonthly.__table__, (month_of(day), Order.album_id, Album.genre)),
+        (GenreSalesDaily.__table__, (day, Album.genre)),
+    )
+    rows = 0
+    for table, columns in rebuilds:
+        rollup = (
+            select(*columns, func.sum(Order.quantity), func.sum(Order.total_price), func.count())
+            .join(Order.album)
+            .group_by(*columns)
+        )
+        cleanup = delete(table)
+        if since is not None:
+            rollup = rollup.where(Order.order_date >= datetime.combine(since, datetime.min.time()))
+            cleanup = cleanup.where(list(table.c)[0] >= since)
+        db.session.execute(cleanup)
+        rows += db.session.execute(table.insert().from_select([c.name for c in table.c], rollup)).rowcount
+    db.session.commit()
+    return rows
+
+
+# Scheduled rebuild (SALES_ROLLUP_REBUILD_SECONDS): the month so far, or last
+# month as well just after the 1st
+@job_queue.task('rebuild-sales-rollup', max_attempts=3)
+def rebuild_sales_rollup_job(payload):
+    since = date.fromisoformat(payload['since']) if payload else datetime.utcnow().date() - timedelta(days=1)
+    rebuild_sales_rollup(since)
+
+
+# Manual rebuild: `flask --app run rebuild-sales-rollup --since 2026-01-01`
+@click.command('rebuild-sales-rollup')
+@click.option('--since', type=click.DateTime(formats=['%Y-%m-%d']), help='Only rebuild from this month on.')
+@with_appcontext
+def rebuild_sales_rollup_command(since):
+    rows = rebuild_sales_rollup(since.date() if since else None)
+    scope = f'since {since:%Y-%m}' if since else 'for all time'
+    click.echo(f'Rebuilt {rows} rollup row(s) {scope}.')
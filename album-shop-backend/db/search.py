@@ -0,0 +1,62 @@
+from sqlalchemy import func, literal_column, select, case, and_, cast, Float, Numeric
+from db.app import db, Album
+
+SEARCH_INDEX_NAME = 'ix_album_search_trgm'
+DEFAULT_SIMILARITY_THRESHOLD = 0.3
+
+
+# The searchable text of an album. Must stay identical to the expression the
+# trigram index is built on (migration 1e7b3c5d9a20); literal_column keeps the
+# separator out of bind parameters so the planner can match the index.
+def search_document():
+    separator = literal_column("' '")
+    return func.lower(Album.title + separator + Album.artist + separator + Album.genre)
+
+
+def normalize_query(q):
+    return ' '.join(q.lower().split())
+
+
+# Ranked album search. On Postgres this uses pg_trgm word similarity over a GIN
+# index, which handles prefixes ("beat" -> "beatles") and typos ("beatels").
+# Other backends (SQLite in development) fall back to substring matching.
+# Returns one page of rows holding `columns` plus a `score`.
+def search_albums(q, limit, offset=0, threshold=DEFAULT_SIMILARITY_THRESHOLD, columns=(Album,)):
+    q = normalize_query(q)
+    if db.session.get_bind().dialect.name == 'postgresql':
+        return _search_trigram(q, limit, offset, threshold, columns)
+    return _search_substring(q, limit, offset, columns)
+
+
+def _search_trigram(q, limit, offset, threshold, columns):
+    document = search_document()
+    score = func.word_similarity(q, document)
+    # `<%` only uses the index with the threshold set as a GUC, scoped to this transaction
+    db.session.execute(
+        select(func.set_config('pg_trgm.word_similarity_threshold', str(threshold), True))
+    )
+    return db.session.execute(
+        select(*columns, cast(func.round(cast(score, Numeric), 4), Float).label('score'))
+        .where(document.op('%>')(q))
+        .order_by(score.desc(), Album.id)
+        .limit(limit)
+        .offset(offset)
+    ).all()
+
+
+def _search_substring(q, limit, offset, columns):
+    document = search_document()
+    terms = q.split()
+    # Rank title-prefix matches first, then artist-prefix matches
+    score = case(
+        (func.lower(Album.title).startswith(q), 1.0),
+        (func.lower(Album.artist).startswith(q), 0.8),
+        else_=0.5
+    )
+    return db.session.execute(
+        select(*columns, score.label('score'))
+        .where(and_(*[document.contains(term, autoescape=True) for term in terms]))
+        .order_by(score.desc(), Album.id)
+        .limit(limit)
+        .offset(offset)
+    ).all()
@@ -0,0 +1,47 @@
+# gunicorn settings for production: gunicorn -c gunicorn.conf.py wsgi:app
+import multiprocessing
+import os
+
+bind = os.getenv('BIND', '0.0.0.0:5000')
+
+# Processes scale with cores; threads let each process overlap requests waiting on the database
+workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.getenv('GUNICORN_THREADS', 4))
+
+# With GUNICORN_WORKER_CLASS=gevent each open connection is a greenlet rather than a
+# thread, so a few processes can hold thousands of idle /albums/events streams
+worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', 2000))
+
+# Load the app once in the master so workers fork with the code already imported.
+# gevent has to patch the standard library before the app is imported, so it loads per worker.
+preload_app = worker_class == 'gthread'
+
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 5))
+
+# Recycle workers periodically to bound memory growth; jitter avoids restarting all at once
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 10000))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', 1000))
+
+accesslog = os.getenv('GUNICORN_ACCESS_LOG', '-')
+
+
+def post_fork(server, worker):
+    from wsgi import reset_pool
+    reset_pool()
+
+
+def post_worker_init(worker):
+    from wsgi import warm_up
+    try:
+        warm_up()
+    except Exception:
+        worker.log.exception('Worker warm-up failed')
+
+
+# Runs after in-flight requests finish (SIGTERM waits up to graceful_timeout)
+def worker_exit(server, worker):
+    from wsgi import close_pool
+    close_pool()
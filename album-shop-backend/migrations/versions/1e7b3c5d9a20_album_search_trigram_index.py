@@ -0,0 +1,36 @@
+"""trigram index for album search
+
+Postgres only: enables pg_trgm and indexes the lower-cased title/artist/genre
+document used by GET /albums/search (see db/search.py). Other backends fall
+back to substring matching and get no index.
+
+Revision ID: 1e7b3c5d9a20
+Revises: c52a7e0b9f14
+Create Date: 2026-10-17 18:50:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '1e7b3c5d9a20'
+down_revision = 'c52a7e0b9f14'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.execute(
+        "CREATE INDEX ix_album_search_trgm ON album "
+        "USING gin (lower(title || ' ' || artist || ' ' || genre) gin_trgm_ops)"
+    )
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute('DROP INDEX IF EXISTS ix_album_search_trgm')
@@ -0,0 +1,39 @@
+"""unique natural key for albums
+
+(artist, title, release_date) identifies an album for the bulk catalog import,
+which upserts on it with INSERT ... ON CONFLICT (see db/catalog_import.py).
+Fails with a list of offenders if the table already holds duplicates; merge or
+delete those first.
+
+Revision ID: 5a9c1e3f7b24
+Revises: 1e7b3c5d9a20
+Create Date: 2026-10-17 19:05:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5a9c1e3f7b24'
+down_revision = '1e7b3c5d9a20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    duplicates = op.get_bind().execute(sa.text(
+        'SELECT artist, title, release_date, COUNT(*) FROM album '
+        'GROUP BY artist, title, release_date HAVING COUNT(*) > 1 LIMIT 20'
+    )).all()
+    if duplicates:
+        listing = '; '.join(f'{artist} - {title} ({released}) x{count}' for artist, title, released, count in duplicates)
+        raise RuntimeError(f'Duplicate albums must be merged before adding the natural key: {listing}')
+
+    with op.batch_alter_table('album', schema=None) as batch_op:
+        batch_op.create_index('uq_album_artist_title_release_date', ['artist', 'title', 'release_date'], unique=True)
+
+
+def downgrade():
+    with op.batch_alter_table('album', schema=None) as batch_op:
+        batch_op.drop_index('uq_album_artist_title_release_date')
@@ -0,0 +1,79 @@
+"""catalog indexes, blocklist token expiry and album rating aggregates
+
+Before migrations, these columns and indexes were added to the models while
+db.create_all() still managed the schema, which never alters an existing
+table. A database created that way has some, all or none of them, depending
+on the version that created it. Once it is stamped with 3f1c0a9d2b71, this
+revision adds only what is missing.
+
+Revision ID: 8d4e2f6a1c93
+Revises: 3f1c0a9d2b71
+Create Date: 2026-10-17 18:41:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d4e2f6a1c93'
+down_revision = '3f1c0a9d2b71'
+branch_labels = None
+depends_on = None
+
+RATING_COLUMNS = ['rating_count', 'rating_sum', 'rating_1', 'rating_2', 'rating_3', 'rating_4', 'rating_5']
+CATALOG_INDEXES = {
+    'ix_album_title_id': ['title', 'id'],
+    'ix_album_artist_id': ['artist', 'id'],
+    'ix_album_genre_id': ['genre', 'id'],
+    'ix_album_price_id': ['price', 'id'],
+    'ix_album_release_date_id': ['release_date', 'id'],
+}
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    album_columns = {column['name'] for column in inspector.get_columns('album')}
+    album_indexes = {index['name'] for index in inspector.get_indexes('album')}
+    token_columns = {column['name'] for column in inspector.get_columns('blacklist_token')}
+    token_indexes = {index['name'] for index in inspector.get_indexes('blacklist_token')}
+
+    # Keyset-paginated catalog: (sort/filter column, id)
+    with op.batch_alter_table('album', schema=None) as batch_op:
+        for name, columns in CATALOG_INDEXES.items():
+            if name not in album_indexes:
+                batch_op.create_index(name, columns, unique=False)
+        for column in RATING_COLUMNS:
+            if column not in album_columns:
+                batch_op.add_column(sa.Column(column, sa.Integer(), server_default='0', nullable=False))
+
+    # Revoked tokens can be purged once their own expiry has passed
+    with op.batch_alter_table('blacklist_token', schema=None) as batch_op:
+        if 'expires_at' not in token_columns:
+            batch_op.add_column(sa.Column('expires_at', sa.DateTime(), nullable=True))
+        if 'ix_blacklist_token_expires_at' not in token_indexes:
+            batch_op.create_index('ix_blacklist_token_expires_at', ['expires_at'], unique=False)
+
+    # Backfill rating aggregates from existing reviews
+    histogram = ', '.join(
+        f'rating_{r} = (SELECT COUNT(*) FROM review WHERE review.album_id = album.id AND review.rating = {r})'
+        for r in range(1, 6)
+    )
+    op.execute(
+        'UPDATE album SET '
+        'rating_count = (SELECT COUNT(*) FROM review WHERE review.album_id = album.id), '
+        'rating_sum = (SELECT COALESCE(SUM(review.rating), 0) FROM review WHERE review.album_id = album.id), '
+        + histogram
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('blacklist_token', schema=None) as batch_op:
+        batch_op.drop_index('ix_blacklist_token_expires_at')
+        batch_op.drop_column('expires_at')
+
+    with op.batch_alter_table('album', schema=None) as batch_op:
+        for column in reversed(RATING_COLUMNS):
+            batch_op.drop_column(column)
+        for name in reversed(list(CATALOG_INDEXES)):
+            batch_op.drop_index(name)
@@ -0,0 +1,93 @@
+"""sales rollups per album and genre
+
+Adds album_sales_daily, album_sales_monthly and genre_sales_daily, which the
+order routes keep up to date and the analytics endpoints read, and backfills
+them from existing orders. The same backfill is available as
+`flask --app run rebuild-sales-rollup`.
+
+Revision ID: 9b6d2f8e4a17
+Revises: 5a9c1e3f7b24
+Create Date: 2026-10-17 19:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9b6d2f8e4a17'
+down_revision = '5a9c1e3f7b24'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('album_sales_daily',
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('album_id', sa.Integer(), nullable=False),
+    sa.Column('genre', sa.String(length=50), nullable=False),
+    sa.Column('units', sa.Integer(), nullable=False),
+    sa.Column('revenue', sa.Float(), nullable=False),
+    sa.Column('orders', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['album_id'], ['album.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('day', 'album_id')
+    )
+    with op.batch_alter_table('album_sales_daily', schema=None) as batch_op:
+        batch_op.create_index('ix_album_sales_daily_album_id_day', ['album_id', 'day'], unique=False)
+        batch_op.create_index('ix_album_sales_daily_genre_day', ['genre', 'day'], unique=False)
+
+    op.create_table('album_sales_monthly',
+    sa.Column('month', sa.Date(), nullable=False),
+    sa.Column('album_id', sa.Integer(), nullable=False),
+    sa.Column('genre', sa.String(length=50), nullable=False),
+    sa.Column('units', sa.Integer(), nullable=False),
+    sa.Column('revenue', sa.Float(), nullable=False),
+    sa.Column('orders', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['album_id'], ['album.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('month', 'album_id')
+    )
+    with op.batch_alter_table('album_sales_monthly', schema=None) as batch_op:
+        batch_op.create_index('ix_album_sales_monthly_genre_month', ['genre', 'month'], unique=False)
+
+    op.create_table('genre_sales_daily',
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('genre', sa.String(length=50), nullable=False),
+    sa.Column('units', sa.Integer(), nullable=False),
+    sa.Column('revenue', sa.Float(), nullable=False),
+    sa.Column('orders', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('day', 'genre')
+    )
+
+    if op.get_bind().dialect.name == 'postgresql':
+        day = 'CAST(o.order_date AS DATE)'
+        month = "CAST(date_trunc('month', o.order_date) AS DATE)"
+    else:
+        day = 'date(o.order_date)'
+        month = "date(o.order_date, 'start of month')"
+    backfills = (
+        ('album_sales_daily (day, album_id, genre', f'{day}, o.album_id, a.genre'),
+        ('album_sales_monthly (month, album_id, genre', f'{month}, o.album_id, a.genre'),
+        ('genre_sales_daily (day, genre', f'{day}, a.genre'),
+    )
+    for target, keys in backfills:
+        op.execute(
+            f'INSERT INTO {target}, units, revenue, orders) '
+            f'SELECT {keys}, SUM(o.quantity), SUM(o.total_price), COUNT(*) '
+            f'FROM "order" o JOIN album a ON a.id = o.album_id '
+            f'GROUP BY {keys}'
+        )
+
+
+def downgrade():
+    op.drop_table('genre_sales_daily')
+
+    with op.batch_alter_table('album_sales_monthly', schema=None) as batch_op:
+        batch_op.drop_index('ix_album_sales_monthly_genre_month')
+
+    op.drop_table('album_sales_monthly')
+
+    with op.batch_alter_table('album_sales_daily', schema=None) as batch_op:
+        batch_op.drop_index('ix_album_sales_daily_genre_day')
+        batch_op.drop_index('ix_album_sales_daily_album_id_day')
+
+    op.drop_table('album_sales_daily')
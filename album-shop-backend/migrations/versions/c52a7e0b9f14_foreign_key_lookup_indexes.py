@@ -0,0 +1,40 @@
+"""composite indexes for review and order lookups
+
+Covers GET /reviews/album/<id> and GET /reviews/user/<id> (filter + created_at
+order) and GET /orders/my (user_id + order_date). Verified by
+`flask --app run check-query-plans`.
+
+Revision ID: c52a7e0b9f14
+Revises: 8d4e2f6a1c93
+Create Date: 2026-10-17 18:42:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c52a7e0b9f14'
+down_revision = '8d4e2f6a1c93'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('review', schema=None) as batch_op:
+        batch_op.create_index('ix_review_album_id_created_at', ['album_id', 'created_at'], unique=False)
+        batch_op.create_index('ix_review_user_id_created_at', ['user_id', 'created_at'], unique=False)
+
+    with op.batch_alter_table('order', schema=None) as batch_op:
+        batch_op.create_index('ix_order_user_id_order_date', ['user_id', 'order_date'], unique=False)
+        batch_op.create_index('ix_order_album_id_order_date', ['album_id', 'order_date'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('order', schema=None) as batch_op:
+        batch_op.drop_index('ix_order_album_id_order_date')
+        batch_op.drop_index('ix_order_user_id_order_date')
+
+    with op.batch_alter_table('review', schema=None) as batch_op:
+        batch_op.drop_index('ix_review_user_id_created_at')
+        batch_op.drop_index('ix_review_album_id_created_at')
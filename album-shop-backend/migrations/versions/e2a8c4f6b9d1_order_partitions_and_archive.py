@@ -0,0 +1,104 @@
+"""monthly order partitions and order archive
+
+Adds the order_archive table (see db/partitions.py). On PostgreSQL, also
+rebuilds the order table as one partitioned by range on order_date: one
+partition per month from the first order up to three months ahead, and a
+default partition. The primary key becomes (id, order_date), as PostgreSQL
+requires for a partitioned table; ids still come from the same sequence.
+Rows are copied over, so this takes a while (and an exclusive lock) on a
+large table. Other backends keep a plain order table.
+
+Revision ID: e2a8c4f6b9d1
+Revises: d7e3a9c5f2b8
+Create Date: 2026-10-17 23:40:00.000000
+
+"""
+from datetime import date
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2a8c4f6b9d1'
+down_revision = 'd7e3a9c5f2b8'
+branch_labels = None
+depends_on = None
+
+MONTHS_AHEAD = 3
+COLUMNS = 'id, user_id, album_id, order_date, quantity, total_price'
+
+
+def add_months(month, months):
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def upgrade():
+    op.create_table('order_archive',
+    sa.Column('month', sa.Date(), nullable=False),
+    sa.Column('path', sa.String(length=512), nullable=False),
+    sa.Column('orders', sa.Integer(), nullable=False),
+    sa.Column('archived_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('month')
+    )
+
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute('ALTER TABLE "order" RENAME TO order_unpartitioned')
+    op.execute('ALTER TABLE order_unpartitioned RENAME CONSTRAINT order_pkey TO order_unpartitioned_pkey')
+    op.execute('DROP INDEX ix_order_user_id_order_date')
+    op.execute('DROP INDEX ix_order_album_id_order_date')
+    op.execute(
+        'CREATE TABLE "order" ('
+        "id integer NOT NULL DEFAULT nextval('order_id_seq'), "
+        'user_id integer NOT NULL REFERENCES "user" (id), '
+        'album_id integer NOT NULL REFERENCES album (id), '
+        'order_date timestamp without time zone NOT NULL DEFAULT now(), '
+        'quantity integer NOT NULL, '
+        'total_price double precision NOT NULL, '
+        'PRIMARY KEY (id, order_date)'
+        ') PARTITION BY RANGE (order_date)'
+    )
+    op.execute('ALTER SEQUENCE order_id_seq OWNED BY "order".id')
+    op.execute('CREATE INDEX ix_order_user_id_order_date ON "order" (user_id, order_date)')
+    op.execute('CREATE INDEX ix_order_album_id_order_date ON "order" (album_id, order_date)')
+    op.execute('CREATE TABLE order_default PARTITION OF "order" DEFAULT')
+
+    today = date.today().replace(day=1)
+    oldest = op.get_bind().execute(sa.text('SELECT min(order_date) FROM order_unpartitioned')).scalar()
+    month = oldest.date().replace(day=1) if oldest else today
+    while month <= add_months(today, MONTHS_AHEAD):
+        op.execute(
+            f'CREATE TABLE order_p{month:%Y_%m} PARTITION OF "order" '
+            f"FOR VALUES FROM ('{month}') TO ('{add_months(month, 1)}')"
+        )
+        month = add_months(month, 1)
+
+    op.execute(f'INSERT INTO "order" ({COLUMNS}) SELECT {COLUMNS} FROM order_unpartitioned')
+    op.execute('DROP TABLE order_unpartitioned')
+    op.execute('ANALYZE "order"')
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute('ALTER TABLE "order" RENAME TO order_partitioned')
+        op.execute('ALTER TABLE order_partitioned RENAME CONSTRAINT order_pkey TO order_partitioned_pkey')
+        op.execute('DROP INDEX ix_order_user_id_order_date')
+        op.execute('DROP INDEX ix_order_album_id_order_date')
+        op.execute(
+            'CREATE TABLE "order" ('
+            "id integer NOT NULL DEFAULT nextval('order_id_seq') PRIMARY KEY, "
+            'user_id integer NOT NULL REFERENCES "user" (id), '
+            'album_id integer NOT NULL REFERENCES album (id), '
+            'order_date timestamp without time zone NOT NULL DEFAULT now(), '
+            'quantity integer NOT NULL, '
+            'total_price double precision NOT NULL'
+            ')'
+        )
+        op.execute('ALTER SEQUENCE order_id_seq OWNED BY "order".id')
+        op.execute(f'INSERT INTO "order" ({COLUMNS}) SELECT {COLUMNS} FROM order_partitioned')
+        op.execute('DROP TABLE order_partitioned')
+        op.execute('CREATE INDEX ix_order_user_id_order_date ON "order" (user_id, order_date)')
+        op.execute('CREATE INDEX ix_order_album_id_order_date ON "order" (album_id, order_date)')
+
+    op.drop_table('order_archive')
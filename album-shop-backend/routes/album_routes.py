@@ -1,23 +1,27 @@
-from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
-from db.app import db, Album, User
-from datetime import datetime
+from flask import Blueprint, Response, request, jsonify
+from sqlalchemy import select, tuple_
+from db.app import db, Album
+from db.search import search_albums
+from db.catalog_import import import_albums, read_rows, detect_format
+from db.recommendations import co_purchases
+from auth.identity import admin_required
+from routes.cache import response_cache, album_tags
+from routes.events import inventory_feed, FeedFull, SSE_MIMETYPE
+from routes.batch import parse_ids, fetch_by_ids, valid_id
+from routes.serializers import ALBUM_COLUMNS, album_payload
+from datetime import datetime, date
+from urllib.parse import urlencode
+import base64
+import csv
+import io
+import json
 
 album_bp = Blueprint('album_bp', __name__, url_prefix='/albums')
 
-# Helper: check admin role
-def is_admin(username):
-    user = User.query.filter_by(username=username).first()
-    return user and user.role == 'admin'
-
 # Create Album (Admin Only)
 @album_bp.route('/', methods=['POST'])
-@jwt_required()
+@admin_required()
 def create_album():
-    current_user = get_jwt_identity()
-    if not is_admin(current_user):
-        return jsonify({'error': 'Admins only'}), 403
-
     data = request.get_json()
     try:
         album = Album(
@@ -31,6 +35,7 @@ def create_album():
         )
         db.session.add(album)
         db.session.commit()
+        response_cache.invalidate('albums')
         return jsonify({
             'message': 'Album created successfully',
             'album': {
@@ -42,52 +47,278 @@ def create_album():
     except Exception as e:
         return jsonify({'error': 'Invalid input or server error', 'details': str(e)}), 400
 
-# Read All Albums (Public)
+# Bulk import/update albums from a CSV or NDJSON body (Admin Only)
+@album_bp.route('/import', methods=['POST'])
+@admin_required()
+def bulk_import():
+    fmt = detect_format(request.args.get('format')) if request.args.get('format') else {
+        'text/csv': 'csv',
+        'application/x-ndjson': 'ndjson',
+        'application/jsonl': 'ndjson',
+    }.get(request.mimetype)
+    if fmt is None:
+        return jsonify({'error': 'Send text/csv or application/x-ndjson (or pass ?format=csv|ndjson)'}), 415
+
+    # Read the body as a stream so large catalogs are never held in memory
+    stream = io.TextIOWrapper(request.stream, encoding='utf-8', newline='')
+    try:
+        report = import_albums(
+            read_rows(stream, fmt),
+            on_batch=lambda ids: response_cache.invalidate('albums', *(f'album:{album_id}' for album_id in ids))
+        )
+    except (UnicodeDecodeError, csv.Error) as e:
+        return jsonify({'error': 'Could not read the upload', 'details': str(e)}), 400
+    return jsonify(report), 200
+
+# Catalog pagination settings
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+SORT_COLUMNS = {
+    'id': Album.id,
+    'title': Album.title,
+    'artist': Album.artist,
+    'genre': Album.genre,
+    'price': Album.price,
+    'release_date': Album.release_date,
+}
+
+# Helper: opaque keyset cursor holding the last row's (sort value, id)
+def encode_cursor(sort_value, album_id):
+    if isinstance(sort_value, datetime):
+        sort_value = sort_value.date()
+    if isinstance(sort_value, date):
+        sort_value = sort_value.isoformat()
+    raw = json.dumps([sort_value, album_id], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+MAX_BIGINT = 2 ** 63 - 1
+
+# Helper: True for a JSON integer the database can bind (bools are ints in Python)
+def is_bigint(value):
+    return isinstance(value, int) and not isinstance(value, bool) and -MAX_BIGINT <= value <= MAX_BIGINT
+
+# Helper: cursor values match their sort: an id, a price, a result offset for
+# 'search', or a string for the other sorts
+def valid_sort_value(sort, value):
+    if sort == 'id':
+        return valid_id(value)
+    if sort == 'search':
+        return is_bigint(value)
+    if sort == 'price':
+        return isinstance(value, float) or is_bigint(value)
+    return isinstance(value, str)
+
+# Raises ValueError for anything encode_cursor wouldn't have produced for this sort,
+# so a tampered cursor is a 400 rather than a database error
+def decode_cursor(cursor, sort):
+    padded = cursor + '=' * (-len(cursor) % 4)
+    decoded = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    if not isinstance(decoded, list) or len(decoded) != 2:
+        raise ValueError('Malformed cursor')
+    sort_value, album_id = decoded
+    if not valid_sort_value(sort, sort_value) or not valid_id(album_id):
+        raise ValueError(f'Cursor does not match sort={sort}')
+    if sort == 'release_date':
+        sort_value = datetime.strptime(sort_value, '%Y-%m-%d').date()
+    return sort_value, album_id
+
+# Helper: parse catalog filters and sort options from the query string
+def parse_catalog_args(args):
+    sort = args.get('sort', 'id')
+    if sort not in SORT_COLUMNS:
+        raise ValueError(f"sort must be one of: {', '.join(SORT_COLUMNS)}")
+    order = args.get('order', 'asc')
+    if order not in ('asc', 'desc'):
+        raise ValueError('order must be asc or desc')
+
+    limit = int(args.get('limit', DEFAULT_PAGE_SIZE))
+    if limit < 1:
+        raise ValueError('limit must be positive')
+
+    return {
+        'sort': sort,
+        'order': order,
+        'limit': min(limit, MAX_PAGE_SIZE),
+        'cursor': decode_cursor(args['cursor'], sort) if args.get('cursor') else None,
+        'genre': args.get('genre'),
+        'artist': args.get('artist'),
+        'min_price': float(args['min_price']) if args.get('min_price') else None,
+        'max_price': float(args['max_price']) if args.get('max_price') else None,
+        'released_from': datetime.strptime(args['released_from'], '%Y-%m-%d').date() if args.get('released_from') else None,
+        'released_to': datetime.strptime(args['released_to'], '%Y-%m-%d').date() if args.get('released_to') else None,
+    }
+
+# Helper: build the keyset page query (no OFFSET, so deep pages cost the same as the first)
+def catalog_query(params):
+    query = select(*ALBUM_COLUMNS)
+    if params['genre']:
+        query = query.where(Album.genre == params['genre'])
+    if params['artist']:
+        query = query.where(Album.artist == params['artist'])
+    if params['min_price'] is not None:
+        query = query.where(Album.price >= params['min_price'])
+    if params['max_price'] is not None:
+        query = query.where(Album.price <= params['max_price'])
+    if params['released_from']:
+        query = query.where(Album.release_date >= params['released_from'])
+    if params['released_to']:
+        query = query.where(Album.release_date <= params['released_to'])
+
+    column = SORT_COLUMNS[params['sort']]
+    descending = params['order'] == 'desc'
+
+    if params['cursor']:
+        sort_value, last_id = params['cursor']
+        if column is Album.id:
+            query = query.where(Album.id < last_id if descending else Album.id > last_id)
+        else:
+            key = tuple_(column, Album.id)
+            query = query.where(key < (sort_value, last_id) if descending else key > (sort_value, last_id))
+
+    if column is Album.id:
+        ordering = [Album.id.desc() if descending else Album.id.asc()]
+    else:
+        ordering = [column.desc(), Album.id.desc()] if descending else [column.asc(), Album.id.asc()]
+
+    # Fetch one extra row to learn whether another page exists
+    return query.order_by(*ordering).limit(params['limit'] + 1)
+
+# Read All Albums (Public, keyset-paginated). ?ids=3,1,2 instead returns just those
+# albums, in that order, from a single query (unknown ids are left out).
 @album_bp.route('/', methods=['GET'])
+@response_cache.cached('albums')
 def get_albums():
-    albums = Album.query.all()
-    return jsonify([{
-        'id': album.id,
-        'title': album.title,
-        'artist': album.artist,
-        'release_date': album.release_date.isoformat(),
-        'genre': album.genre,
-        'price': album.price,
-        'quantity': album.quantity,
-        'image_url': album.image_url 
-    } for album in albums]), 200
+    if 'ids' in request.args:
+        try:
+            ids = parse_ids(request.args['ids'])
+        except ValueError as e:
+            return jsonify({'error': 'Invalid query parameters', 'details': str(e)}), 400
+        return jsonify(fetch_by_ids(ALBUM_COLUMNS, Album.id, ids, album_payload)), 200
+
+    try:
+        params = parse_catalog_args(request.args)
+    except (ValueError, TypeError, KeyError) as e:
+        return jsonify({'error': 'Invalid query parameters', 'details': str(e)}), 400
+
+    albums = db.session.execute(catalog_query(params)).all()
+    has_more = len(albums) > params['limit']
+    albums = albums[:params['limit']]
+
+    response = jsonify([album_payload(album) for album in albums])
+
+    # The body stays a plain list; the next page is advertised via headers
+    if has_more:
+        last = albums[-1]
+        next_cursor = encode_cursor(getattr(last, params['sort']), last.id)
+        next_args = request.args.to_dict()
+        next_args['cursor'] = next_cursor
+        response.headers['X-Next-Cursor'] = next_cursor
+        response.headers['Link'] = f'<{request.base_url}?{urlencode(next_args)}>; rel="next"'
+    return response, 200
+
+RECOMMENDATIONS_PAGE_SIZE = 10
+
+# Search settings
+SEARCH_PAGE_SIZE = 20
+MAX_SEARCH_PAGE_SIZE = 100
+MAX_SEARCH_RESULTS = 1000
+
+# Search Albums by title, artist and genre (Public, ranked)
+@album_bp.route('/search', methods=['GET'])
+@response_cache.cached('albums')
+def search():
+    q = request.args.get('q', '').strip()
+    if not q or len(q) > 100:
+        return jsonify({'error': 'Query parameter q must be 1-100 characters'}), 400
+
+    try:
+        limit = min(int(request.args.get('limit', SEARCH_PAGE_SIZE)), MAX_SEARCH_PAGE_SIZE)
+        # Ranked results page by position; the cursor carries the next offset
+        offset = decode_cursor(request.args['cursor'], 'search')[0] if request.args.get('cursor') else 0
+        if limit < 1 or offset < 0:
+            raise ValueError('limit must be positive')
+    except (ValueError, TypeError, KeyError) as e:
+        return jsonify({'error': 'Invalid query parameters', 'details': str(e)}), 400
+
+    limit = max(0, min(limit, MAX_SEARCH_RESULTS - offset))
+    results = search_albums(q, limit + 1, offset, columns=ALBUM_COLUMNS) if limit else []
+    has_more = len(results) > limit
+    results = results[:limit]
+
+    response = jsonify([{**album_payload(row[:-1]), 'score': row.score} for row in results])
+
+    if has_more:
+        next_cursor = encode_cursor(offset + limit, results[-1].id)
+        next_args = request.args.to_dict()
+        next_args['cursor'] = next_cursor
+        response.headers['X-Next-Cursor'] = next_cursor
+        response.headers['Link'] = f'<{request.base_url}?{urlencode(next_args)}>; rel="next"'
+    return response, 200
+
+# Stock and price changes as server-sent events (Public). ?album_id=1,2 limits the
+# stream to those albums; reconnecting clients resume from Last-Event-ID.
+@album_bp.route('/events', methods=['GET'])
+def inventory_events():
+    try:
+        album_ids = frozenset(int(i) for i in request.args['album_id'].split(',')) if request.args.get('album_id') else None
+    except ValueError:
+        return jsonify({'error': 'album_id must be a comma-separated list of ids'}), 400
+
+    try:
+        stream = inventory_feed.subscribe(request.headers.get('Last-Event-ID'), album_ids)
+    except FeedFull:
+        response = jsonify({'error': 'Too many subscribers, try again later'})
+        response.headers['Retry-After'] = '30'
+        return response, 503
+
+    # Not wrapped in stream_with_context: the request (and its database session)
+    # ends here, while the stream itself never touches the database
+    response = Response(stream, mimetype=SSE_MIMETYPE)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # Stop nginx from buffering the stream
+    return response
 
 # Read Single Album (Public)
 @album_bp.route('/<int:album_id>', methods=['GET'])
+@response_cache.cached('album:{album_id}')
 def get_album(album_id):
-    album = Album.query.get(album_id)
+    album = db.session.execute(select(*ALBUM_COLUMNS).where(Album.id == album_id)).first()
     if not album:
         return jsonify({'error': 'Album not found'}), 404
 
+    return jsonify(album_payload(album)), 200
+
+# "Customers also bought" (Public): albums most often bought by this album's buyers,
+# served from the in-memory co-purchase index without touching the database.
+# Details for the returned ids come from GET /albums?ids=...
+@album_bp.route('/<int:album_id>/recommendations', methods=['GET'])
+def get_recommendations(album_id):
+    if not co_purchases.available:
+        return jsonify({'error': 'Recommendations are not available'}), 503
+    try:
+        limit = min(int(request.args.get('limit', RECOMMENDATIONS_PAGE_SIZE)), co_purchases.top_k)
+        if limit < 1:
+            raise ValueError('limit must be positive')
+    except (ValueError, TypeError) as e:
+        return jsonify({'error': 'Invalid query parameters', 'details': str(e)}), 400
+
     return jsonify({
-        'id': album.id,
-        'title': album.title,
-        'artist': album.artist,
-        'release_date': album.release_date.isoformat(),
-        'genre': album.genre,
-        'price': album.price,
-        'quantity': album.quantity,
-        'image_url': album.image_url 
+        'album_id': album_id,
+        'recommendations': [
+            {'album_id': other_id, 'score': score} for other_id, score in co_purchases.recommend(album_id, limit)
+        ]
     }), 200
 
 # Update Album (Admin Only)
 @album_bp.route('/<int:album_id>', methods=['PUT'])
-@jwt_required()
+@admin_required()
 def update_album(album_id):
-    current_user = get_jwt_identity()
-    if not is_admin(current_user):
-        return jsonify({'error': 'Admins only'}), 403
-
     data = request.get_json()
     album = Album.query.get(album_id)
     if not album:
         return jsonify({'error': 'Album not found'}), 404
 
+    inventory_before = (album.quantity, album.price)
     try:
         album.title = data.get('title', album.title)
         album.artist = data.get('artist', album.artist)
@@ -99,23 +330,23 @@ def update_album(album_id):
         album.price = float(data.get('price', album.price))
         album.quantity = int(data.get('quantity', album.quantity))
         album.image_url = data.get('image_url', album.image_url) 
+        if (album.quantity, album.price) != inventory_before:
+            inventory_feed.emit(album.id, album.quantity, album.price)
         db.session.commit()
+        response_cache.invalidate(*album_tags(album_id))
         return jsonify({'message': 'Album updated'}), 200
     except Exception as e:
         return jsonify({'error': 'Update failed', 'details': str(e)}), 400
 
 # Delete Album (Admin Only)
 @album_bp.route('/<int:album_id>', methods=['DELETE'])
-@jwt_required()
+@admin_required()
 def delete_album(album_id):
-    current_user = get_jwt_identity()
-    if not is_admin(current_user):
-        return jsonify({'error': 'Admins only'}), 403
-
     album = Album.query.get(album_id)
     if not album:
         return jsonify({'error': 'Album not found'}), 404
 
     db.session.delete(album)
     db.session.commit()
+    response_cache.invalidate(*album_tags(album_id), f'reviews:album:{album_id}')
     return jsonify({'message': 'Album deleted successfully'}), 200
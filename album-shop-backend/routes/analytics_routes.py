@@ -0,0 +1,178 @@
+from flask import Blueprint, request, jsonify
+from sqlalchemy import func, select, union_all
+from db.app import db, Album, AlbumSalesDaily, AlbumSalesMonthly, GenreSalesDaily
+from auth.identity import admin_required
+from datetime import datetime, timedelta
+
+analytics_bp = Blueprint('analytics', __name__, url_prefix='/analytics')
+
+DEFAULT_RANGE_DAYS = 30
+MAX_RANGE_DAYS = 3660
+DEFAULT_TOP_N = 10
+MAX_TOP_N = 100
+RANKINGS = ('units', 'revenue')
+INTERVALS = ('day', 'week', 'month')
+
+# Helper: inclusive [from, to] day range from the query string, defaulting to the last 30 days
+def parse_range(args):
+    to_day = datetime.strptime(args['to'], '%Y-%m-%d').date() if args.get('to') else datetime.utcnow().date()
+    if args.get('from'):
+        from_day = datetime.strptime(args['from'], '%Y-%m-%d').date()
+    else:
+        from_day = to_day - timedelta(days=DEFAULT_RANGE_DAYS - 1)
+    if from_day > to_day:
+        raise ValueError('from must not be after to')
+    if (to_day - from_day).days >= MAX_RANGE_DAYS:
+        raise ValueError(f'range is limited to {MAX_RANGE_DAYS} days')
+    return from_day, to_day
+
+# Helper: sums shared by every report, over any rollup table or subquery
+def totals(source):
+    return (
+        func.sum(source.units).label('units'),
+        func.sum(source.revenue).label('revenue'),
+        func.sum(source.orders).label('orders'),
+    )
+
+def next_month(day):
+    return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+def period_start(day, interval):
+    if interval == 'week':
+        return day - timedelta(days=day.weekday())
+    if interval == 'month':
+        return day.replace(day=1)
+    return day
+
+# Helper: per-album sales rows covering [from_day, to_day]. Whole months come from
+# the monthly rollup; only the partial months at either end are read day by day.
+def album_sales_rows(from_day, to_day, genre=None):
+    months_from = from_day if from_day.day == 1 else next_month(from_day)
+    months_to = next_month(to_day) if (to_day + timedelta(days=1)).day == 1 else to_day.replace(day=1)
+
+    def part(rollup, period, start, end):
+        query = select(rollup.album_id, rollup.units, rollup.revenue, rollup.orders).where(period.between(start, end))
+        return query.where(rollup.genre == genre) if genre else query
+
+    if months_from >= months_to:
+        parts = [part(AlbumSalesDaily, AlbumSalesDaily.day, from_day, to_day)]
+    else:
+        parts = [part(AlbumSalesMonthly, AlbumSalesMonthly.month, months_from, months_to - timedelta(days=1))]
+        if from_day < months_from:
+            parts.append(part(AlbumSalesDaily, AlbumSalesDaily.day, from_day, months_from - timedelta(days=1)))
+        if months_to <= to_day:
+            parts.append(part(AlbumSalesDaily, AlbumSalesDaily.day, months_to, to_day))
+    return union_all(*parts).subquery() if len(parts) > 1 else parts[0].subquery()
+
+# Top-selling albums over a date range (Admin Only)
+@analytics_bp.route('/bestsellers', methods=['GET'])
+@admin_required()
+def bestsellers():
+    try:
+        from_day, to_day = parse_range(request.args)
+        by = request.args.get('by', 'units')
+        if by not in RANKINGS:
+            raise ValueError('by must be units or revenue')
+        limit = min(int(request.args.get('limit', DEFAULT_TOP_N)), MAX_TOP_N)
+        if limit < 1:
+            raise ValueError('limit must be positive')
+    except (ValueError, TypeError) as e:
+        return jsonify({'error': 'Invalid query parameters', 'details': str(e)}), 400
+
+    sales = album_sales_rows(from_day, to_day, request.args.get('genre'))
+    ranked = (
+        select(sales.c.album_id, *totals(sales.c))
+        .group_by(sales.c.album_id)
+        .order_by(func.sum(sales.c[by]).desc(), sales.c.album_id)
+        .limit(limit)
+        .subquery()
+    )
+
+    # Aggregate first, then join only the top N albums for their titles
+    rows = db.session.execute(
+        select(ranked, Album.title, Album.artist, Album.genre)
+        .join(Album, Album.id == ranked.c.album_id)
+        .order_by(getattr(ranked.c, by).desc(), ranked.c.album_id)
+    ).all()
+
+    return jsonify({
+        'from': from_day,
+        'to': to_day,
+        'by': by,
+        'albums': [{
+            'album_id': r.album_id,
+            'title': r.title,
+            'artist': r.artist,
+            'genre': r.genre,
+            'units': r.units,
+            'revenue': round(r.revenue, 2),
+            'orders': r.orders
+        } for r in rows]
+    }), 200
+
+# Revenue and units over time, per day/week/month (Admin Only)
+@analytics_bp.route('/revenue', methods=['GET'])
+@admin_required()
+def revenue():
+    try:
+        from_day, to_day = parse_range(request.args)
+        interval = request.args.get('interval', 'day')
+        if interval not in INTERVALS:
+            raise ValueError('interval must be day, week or month')
+        album_id = int(request.args['album_id']) if request.args.get('album_id') else None
+    except (ValueError, TypeError) as e:
+        return jsonify({'error': 'Invalid query parameters', 'details': str(e)}), 400
+
+    # One album reads its own daily rows; otherwise the much smaller per-genre table
+    sales = AlbumSalesDaily if album_id is not None else GenreSalesDaily
+    daily = (
+        select(sales.day, *totals(sales))
+        .where(sales.day.between(from_day, to_day))
+        .group_by(sales.day)
+    )
+    if album_id is not None:
+        daily = daily.where(AlbumSalesDaily.album_id == album_id)
+    if request.args.get('genre'):
+        daily = daily.where(sales.genre == request.args['genre'])
+
+    # The database sums per day; days roll up into weeks/months here, which keeps
+    # the SQL portable. Periods without sales are filled in with zeros.
+    series = {}
+    day = from_day
+    while day <= to_day:
+        series.setdefault(period_start(day, interval), {'units': 0, 'revenue': 0.0, 'orders': 0})
+        day += timedelta(days=1)
+    for row in db.session.execute(daily):
+        bucket = series[period_start(row.day, interval)]
+        bucket['units'] += row.units
+        bucket['revenue'] = round(bucket['revenue'] + row.revenue, 2)
+        bucket['orders'] += row.orders
+
+    return jsonify({
+        'from': from_day,
+        'to': to_day,
+        'interval': interval,
+        'series': [{'period': period, **values} for period, values in series.items()]
+    }), 200
+
+# Units and revenue per genre over a date range (Admin Only)
+@analytics_bp.route('/genres', methods=['GET'])
+@admin_required()
+def genres():
+    try:
+        from_day, to_day = parse_range(request.args)
+    except (ValueError, TypeError) as e:
+        return jsonify({'error': 'Invalid query parameters', 'details': str(e)}), 400
+
+    rows = db.session.execute(
+        select(GenreSalesDaily.genre, *totals(GenreSalesDaily))
+        .where(GenreSalesDaily.day.between(from_day, to_day))
+        .group_by(GenreSalesDaily.genre)
+        .order_by(func.sum(GenreSalesDaily.revenue).desc(), GenreSalesDaily.genre)
+    ).all()
+
+    return jsonify({
+        'from': from_day,
+        'to': to_day,
+        'genres': [{'genre': r.genre, 'units': r.units, 'revenue': round(r.revenue, 2), 'orders': r.orders} for r in rows]
+    }), 200
@@ -0,0 +1,66 @@
+from db.app import db
+
+MAX_BATCH_IDS = 500  # Ids per batch lookup; one IN query, well under SQLite's bound-parameter limit
+MAX_ID = 2 ** 31 - 1  # Ids are Integer columns (32-bit on PostgreSQL); larger values fail to bind
+
+
+# Helper: True for an id the id columns can hold (bool is an int subclass in Python)
+def valid_id(value):
+    return isinstance(value, int) and not isinstance(value, bool) and 0 < value <= MAX_ID
+
+
+# Helper: ?ids=3,1,2 -> [3, 1, 2], duplicates dropped, request order kept.
+# Raises ValueError for anything but positive ids the id columns can hold.
+def parse_ids(value, limit=MAX_BATCH_IDS):
+    ids = list(dict.fromkeys(int(part) for part in value.split(',') if part.strip()))
+    if not ids:
+        raise ValueError('ids must list at least one id')
+    if len(ids) > limit:
+        raise ValueError(f'at most {limit} ids per request')
+    if not all(map(valid_id, ids)):
+        raise ValueError(f'ids must be integers from 1 to {MAX_ID}')
+    return ids
+
+
+# Rows for `ids` in one IN query (`columns` must start with the id), serialized and
+# returned in the requested order. Ids that don't exist are left out.
+def fetch_by_ids(columns, id_column, ids, serialize):
+    rows = db.session.execute(db.select(*columns).where(id_column.in_(ids))).all()
+    by_id = {row[0]: row for row in rows}
+    return [serialize(by_id[i]) for i in ids if i in by_id]
+
+
+# Helper: ?expand=user,album -> ('user', 'album'), limited to what the list offers
+def parse_expand(value, allowed):
+    names = tuple(dict.fromkeys(name.strip() for name in (value or '').split(',') if name.strip()))
+    unknown = [name for name in names if name not in allowed]
+    if unknown:
+        raise ValueError(f"expand must be one of: {', '.join(allowed)}")
+    return names
+
+
+# Extend a list query so every row also carries the related records named in
+# `names`. `expansions` maps a name to (model, onclause, columns, payload); each one
+# is an outer join on the same statement (model None: already joined), so the list
+# still costs one query.
+# Returns the statement and a serializer nesting each record under its name.
+def expand_query(statement, base_payload, base_width, expansions, names):
+    slices = []
+    width = base_width
+    for name in names:
+        model, onclause, columns, payload = expansions[name]
+        statement = statement.add_columns(*columns)
+        if model is not None:
+            statement = statement.outerjoin(model, onclause)
+        slices.append((name, width, width + len(columns), payload))
+        width += len(columns)
+
+    if not slices:
+        return statement, base_payload
+
+    def serialize(row):
+        item = base_payload(row[:base_width])
+        for name, start, end, payload in slices:
+            item[name] = payload(row[start:end]) if row[start] is not None else None
+        return item
+    return statement, serialize
@@ -0,0 +1,183 @@
+from collections import OrderedDict
+from functools import wraps
+from urllib.parse import urlencode
+from flask import Blueprint, g, request, make_response, jsonify
+from auth.identity import admin_required
+from routes.serializers import wants_msgpack
+from db.notifications import notifications
+import hashlib
+import threading
+import time
+
+# Response headers worth replaying from a cached entry
+REPLAYED_HEADERS = ('Content-Type', 'X-Next-Cursor', 'Link')
+INVALIDATION_CHANNEL = 'response_cache'
+
+
+class CacheEntry:
+    __slots__ = ('body', 'etag', 'headers', 'tags', 'expires_at')
+
+    def __init__(self, body, etag, headers, tags, expires_at):
+        self.body = body
+        self.etag = etag
+        self.headers = headers
+        self.tags = tags
+        self.expires_at = expires_at
+
+
+# LRU cache of rendered public GET responses, bounded by entry count, total body
+# bytes and a TTL. Entries carry tags ('albums', 'album:3', ...) so writes can
+# invalidate exactly the responses they affect. The cache is per process. On
+# PostgreSQL invalidations reach the other workers with a NOTIFY, and a worker only
+# caches while its listener is connected (it starts empty after reconnecting). On
+# other databases the TTL bounds how long another worker can serve a response
+# after a write.
+class ResponseCache:
+    def __init__(self, ttl=30, max_entries=1024, max_bytes=32 * 1024 * 1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._tags = {}
+        self._bytes = 0
+        self._generation = 0
+        self.stats = {'hits': 0, 'misses': 0, 'not_modified': 0, 'evictions': 0, 'invalidations': 0}
+
+    def init_app(self, app):
+        self.ttl = app.config.get('RESPONSE_CACHE_TTL', self.ttl)
+        self.max_entries = app.config.get('RESPONSE_CACHE_MAX_ENTRIES', self.max_entries)
+        self.max_bytes = app.config.get('RESPONSE_CACHE_MAX_BYTES', self.max_bytes)
+        notifications.subscribe(INVALIDATION_CHANNEL, self._drop, on_connect=self.clear)
+
+    # Decorator for public GET views; tags may reference view arguments, e.g. 'album:{album_id}'
+    def cached(self, *tags):
+        def decorator(fn):
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                key = request.path + '?' + urlencode(sorted(request.args.items(multi=True)))
+                if wants_msgpack():
+                    key += '#msgpack'
+                # A read that must see the client's own write skips the lookup (the entry may
+                # have been rendered on a lagging replica) and replaces it with a fresh one
+                entry = None if g.get('read_your_writes') else self.get(key)
+                if entry is None:
+                    generation = self._generation
+                    response = make_response(fn(*args, **kwargs))
+                    if response.status_code != 200 or self.ttl <= 0:
+                        return response
+                    body = response.get_data()
+                    entry = CacheEntry(
+                        body=body,
+                        etag=hashlib.blake2b(body, digest_size=16).hexdigest(),
+                        headers=[(h, response.headers[h]) for h in REPLAYED_HEADERS if h in response.headers],
+                        tags=frozenset(tag.format(**kwargs) for tag in tags),
+                        expires_at=time.monotonic() + self.ttl
+                    )
+                    self.set(key, entry, generation)
+                    state = 'MISS'
+                else:
+                    state = 'HIT'
+                return self._respond(entry, state)
+            return wrapper
+        return decorator
+
+    def _respond(self, entry, state):
+        if request.if_none_match.contains(entry.etag):
+            with self._lock:
+                self.stats['not_modified'] += 1
+            response = make_response('', 304)
+        else:
+            response = make_response(entry.body, 200)
+            for header, value in entry.headers:
+                response.headers[header] = value
+        response.set_etag(entry.etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        response.vary.add('Accept')
+        response.headers['X-Cache'] = state
+        return response
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry.expires_at <= time.monotonic():
+                if entry is not None:
+                    self._remove(key)
+                self.stats['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats['hits'] += 1
+            return entry
+
+    # `generation` guards against caching a response rendered before a concurrent invalidation
+    def set(self, key, entry, generation=None):
+        if len(entry.body) > self.max_bytes:
+            return
+        notifications.start()
+        if notifications.enabled and not notifications.listening():
+            return  # Other workers' invalidations wouldn't reach this entry
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = entry
+            self._bytes += len(entry.body)
+            for tag in entry.tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.stats['evictions'] += 1
+
+    # Drop every cached response carrying any of the given tags, in every worker.
+    # Called after the write has committed.
+    def invalidate(self, *tags):
+        self._drop(tags)
+        if self.ttl > 0:
+            notifications.send(INVALIDATION_CHANNEL, list(tags))
+
+    def _drop(self, tags):
+        with self._lock:
+            self._generation += 1
+            for tag in tags:
+                for key in list(self._tags.get(tag, ())):
+                    self._remove(key)
+                    self.stats['invalidations'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._tags.clear()
+            self._bytes = 0
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.stats, entries=len(self._entries), bytes=self._bytes)
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= len(entry.body)
+        for tag in entry.tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+
+response_cache = ResponseCache()
+
+
+# Tags touched by a change to one album (its page and every catalog page)
+def album_tags(album_id):
+    return ('albums', f'album:{album_id}')
+
+
+cache_bp = Blueprint('cache', __name__, url_prefix='/cache')
+
+# Cache hit/miss metrics (Admin Only)
+@cache_bp.route('/stats', methods=['GET'])
+@admin_required()
+def cache_stats():
+    return jsonify(response_cache.snapshot()), 200
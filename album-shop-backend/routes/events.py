@@ -0,0 +1,145 @@
+from collections import deque
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from db.app import db
+from db.notifications import notifications
+import json
+import threading
+import time
+import uuid
+
+NOTIFY_CHANNEL = 'album_inventory'
+NOTIFY_BATCH_SIZE = 100  # Changes per NOTIFY; keeps payloads well under PostgreSQL's 8000-byte limit
+SSE_MIMETYPE = 'text/event-stream'
+
+
+class FeedFull(Exception):
+    pass
+
+
+# Per-process feed of album stock and price changes, served as server-sent events.
+# Writers call emit() inside their transaction; the changes are published once it
+# commits. On PostgreSQL they go out with one NOTIFY per transaction, and each
+# process's listener (db/notifications.py) picks up changes made by every worker;
+# elsewhere they are published in-process.
+# Published events are encoded once into a shared ring buffer. A subscriber only
+# remembers the last sequence number it sent and waits on a condition, so idle
+# subscribers hold no queue, no database connection and run no queries.
+class InventoryFeed:
+    def __init__(self, history=1000, heartbeat=15, low_stock_threshold=5, max_subscribers=1000):
+        self.history = history
+        self.heartbeat = heartbeat
+        self.low_stock_threshold = low_stock_threshold
+        self.max_subscribers = max_subscribers
+        self.subscribers = 0
+        self._epoch = uuid.uuid4().hex[:8]  # Lets Last-Event-ID from another process be told apart
+        self._cond = threading.Condition()
+        self._events = deque(maxlen=history)  # (seq, album_id, encoded event)
+        self._seq = 0
+
+    def init_app(self, app):
+        self.history = app.config.get('EVENT_STREAM_HISTORY', self.history)
+        self.heartbeat = app.config.get('EVENT_STREAM_HEARTBEAT_SECONDS', self.heartbeat)
+        self.low_stock_threshold = app.config.get('LOW_STOCK_THRESHOLD', self.low_stock_threshold)
+        self.max_subscribers = app.config.get('EVENT_STREAM_MAX_SUBSCRIBERS', self.max_subscribers)
+        self._events = deque(maxlen=self.history)
+        notifications.subscribe(NOTIFY_CHANNEL, self._publish_notified)
+
+    # Record an album's new stock and price in the current transaction
+    def emit(self, album_id, quantity, price):
+        db.session.info.setdefault('inventory_changes', []).append(
+            {'album_id': album_id, 'quantity': quantity, 'price': price}
+        )
+
+    # Fan a committed change out to this process's subscribers
+    def publish(self, change):
+        change = dict(change, low_stock=change['quantity'] <= self.low_stock_threshold)
+        data = json.dumps(change, separators=(',', ':'))
+        with self._cond:
+            self._seq += 1
+            text = f'id: {self._epoch}.{self._seq}\nevent: inventory\ndata: {data}\n\n'
+            self._events.append((self._seq, change['album_id'], text))
+            self._cond.notify_all()
+
+    # Sequence number to resume after, from a Last-Event-ID header. Ids from
+    # another process (or a restart) can't be resumed, so those start from now.
+    def _resume_from(self, last_event_id):
+        epoch, _, seq = (last_event_id or '').partition('.')
+        if epoch == self._epoch and seq.isdigit():
+            return min(int(seq), self._seq)
+        return self._seq
+
+    # SSE text for one subscriber, optionally limited to some album ids. Raises
+    # FeedFull when this process already serves max_subscribers streams (the route
+    # answers 503), before a gthread worker runs out of threads for other requests.
+    def subscribe(self, last_event_id=None, album_ids=None):
+        with self._cond:
+            if self.subscribers >= self.max_subscribers:
+                raise FeedFull()
+            self.subscribers += 1
+            position = self._resume_from(last_event_id)
+        notifications.start()
+        return self._stream(position, album_ids)
+
+    def _stream(self, position, album_ids):
+        try:
+            yield 'retry: 3000\n\n'
+            last_write = time.monotonic()
+            while True:
+                with self._cond:
+                    if self._seq == position:
+                        self._cond.wait(self.heartbeat)
+                    oldest = self._events[0][0] if self._events else self._seq + 1
+                    if position + 1 < oldest:
+                        # Fell behind the ring buffer: tell the client to refetch
+                        position = self._seq
+                        pending = None
+                    else:
+                        # New events sit at the right end, where deque indexing is cheap
+                        count = self._seq - position
+                        pending = [self._events[i] for i in range(len(self._events) - count, len(self._events))]
+                        position = self._seq
+                if pending is None:
+                    chunk = f'id: {self._epoch}.{position}\nevent: reset\ndata: {{}}\n\n'
+                else:
+                    chunk = ''.join(text for _, album_id, text in pending if not album_ids or album_id in album_ids)
+                # A comment line after a quiet spell doubles as a heartbeat, so dead connections are noticed
+                if not chunk and time.monotonic() - last_write >= self.heartbeat:
+                    chunk = ': keep-alive\n\n'
+                if chunk:
+                    last_write = time.monotonic()
+                    yield chunk
+        finally:
+            with self._cond:
+                self.subscribers -= 1
+
+    # Changes published by any process, from the LISTEN connection
+    def _publish_notified(self, changes):
+        for change in changes:
+            self.publish(change)
+
+
+inventory_feed = InventoryFeed()
+
+
+# On PostgreSQL, NOTIFY as part of the transaction; it is delivered on commit
+@event.listens_for(Session, 'before_commit')
+def _notify_inventory_changes(session):
+    changes = session.info.get('inventory_changes')
+    if not changes or session.get_bind().dialect.name != 'postgresql':
+        return
+    for start in range(0, len(changes), NOTIFY_BATCH_SIZE):
+        notifications.notify(session, NOTIFY_CHANNEL, changes[start:start + NOTIFY_BATCH_SIZE])
+    del session.info['inventory_changes']
+
+
+# Elsewhere, publish in-process once the transaction has committed
+@event.listens_for(Session, 'after_commit')
+def _publish_inventory_changes(session):
+    for change in session.info.pop('inventory_changes', ()):
+        inventory_feed.publish(change)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _drop_inventory_changes(session):
+    session.info.pop('inventory_changes', None)
@@ -0,0 +1,56 @@
+from flask import Blueprint, Response
+from db.instrumentation import request_metrics
+from routes.cache import response_cache
+from auth.blocklist import revoked_tokens
+from db.jobs import job_queue
+from db.replicas import replica_router
+
+metrics_bp = Blueprint('metrics', __name__)
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+# Response cache and revocation cache figures in Prometheus text format
+def cache_metrics():
+    stats = response_cache.snapshot()
+    lines = []
+    for name in ('hits', 'misses', 'not_modified', 'evictions', 'invalidations'):
+        lines += [f'# TYPE response_cache_{name}_total counter', f'response_cache_{name}_total {stats[name]}']
+    lines += ['# TYPE response_cache_entries gauge', f'response_cache_entries {stats["entries"]}',
+              '# TYPE response_cache_bytes gauge', f'response_cache_bytes {stats["bytes"]}',
+              '# TYPE revoked_tokens_cached gauge', f'revoked_tokens_cached {len(revoked_tokens)}']
+    return lines
+
+
+# Jobs finished by this process's workers
+def job_metrics():
+    lines = ['# TYPE jobs_total counter']
+    for outcome, count in job_queue.snapshot().items():
+        lines.append(f'jobs_total{{outcome="{outcome}"}} {count}')
+    return lines
+
+
+# Where this process's queries went, how reads were routed, and replica health
+def replica_metrics():
+    stats = replica_router.snapshot()
+    lines = ['# TYPE db_queries_total counter']
+    lines += [f'db_queries_total{{database="{name}"}} {count}' for name, count in stats['queries'].items()]
+    lines.append('# TYPE db_read_routing_total counter')
+    lines += [f'db_read_routing_total{{outcome="{outcome}"}} {count}' for outcome, count in stats['routing'].items()]
+    lines += ['# TYPE db_replica_up gauge', '# TYPE db_replica_lag_seconds gauge']
+    for name, replica in stats['replicas'].items():
+        lines.append(f'db_replica_up{{database="{name}"}} {int(bool(replica["up"]))}')
+        if replica['lag'] is not None:
+            lines.append(f'db_replica_lag_seconds{{database="{name}"}} {replica["lag"]}')
+    return lines
+
+
+request_metrics.add_collector(cache_metrics)
+request_metrics.add_collector(job_metrics)
+request_metrics.add_collector(replica_metrics)
+
+
+# Prometheus scrape endpoint
+@metrics_bp.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(request_metrics.render(), content_type=PROMETHEUS_CONTENT_TYPE)
@@ -1,18 +1,75 @@
-from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
-from db.app import db, Order, User, Album
+from flask import Blueprint, request, jsonify, send_file
+from flask_jwt_extended import jwt_required
+from sqlalchemy import update, delete, insert, case, tuple_
+from sqlalchemy.exc import IntegrityError
+from db.app import db, Order, Album, User, OrderArchive
+from auth.identity import current_user_id, is_admin, admin_required
+from db.sales import defer_sales
+from routes.events import inventory_feed
+from routes.cache import response_cache, album_tags
+from routes.streaming import stream_rows
+from routes.batch import parse_expand, expand_query, valid_id
+from routes.serializers import (
+    ORDER_COLUMNS, MY_ORDER_COLUMNS, ORDER_LINE_COLUMNS, ALBUM_COLUMNS,
+    order_payload, my_order_payload, order_line_payload, album_payload
+)
+
+from datetime import datetime, timedelta
+from urllib.parse import urlencode
+import base64
+import json
+import os
 
 orders_bp = Blueprint('orders', __name__, url_prefix='/orders')
 
+MAX_CART_LINES = 100
+MAX_INTEGER = 2 ** 31 - 1  # Largest value an Integer column holds; larger ones fail to bind
+
+# Order history pagination settings
+DEFAULT_HISTORY_PAGE_SIZE = 50
+MAX_HISTORY_PAGE_SIZE = 200
+
+# Order lists always carry an album summary; ?expand=album swaps in the full album
+# (price, stock, ratings). The album is joined already, so this only adds columns.
+ORDER_EXPANSIONS = {'album': (None, None, ALBUM_COLUMNS, album_payload)}
+
+# Helper: quantities must be positive integers (bool is an int subclass in Python)
+def valid_quantity(quantity):
+    return isinstance(quantity, int) and not isinstance(quantity, bool) and 0 < quantity <= MAX_INTEGER
+
+# Helper: take stock in a single conditional UPDATE so concurrent checkouts can't oversell.
+# Returns the album's (price, quantity left), or None if it doesn't exist or has too little stock.
+def reserve_stock(album_id, quantity):
+    return db.session.execute(
+        update(Album)
+        .where(Album.id == album_id, Album.quantity >= quantity)
+        .values(quantity=Album.quantity - quantity)
+        .returning(Album.price, Album.quantity)
+        .execution_options(synchronize_session=False)
+    ).first()
+
+# Helper: put stock back in a single UPDATE (no read-modify-write).
+# Returns the album's (price, quantity), or None if it no longer exists.
+def restore_stock(album_id, quantity):
+    return db.session.execute(
+        update(Album)
+        .where(Album.id == album_id)
+        .values(quantity=Album.quantity + quantity)
+        .returning(Album.price, Album.quantity)
+        .execution_options(synchronize_session=False)
+    ).first()
+
+# Helper: the order rows' user_id foreign key failed. The albums are locked and
+# known to exist by then, so the user was deleted while their token is still valid.
+def user_gone():
+    db.session.rollback()
+    return jsonify({'error': 'User not found'}), 404
+
 # Create Order
 @orders_bp.route('/', methods=['POST'])
 @jwt_required()
 def create_order():
-    current_user = get_jwt_identity()
-    user = User.query.filter_by(username=current_user).first()
-    if not user:
-        return jsonify({'error': 'User not found'}), 404
-
+    user_id = current_user_id()
     data = request.get_json()
     album_id = data.get('album_id')
     quantity = data.get('quantity')
@@ -20,92 +77,270 @@ def create_order():
     if not album_id or not quantity:
         return jsonify({'error': 'Missing album_id or quantity'}), 400
 
-    album = Album.query.get(album_id)
-    if not album:
-        return jsonify({'error': 'Album not found'}), 404
+    if not valid_id(album_id):
+        return jsonify({'error': 'album_id must be a positive integer'}), 400
 
-    if album.quantity < quantity:
+    if not valid_quantity(quantity):
+        return jsonify({'error': 'Quantity must be a positive integer'}), 400
+
+    reserved = reserve_stock(album_id, quantity)  # Decrease stock
+    if reserved is None:
+        db.session.rollback()
+        album = Album.query.get(album_id)
+        if not album:
+            return jsonify({'error': 'Album not found'}), 404
         return jsonify({'error': 'Not enough stock', 'available': album.quantity}), 400
 
-    total_price = album.price * quantity
     order = Order(
-        user_id=user.id,
+        user_id=user_id,
         album_id=album_id,
         quantity=quantity,
-        total_price=total_price
+        total_price=reserved.price * quantity
     )
 
-    album.quantity -= quantity  # Decrease stock
-
     db.session.add(order)
+    try:
+        db.session.flush()  # INSERT ... RETURNING also loads the server-set order_date
+    except IntegrityError:
+        return user_gone()
+    defer_sales([(order.order_date, album_id, quantity, order.total_price)])
+    inventory_feed.emit(album_id, reserved.quantity, reserved.price)
     db.session.commit()
+    response_cache.invalidate(*album_tags(album_id))
 
     return jsonify({
         'message': 'Order created successfully',
         'order': {
             'id': order.id,
-            'album_id': album.id,
+            'album_id': order.album_id,
             'quantity': order.quantity,
             'total_price': order.total_price
         }
     }), 201
 
-# Get All Orders (Admin only)
-@orders_bp.route('/', methods=['GET'])
+# Checkout a whole cart in one transaction
+@orders_bp.route('/checkout', methods=['POST'])
 @jwt_required()
+def checkout():
+    user_id = current_user_id()
+    data = request.get_json() or {}
+    items = data.get('items')
+    if not isinstance(items, list) or not items:
+        return jsonify({'error': 'Missing items'}), 400
+    if len(items) > MAX_CART_LINES:
+        return jsonify({'error': f'A cart can hold at most {MAX_CART_LINES} lines'}), 400
+
+    # Merge repeated albums into one line each
+    cart = {}
+    for item in items:
+        album_id = item.get('album_id') if isinstance(item, dict) else None
+        quantity = item.get('quantity') if isinstance(item, dict) else None
+        if not valid_id(album_id) or not valid_quantity(quantity):
+            return jsonify({'error': 'Each item needs an album_id and a positive integer quantity'}), 400
+        cart[album_id] = cart.get(album_id, 0) + quantity
+    album_ids = sorted(cart)
+
+    # Lock every album row in id order, so overlapping carts can't deadlock
+    albums = {a.id: a for a in db.session.execute(
+        db.select(Album.id, Album.quantity, Album.price)
+        .where(Album.id.in_(album_ids))
+        .order_by(Album.id)
+        .with_for_update()
+    )}
+
+    missing = [album_id for album_id in album_ids if album_id not in albums]
+    if missing:
+        db.session.rollback()
+        return jsonify({'error': 'Album not found', 'album_ids': missing}), 404
+
+    short = [{'album_id': album_id, 'requested': cart[album_id], 'available': albums[album_id].quantity}
+             for album_id in album_ids if albums[album_id].quantity < cart[album_id]]
+    if short:
+        db.session.rollback()
+        return jsonify({'error': 'Not enough stock', 'items': short}), 400
+
+    # Decrement all lines in a single statement; the WHERE guard still holds on
+    # backends that ignore FOR UPDATE
+    requested = case(cart, value=Album.id)
+    updated = db.session.execute(
+        update(Album)
+        .where(Album.id.in_(album_ids), Album.quantity >= requested)
+        .values(quantity=Album.quantity - requested)
+        .returning(Album.id, Album.quantity, Album.price)
+        .execution_options(synchronize_session=False)
+    ).all()
+    if len(updated) != len(album_ids):
+        db.session.rollback()
+        return jsonify({'error': 'Not enough stock'}), 409
+
+    # Bulk insert every order row
+    try:
+        rows = db.session.execute(
+            insert(Order).returning(*ORDER_LINE_COLUMNS, sort_by_parameter_order=True),
+            [{
+                'user_id': user_id,
+                'album_id': album_id,
+                'quantity': cart[album_id],
+                'total_price': albums[album_id].price * cart[album_id]
+            } for album_id in album_ids]
+        ).all()
+    except IntegrityError:
+        return user_gone()
+    defer_sales([(r.order_date, r.album_id, r.quantity, r.total_price) for r in rows])
+    for album in updated:
+        inventory_feed.emit(album.id, album.quantity, album.price)
+    db.session.commit()
+    response_cache.invalidate('albums', *(f'album:{album_id}' for album_id in album_ids))
+
+    return jsonify({
+        'message': 'Checkout completed successfully',
+        'orders': [order_line_payload(r) for r in rows],
+        'total_price': sum(r.total_price for r in rows)
+    }), 201
+
+# Helper: ?from=&to= (YYYY-MM-DD, inclusive, both optional) as order_date conditions.
+# On PostgreSQL only the monthly partitions inside the range are read.
+def order_date_range(args):
+    conditions = []
+    if args.get('from'):
+        conditions.append(Order.order_date >= datetime.strptime(args['from'], '%Y-%m-%d'))
+    if args.get('to'):
+        conditions.append(Order.order_date < datetime.strptime(args['to'], '%Y-%m-%d') + timedelta(days=1))
+    return conditions
+
+# Get All Orders (Admin only), with buyer and album details joined in
+@orders_bp.route('/', methods=['GET'])
+@admin_required()
 def get_all_orders():
-    current_user = get_jwt_identity()
-    user = User.query.filter_by(username=current_user).first()
+    try:
+        expand = parse_expand(request.args.get('expand'), ('album',))
+        date_range = order_date_range(request.args)
+    except ValueError as e:
+        return jsonify({'error': 'Invalid query parameters', 'details': str(e)}), 400
 
-    if user.role != 'admin':
-        return jsonify({'error': 'Admins only'}), 403
+    statement, serialize = expand_query(
+        db.select(*ORDER_COLUMNS).join(Order.user).join(Order.album).where(*date_range),
+        order_payload, len(ORDER_COLUMNS), ORDER_EXPANSIONS, expand
+    )
+    return stream_rows(statement.order_by(Order.id), serialize), 200
 
-    orders = Order.query.all()
+# Archived months of orders (Admin only); see db/partitions.py
+@orders_bp.route('/archive', methods=['GET'])
+@admin_required()
+def list_order_archives():
+    archives = db.session.execute(db.select(OrderArchive).order_by(OrderArchive.month)).scalars()
     return jsonify([{
-        'id': o.id,
-        'user_id': o.user_id,
-        'album_id': o.album_id,
-        'quantity': o.quantity,
-        'total_price': o.total_price,
-        'order_date': o.order_date.isoformat()
-    } for o in orders]), 200
-
-# Get Orders by Current User
+        'month': f'{archive.month:%Y-%m}',
+        'orders': archive.orders,
+        'archived_at': archive.archived_at.isoformat()
+    } for archive in archives]), 200
+
+# Download one archived month as gzipped CSV (Admin only)
+@orders_bp.route('/archive/<month>', methods=['GET'])
+@admin_required()
+def download_order_archive(month):
+    try:
+        month = datetime.strptime(month, '%Y-%m').date()
+    except ValueError:
+        return jsonify({'error': 'Invalid month', 'details': 'month must be YYYY-MM'}), 400
+    archive = db.session.get(OrderArchive, month)
+    if not archive or not os.path.exists(archive.path):
+        return jsonify({'error': 'Archive not found'}), 404
+    return send_file(archive.path, mimetype='application/gzip', as_attachment=True,
+                     download_name=os.path.basename(archive.path))
+
+# Helper: opaque keyset cursor holding the last order's (order_date, id)
+def encode_order_cursor(order_date, order_id):
+    raw = json.dumps([order_date.isoformat(), order_id], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+# Raises ValueError for anything encode_order_cursor wouldn't have produced, so a
+# tampered cursor is a 400 rather than a database error
+def decode_order_cursor(cursor):
+    padded = cursor + '=' * (-len(cursor) % 4)
+    decoded = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    if not isinstance(decoded, list) or len(decoded) != 2:
+        raise ValueError('Malformed cursor')
+    order_date, order_id = decoded
+    if not isinstance(order_date, str) or not valid_id(order_id):
+        raise ValueError('Malformed cursor')
+    return datetime.fromisoformat(order_date), order_id
+
+# Get Orders by Current User (keyset-paginated by order date, album details inline)
 @orders_bp.route('/my', methods=['GET'])
 @jwt_required()
 def get_my_orders():
-    current_user = get_jwt_identity()
-    user = User.query.filter_by(username=current_user).first()
+    try:
+        limit = min(int(request.args.get('limit', DEFAULT_HISTORY_PAGE_SIZE)), MAX_HISTORY_PAGE_SIZE)
+        if limit < 1:
+            raise ValueError('limit must be positive')
+        order = request.args.get('order', 'asc')
+        if order not in ('asc', 'desc'):
+            raise ValueError('order must be asc or desc')
+        cursor = decode_order_cursor(request.args['cursor']) if request.args.get('cursor') else None
+        expand = parse_expand(request.args.get('expand'), ('album',))
+        date_range = order_date_range(request.args)
+    except (ValueError, TypeError) as e:
+        return jsonify({'error': 'Invalid query parameters', 'details': str(e)}), 400
 
-    orders = Order.query.filter_by(user_id=user.id).all()
-    return jsonify([{
-        'id': o.id,
-        'album_id': o.album_id,
-        'quantity': o.quantity,
-        'total_price': o.total_price,
-        'order_date': o.order_date.isoformat()
-    } for o in orders]), 200
+    descending = order == 'desc'
+    statement, serialize = expand_query(
+        db.select(*MY_ORDER_COLUMNS).join(Order.album),
+        my_order_payload, len(MY_ORDER_COLUMNS), ORDER_EXPANSIONS, expand
+    )
+    statement = statement.where(Order.user_id == current_user_id(), *date_range)
+    if cursor:
+        key = tuple_(Order.order_date, Order.id)
+        statement = statement.where(key < cursor if descending else key > cursor)
+    if descending:
+        statement = statement.order_by(Order.order_date.desc(), Order.id.desc())
+    else:
+        statement = statement.order_by(Order.order_date, Order.id)
+
+    # Fetch one extra row to learn whether another page exists
+    orders = db.session.execute(statement.limit(limit + 1)).all()
+    has_more = len(orders) > limit
+    orders = orders[:limit]
+
+    response = jsonify([serialize(o) for o in orders])
+    if has_more:
+        last = orders[-1]
+        next_cursor = encode_order_cursor(last.order_date, last.id)
+        next_args = request.args.to_dict()
+        next_args['cursor'] = next_cursor
+        response.headers['X-Next-Cursor'] = next_cursor
+        response.headers['Link'] = f'<{request.base_url}?{urlencode(next_args)}>; rel="next"'
+    return response, 200
 
 # Delete Order (by ID - user can only delete their own)
 @orders_bp.route('/<int:order_id>', methods=['DELETE'])
 @jwt_required()
 def delete_order(order_id):
-    current_user = get_jwt_identity()
-    user = User.query.filter_by(username=current_user).first()
     order = Order.query.get(order_id)
 
     if not order:
         return jsonify({'error': 'Order not found'}), 404
 
-    if user.id != order.user_id and user.role != 'admin':
+    if current_user_id() != order.user_id and not is_admin():
         return jsonify({'error': 'Unauthorized to delete this order'}), 403
 
-    # Restore album quantity
-    album = Album.query.get(order.album_id)
-    if album:
-        album.quantity += order.quantity
+    # Delete conditionally so two concurrent deletes can't both restore stock
+    deleted = db.session.execute(
+        delete(Order)
+        .where(Order.id == order_id)
+        .returning(Order.album_id, Order.quantity, Order.total_price, Order.order_date)
+        .execution_options(synchronize_session=False)
+    ).first()
+    if not deleted:
+        db.session.rollback()
+        return jsonify({'error': 'Order not found'}), 404
 
-    db.session.delete(order)
+    # Restore album quantity now; taking the sale back out of the rollup can wait
+    restored = restore_stock(deleted.album_id, deleted.quantity)
+    if restored:
+        inventory_feed.emit(deleted.album_id, restored.quantity, restored.price)
+    defer_sales([(deleted.order_date, deleted.album_id, deleted.quantity, deleted.total_price)], sign=-1)
     db.session.commit()
+    response_cache.invalidate(*album_tags(deleted.album_id))
 
     return jsonify({'message': f'Order {order_id} deleted and stock restored'}), 200
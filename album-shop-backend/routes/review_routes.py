@@ -1,128 +1,147 @@
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
-from db.app import db, Review, User, Album
+from flask_jwt_extended import jwt_required
+from db.app import db, Review, Album, User
+from db.ratings import valid_rating, apply_rating_change
+from routes.cache import response_cache, album_tags
+from routes.streaming import stream_rows
+from routes.batch import parse_expand, expand_query
+from routes.serializers import (
+    REVIEW_COLUMNS, ALBUM_REVIEW_COLUMNS, USER_REVIEW_COLUMNS, ALBUM_COLUMNS, USER_SUMMARY_COLUMNS,
+    review_payload, album_review_payload, user_review_payload, album_payload, user_summary_payload
+)
+from auth.identity import current_user_id, is_admin, admin_required
 
 from datetime import datetime
 
 reviews_bp = Blueprint('reviews', __name__, url_prefix='/reviews')
 
+# Records review lists can inline with ?expand=, joined into the list query
+REVIEW_EXPANSIONS = {
+    'user': (User, User.id == Review.user_id, USER_SUMMARY_COLUMNS, user_summary_payload),
+    'album': (Album, Album.id == Review.album_id, ALBUM_COLUMNS, album_payload),
+}
+
+# Helper: tags for an album's review list and its rating aggregates
+def review_tags(album_id):
+    return (*album_tags(album_id), f'reviews:album:{album_id}')
+
 
 # Create a review
 @reviews_bp.route('/', methods=['POST'])
 @jwt_required()
 def create_review():
     data = request.get_json()
-    current_user = get_jwt_identity()
-
-    user = User.query.filter_by(username=current_user).first()
+    user_id = current_user_id()
     album = Album.query.get(data.get('album_id'))
 
-    if not user or not album:
+    if not user_id or not album:
         return jsonify({'error': 'Invalid user or album'}), 400
 
+    if not valid_rating(data.get('rating')):
+        return jsonify({'error': 'Rating must be an integer from 1 to 5'}), 400
+
     try:
         review = Review(
             rating=data['rating'],
             comment=data.get('comment'),
             album_id=album.id,
-            user_id=user.id
+            user_id=user_id
         )
         db.session.add(review)
+        apply_rating_change(album.id, added=review.rating)
         db.session.commit()
+        response_cache.invalidate(*review_tags(album.id))
 
         return jsonify({'message': 'Review added successfully'}), 201
     except Exception as e:
         return jsonify({'error': 'Invalid input or server error', 'details': str(e)}), 500
 
-# Get all reviews (admin only)
+# Get all reviews (admin only); ?expand=user,album inlines reviewers and albums
 @reviews_bp.route('/', methods=['GET'])
-@jwt_required()
+@admin_required('Admin access required')
 def get_all_reviews():
-    current_user = get_jwt_identity()
-    user = User.query.filter_by(username=current_user).first()
-
-    if not user or user.role != 'admin':
-        return jsonify({'error': 'Admin access required'}), 403
-
-    reviews = Review.query.all()
-    return jsonify([
-        {
-            'id': r.id,
-            'album_id': r.album_id,
-            'user_id': r.user_id,
-            'rating': r.rating,
-            'comment': r.comment,
-            'created_at': r.created_at.isoformat() if r.created_at else None,
-            'updated_at': r.updated_at.isoformat() if r.updated_at else None
-        }
-        for r in reviews
-    ])
-
-# Get all reviews for a specific album
+    try:
+        expand = parse_expand(request.args.get('expand'), ('user', 'album'))
+    except ValueError as e:
+        return jsonify({'error': 'Invalid query parameters', 'details': str(e)}), 400
+
+    statement, serialize = expand_query(
+        db.select(*REVIEW_COLUMNS), review_payload, len(REVIEW_COLUMNS), REVIEW_EXPANSIONS, expand
+    )
+    return stream_rows(statement.order_by(Review.id), serialize)
+
+# Get all reviews for a specific album; ?expand=user inlines each reviewer
 @reviews_bp.route('/album/<int:album_id>', methods=['GET'])
+@response_cache.cached('reviews:album:{album_id}')
 def get_reviews_for_album(album_id):
-    reviews = Review.query.filter_by(album_id=album_id).all()
-    return jsonify([
-        {
-            'id': r.id,
-            'user_id': r.user_id,
-            'rating': r.rating,
-            'comment': r.comment,
-            'created_at': r.created_at.isoformat(),
-            'updated_at': r.updated_at.isoformat()
-        } for r in reviews
-    ])
-
-# Get all reviews written by a specific user
+    # The album itself isn't expandable here: album edits don't invalidate this list
+    try:
+        expand = parse_expand(request.args.get('expand'), ('user',))
+    except ValueError as e:
+        return jsonify({'error': 'Invalid query parameters', 'details': str(e)}), 400
+
+    statement, serialize = expand_query(
+        db.select(*ALBUM_REVIEW_COLUMNS), album_review_payload, len(ALBUM_REVIEW_COLUMNS), REVIEW_EXPANSIONS, expand
+    )
+    reviews = db.session.execute(
+        statement.where(Review.album_id == album_id).order_by(Review.created_at, Review.id)
+    ).all()
+    return jsonify([serialize(r) for r in reviews])
+
+# Get all reviews written by a specific user; ?expand=album inlines each album
 @reviews_bp.route('/user/<int:user_id>', methods=['GET'])
 def get_reviews_by_user(user_id):
-    reviews = Review.query.filter_by(user_id=user_id).all()
-    return jsonify([
-        {
-            'id': r.id,
-            'album_id': r.album_id,
-            'rating': r.rating,
-            'comment': r.comment,
-            'created_at': r.created_at.isoformat(),
-            'updated_at': r.updated_at.isoformat()
-        } for r in reviews
-    ])
+    try:
+        expand = parse_expand(request.args.get('expand'), ('album',))
+    except ValueError as e:
+        return jsonify({'error': 'Invalid query parameters', 'details': str(e)}), 400
+
+    statement, serialize = expand_query(
+        db.select(*USER_REVIEW_COLUMNS), user_review_payload, len(USER_REVIEW_COLUMNS), REVIEW_EXPANSIONS, expand
+    )
+    reviews = db.session.execute(
+        statement.where(Review.user_id == user_id).order_by(Review.created_at, Review.id)
+    ).all()
+    return jsonify([serialize(r) for r in reviews])
 
 # Update a review
 @reviews_bp.route('/<int:review_id>', methods=['PUT'])
 @jwt_required()
 def update_review(review_id):
     data = request.get_json()
-    current_user = get_jwt_identity()
-    user = User.query.filter_by(username=current_user).first()
-
-    review = Review.query.get(review_id)
+    # Locked until the commit, so a concurrent edit or delete can't move the
+    # histogram from a rating this one is replacing
+    review = db.session.get(Review, review_id, with_for_update=True)
 
-    if not review or review.user_id != user.id:
+    if not review or review.user_id != current_user_id():
         return jsonify({'error': 'Not authorized to edit this review'}), 403
 
     if 'rating' in data:
+        if not valid_rating(data['rating']):
+            return jsonify({'error': 'Rating must be an integer from 1 to 5'}), 400
+        apply_rating_change(review.album_id, removed=review.rating, added=data['rating'])
         review.rating = data['rating']
     if 'comment' in data:
         review.comment = data['comment']
 
     db.session.commit()
+    response_cache.invalidate(*review_tags(review.album_id))
     return jsonify({'message': 'Review updated successfully'}), 200
 
 # Delete a review
 @reviews_bp.route('/<int:review_id>', methods=['DELETE'])
 @jwt_required()
 def delete_review(review_id):
-    current_user = get_jwt_identity()
-    user = User.query.filter_by(username=current_user).first()
-    review = Review.query.get(review_id)
+    review = db.session.get(Review, review_id, with_for_update=True)
 
     if not review:
         return jsonify({'error': 'Review not found'}), 404
 
-    if review.user_id != user.id and user.role != 'admin':
+    if review.user_id != current_user_id() and not is_admin():
         return jsonify({'error': 'Not authorized to delete this review'}), 403
     
     db.session.delete(review)
+    apply_rating_change(review.album_id, removed=review.rating)
     db.session.commit()
+    response_cache.invalidate(*review_tags(review.album_id))
     return jsonify({'message': 'Review deleted successfully'}), 200
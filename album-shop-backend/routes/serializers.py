@@ -0,0 +1,150 @@
+from datetime import date
+from decimal import Decimal
+from flask import request, has_request_context
+from flask.json.provider import DefaultJSONProvider
+from db.app import Album, Review, Order, User
+
+# Optional fast encoders; without them responses fall back to the stdlib json module
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+MSGPACK_MIMETYPES = ('application/msgpack', 'application/x-msgpack')
+
+# Columns selected for each payload shape. Endpoints select exactly these instead
+# of loading ORM objects and turn each result row (a plain tuple) into a dict.
+ALBUM_COLUMNS = (
+    Album.id, Album.title, Album.artist, Album.release_date, Album.genre, Album.price,
+    Album.quantity, Album.image_url, Album.rating_count, Album.rating_sum,
+    Album.rating_1, Album.rating_2, Album.rating_3, Album.rating_4, Album.rating_5,
+)
+# Order history carries the album's title, artist and image (joined in) so clients
+# don't have to fetch each album; the admin list also names the buyer
+ORDER_COLUMNS = (Order.id, Order.user_id, User.username, Order.album_id, Order.quantity, Order.total_price,
+                 Order.order_date, Album.title, Album.artist, Album.image_url)
+MY_ORDER_COLUMNS = (Order.id, Order.album_id, Order.quantity, Order.total_price, Order.order_date,
+                    Album.title, Album.artist, Album.image_url)
+ORDER_LINE_COLUMNS = (Order.id, Order.album_id, Order.quantity, Order.total_price, Order.order_date)
+REVIEW_COLUMNS = (Review.id, Review.album_id, Review.user_id, Review.rating, Review.comment,
+                  Review.created_at, Review.updated_at)
+ALBUM_REVIEW_COLUMNS = (Review.id, Review.user_id, Review.rating, Review.comment,
+                        Review.created_at, Review.updated_at)
+USER_REVIEW_COLUMNS = (Review.id, Review.album_id, Review.rating, Review.comment,
+                       Review.created_at, Review.updated_at)
+USER_COLUMNS = (User.id, User.username, User.email, User.role)
+# What anyone may see about a user (GET /users/<id>, batch lookups, expand=user)
+USER_SUMMARY_COLUMNS = (User.id, User.username)
+
+
+# Row -> dict function for rows selected with `columns`. Keys are worked out once;
+# zipping them with the row is several times cheaper than Row._asdict() or
+# per-attribute access. Dates are left for the encoder.
+def row_serializer(columns):
+    keys = tuple(column.key for column in columns)
+    return lambda row: dict(zip(keys, row))
+
+
+order_line_payload = row_serializer(ORDER_LINE_COLUMNS)
+review_payload = row_serializer(REVIEW_COLUMNS)
+album_review_payload = row_serializer(ALBUM_REVIEW_COLUMNS)
+user_review_payload = row_serializer(USER_REVIEW_COLUMNS)
+user_payload = row_serializer(USER_COLUMNS)
+user_summary_payload = row_serializer(USER_SUMMARY_COLUMNS)
+
+
+# Public album payload, including review aggregates, from an ALBUM_COLUMNS row
+def album_payload(row):
+    (album_id, title, artist, release_date, genre, price, quantity, image_url,
+     rating_count, rating_sum, rating_1, rating_2, rating_3, rating_4, rating_5) = row
+    return {
+        'id': album_id,
+        'title': title,
+        'artist': artist,
+        'release_date': release_date,
+        'genre': genre,
+        'price': price,
+        'quantity': quantity,
+        'image_url': image_url,
+        'rating_count': rating_count,
+        'average_rating': round(rating_sum / rating_count, 2) if rating_count else None,
+        'rating_histogram': {'1': rating_1, '2': rating_2, '3': rating_3, '4': rating_4, '5': rating_5}
+    }
+
+
+# Admin order payload from an ORDER_COLUMNS row
+def order_payload(row):
+    order_id, user_id, username, album_id, quantity, total_price, order_date, title, artist, image_url = row
+    return {
+        'id': order_id,
+        'user_id': user_id,
+        'username': username,
+        'album_id': album_id,
+        'quantity': quantity,
+        'total_price': total_price,
+        'order_date': order_date,
+        'album': {'id': album_id, 'title': title, 'artist': artist, 'image_url': image_url}
+    }
+
+
+# Order history payload from a MY_ORDER_COLUMNS row
+def my_order_payload(row):
+    order_id, album_id, quantity, total_price, order_date, title, artist, image_url = row
+    return {
+        'id': order_id,
+        'album_id': album_id,
+        'quantity': quantity,
+        'total_price': total_price,
+        'order_date': order_date,
+        'album': {'id': album_id, 'title': title, 'artist': artist, 'image_url': image_url}
+    }
+
+
+# Types the encoders don't handle natively; dates and datetimes go out as ISO 8601
+def encode_default(obj):
+    if isinstance(obj, date):
+        return obj.isoformat()
+    if isinstance(obj, Decimal):
+        return str(obj)
+    raise TypeError(f'Object of type {type(obj).__name__} is not serializable')
+
+
+def wants_msgpack():
+    if msgpack is None or not has_request_context():
+        return False
+    return request.accept_mimetypes.best_match(('application/json',) + MSGPACK_MIMETYPES) in MSGPACK_MIMETYPES
+
+
+# JSON provider used by jsonify and request.get_json. Encodes with orjson when it
+# is installed, and answers with MessagePack when the client asks for it.
+# Keys keep the order the payload was built in rather than being sorted.
+class FastJSONProvider(DefaultJSONProvider):
+    default = staticmethod(encode_default)
+    sort_keys = False
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None:
+            kwargs.setdefault('separators', (',', ':'))
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=encode_default, option=orjson.OPT_NON_STR_KEYS).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        if orjson is None:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        if wants_msgpack():
+            return self._app.response_class(
+                msgpack.packb(obj, default=encode_default), mimetype=MSGPACK_MIMETYPES[0]
+            )
+        if orjson is None:
+            return super().response(obj)
+        body = orjson.dumps(obj, default=encode_default, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_APPEND_NEWLINE)
+        return self._app.response_class(body, mimetype=self.mimetype)
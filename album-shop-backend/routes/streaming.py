@@ -0,0 +1,40 @@
+from flask import Response, current_app, request, stream_with_context
+from db.app import db
+
+STREAM_BATCH_SIZE = 500
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+
+# Clients opt into newline-delimited JSON with ?format=ndjson or an Accept header
+def wants_ndjson():
+    if request.args.get('format') == 'ndjson':
+        return True
+    return request.accept_mimetypes.best_match(['application/json', NDJSON_MIMETYPE]) == NDJSON_MIMETYPE
+
+
+# Stream the rows of `statement` as a JSON array (optionally wrapped as {key: [...]})
+# or as NDJSON. Rows come off a server-side cursor in batches, so memory stays flat
+# however large the table is and the first bytes go out as soon as one batch is read.
+def stream_rows(statement, serialize, key=None, batch_size=STREAM_BATCH_SIZE):
+    dumps = current_app.json.dumps
+    ndjson = wants_ndjson()
+
+    def generate():
+        result = db.session.execute(
+            statement.execution_options(stream_results=True, yield_per=batch_size)
+        )
+        if not ndjson:
+            yield '{"%s":[' % key if key else '['
+        first = True
+        for partition in result.partitions():
+            rows = [dumps(serialize(row)) for row in partition]
+            if ndjson:
+                yield '\n'.join(rows) + '\n'
+            else:
+                yield ('' if first else ',') + ','.join(rows)
+                first = False
+        if not ndjson:
+            yield ']}' if key else ']'
+
+    mimetype = NDJSON_MIMETYPE if ndjson else 'application/json'
+    return Response(stream_with_context(generate()), mimetype=mimetype)
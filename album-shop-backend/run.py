@@ -1,14 +1,81 @@
+from flask import Flask
 from flask_cors import CORS
-from auth.app import app
+from auth.app import load_config, engine_options_from_env, init_auth
+from db.app import db
 from routes.album_routes import album_bp
 from routes.review_routes import reviews_bp
 from routes.orders_routes import orders_bp
+from routes.cache import cache_bp, response_cache
+from routes.metrics import metrics_bp
+from routes.analytics_routes import analytics_bp
+from db.instrumentation import request_metrics
+from db.ratings import reconcile_ratings_command
+from db.explain import check_query_plans_command
+from db.catalog_import import import_albums_command
+from db.sales import rebuild_sales_rollup_command
+from db.recommendations import co_purchases, rebuild_recommendations_command
+from db.jobs import job_queue, jobs_worker_command
+from db.replicas import replica_router, CONSISTENCY_HEADER
+from db.partitions import order_partitions, maintain_order_partitions_command
+from db.notifications import notifications
+from routes.events import inventory_feed
+from routes.serializers import FastJSONProvider
 
-CORS(app, resources={r"/*": {"origins": "*"}},  supports_credentials=True)
+# Application factory. `config` overrides the settings read from the environment,
+# e.g. create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite://'}). Nothing here touches
+# the database: connections are opened by the first request, job or command.
+def create_app(config=None):
+    app = Flask(__name__)
+    app.json = FastJSONProvider(app)  # orjson encoding, MessagePack on request
+    load_config(app)
+    app.config.update(config or {})
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options_from_env(app.config['SQLALCHEMY_DATABASE_URI']))
+
+    db.init_app(app)
+    init_auth(app)
+
+    CORS(app, resources={r"/*": {"origins": "*"}},  supports_credentials=True,
+         expose_headers=['X-Next-Cursor', 'Link', 'ETag', 'X-Cache', CONSISTENCY_HEADER])
+
+    notifications.init_app(app)
+    response_cache.init_app(app)
+    request_metrics.init_app(app)
+    job_queue.init_app(app)
+    inventory_feed.init_app(app)
+    co_purchases.init_app(app)
+    replica_router.init_app(app)
+    order_partitions.init_app(app)
+    # Public catalog and review reads; admin lists and the event stream stay on the primary
+    replica_router.route_reads(
+        'album_bp.get_albums', 'album_bp.search', 'album_bp.get_album',
+        'reviews.get_reviews_for_album', 'reviews.get_reviews_by_user',
+    )
+
+    # Periodic maintenance, run by whichever job worker gets to it first
+    job_queue.schedule('prune-blocklist', app.config['BLOCKLIST_PURGE_SECONDS'])
+    job_queue.schedule('prune-jobs', 3600)
+    job_queue.schedule('rebuild-sales-rollup', app.config['SALES_ROLLUP_REBUILD_SECONDS'])
+    job_queue.schedule('refresh-recommendations', app.config['RECOMMENDATIONS_REFRESH_SECONDS'])
+    job_queue.schedule('maintain-order-partitions', app.config['ORDER_PARTITION_MAINTENANCE_SECONDS'])
+    job_queue.schedule('reconcile-ratings', app.config['RATINGS_RECONCILE_SECONDS'])
+
+    app.register_blueprint(album_bp)
+    app.register_blueprint(reviews_bp)
+    app.register_blueprint(orders_bp)
+    app.register_blueprint(cache_bp)
+    app.register_blueprint(metrics_bp)
+    app.register_blueprint(analytics_bp)
+
+    app.cli.add_command(reconcile_ratings_command)
+    app.cli.add_command(check_query_plans_command)
+    app.cli.add_command(import_albums_command)
+    app.cli.add_command(rebuild_sales_rollup_command)
+    app.cli.add_command(jobs_worker_command)
+    app.cli.add_command(rebuild_recommendations_command)
+    app.cli.add_command(maintain_order_partitions_command)
+
+    return app
 
-app.register_blueprint(album_bp)
-app.register_blueprint(reviews_bp)
-app.register_blueprint(orders_bp)
 
 if __name__ == '__main__':
-    app.run(debug=True)
+    create_app().run(debug=True)
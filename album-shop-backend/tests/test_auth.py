@@ -0,0 +1,48 @@
+# Registration and login input checks
+import auth.app
+import pytest
+
+BAD_BODIES = [
+    [],
+    'alice@example.com',
+    {},
+    {'email': 'alice@example.com'},
+    {'email': ['alice@example.com'], 'password': 'password'},
+    {'email': {'$ne': ''}, 'password': 'password'},
+    {'email': 'alice@example.com', 'password': 12345678},
+    {'email': 'alice@example.com', 'password': ''},
+    {'email': None, 'password': 'password'},
+]
+
+
+@pytest.fixture
+def limiter_hits(monkeypatch):
+    hits = []
+    for limiter in (auth.app.ip_limiter, auth.app.account_limiter):
+        monkeypatch.setattr(limiter, 'hit', lambda key, hit=limiter.hit: hits.append(key) or hit(key))
+    return hits
+
+
+@pytest.mark.parametrize('body', BAD_BODIES)
+def test_login_rejects_malformed_credentials_before_the_rate_limiter(client, limiter_hits, body):
+    response = client.post('/login', json=body)
+    assert response.status_code == 400
+    assert response.json['error'] == 'Missing email or password'
+    assert limiter_hits == []
+
+
+@pytest.mark.parametrize('body', BAD_BODIES + [{'username': 7, 'email': 'alice@example.com', 'password': 'password'}])
+def test_register_rejects_malformed_fields(client, limiter_hits, body):
+    if isinstance(body, dict) and 'username' not in body:
+        body = {'username': 'alice', **body}
+    assert client.post('/register', json=body).status_code == 400
+    assert limiter_hits == []
+
+
+def test_login_with_valid_credentials(client, limiter_hits):
+    user = {'username': 'alice', 'email': 'alice@example.com', 'password': 'password'}
+    assert client.post('/register', json=user).status_code == 201
+    response = client.post('/login', json={'email': 'alice@example.com', 'password': 'password'})
+    assert response.status_code == 200
+    assert 'alice@example.com' in limiter_hits
+    assert client.post('/login', json={'email': 'alice@example.com', 'password': 'wrong'}).status_code == 401
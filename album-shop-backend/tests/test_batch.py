@@ -0,0 +1,37 @@
+# Batch lookups: GET /albums/?ids= and GET /users?ids=
+from routes.batch import parse_ids, MAX_BATCH_IDS, MAX_ID
+import pytest
+
+
+def test_parse_ids_keeps_request_order_and_drops_duplicates():
+    assert parse_ids('3,1,2,3') == [3, 1, 2]
+    assert parse_ids(' 4 ,, 5 ') == [4, 5]
+    assert parse_ids(str(MAX_ID)) == [MAX_ID]
+
+
+@pytest.mark.parametrize('value', [
+    '', ',', 'a', '1.5', '0', '-1', '1,-2', str(MAX_ID + 1), str(2 ** 63), '1,' + '9' * 40,
+    ','.join(map(str, range(1, MAX_BATCH_IDS + 2))),
+])
+def test_parse_ids_rejects(value):
+    with pytest.raises(ValueError):
+        parse_ids(value)
+
+
+def check_id_bounds(client, path):
+    for ids in ('0', '-5', str(MAX_ID + 1), '1,' + '9' * 40):
+        response = client.get(f'{path}?ids={ids}')
+        assert response.status_code == 400
+        assert response.json['error'] == 'Invalid query parameters'
+    assert client.get(f'{path}?ids=1,{MAX_ID}').status_code == 200
+
+
+@pytest.mark.parametrize('path', ['/albums/', '/users'])
+def test_out_of_range_ids_are_a_bad_request(client, path):
+    check_id_bounds(client, path)
+
+
+# PostgreSQL's Integer columns are 32-bit, so this is where MAX_ID matters
+@pytest.mark.parametrize('path', ['/albums/', '/users'])
+def test_largest_id_binds_on_postgresql(pg_app, path):
+    check_id_bounds(pg_app.test_client(), path)
@@ -0,0 +1,79 @@
+# Keyset pagination of GET /albums/: pages chain through X-Next-Cursor for every
+# sort, and cursors that don't belong to the sort are a 400
+from datetime import date
+from db.app import Album
+from routes.album_routes import SORT_COLUMNS, encode_cursor
+from routes.batch import MAX_ID
+import pytest
+
+# Repeated prices, genres and artists make the id tie-break matter
+CATALOG = [
+    ('Blue', 'Joni Mitchell', date(1971, 6, 22), 'Folk', 10.0),
+    ('Hejira', 'Joni Mitchell', date(1976, 11, 22), 'Folk', 12.5),
+    ('Kind of Blue', 'Miles Davis', date(1959, 8, 17), 'Jazz', 10.0),
+    ('Bitches Brew', 'Miles Davis', date(1970, 3, 30), 'Jazz', 15.0),
+    ('Pink Moon', 'Nick Drake', date(1972, 2, 25), 'Folk', 10.0),
+    ('Horses', 'Patti Smith', date(1975, 12, 13), 'Rock', 12.5),
+    ('Marquee Moon', 'Television', date(1977, 2, 8), 'Rock', 9.99),
+]
+
+
+@pytest.fixture
+def albums(db_session):
+    rows = [Album(title, artist, released, genre, price, 5) for title, artist, released, genre, price in CATALOG]
+    db_session.add_all(rows)
+    db_session.commit()
+    return rows
+
+
+def all_pages(client, query):
+    ids, pages, cursor = [], 0, None
+    while True:
+        response = client.get(f'/albums/?{query}' + (f'&cursor={cursor}' if cursor else ''))
+        assert response.status_code == 200
+        ids += [album['id'] for album in response.json]
+        pages += 1
+        cursor = response.headers.get('X-Next-Cursor')
+        if not cursor:
+            return ids, pages
+        assert f'cursor={cursor}' in response.headers['Link']
+
+
+@pytest.mark.parametrize('order', ['asc', 'desc'])
+@pytest.mark.parametrize('sort', list(SORT_COLUMNS))
+def test_pages_chain_for_every_sort(client, albums, sort, order):
+    expected = sorted(albums, key=lambda album: (getattr(album, sort), album.id), reverse=order == 'desc')
+
+    ids, pages = all_pages(client, f'sort={sort}&order={order}&limit=3')
+
+    assert ids == [album.id for album in expected]
+    assert pages == 3
+
+
+def test_filters_carry_over_to_the_next_page(client, albums):
+    ids, pages = all_pages(client, 'genre=Folk&sort=price&limit=2')
+    assert ids == [album.id for album in sorted(albums, key=lambda a: (a.price, a.id)) if album.genre == 'Folk']
+    assert pages == 2
+
+
+@pytest.mark.parametrize('sort, cursor', [
+    ('id', 'not-a-cursor'),
+    ('id', encode_cursor('Blue', 1)),  # A title cursor
+    ('title', encode_cursor(10.0, 1)),  # A price cursor
+    ('price', encode_cursor('Blue', 1)),
+    ('release_date', encode_cursor('1971', 1)),
+    ('release_date', encode_cursor(date(1971, 6, 22), 'one')),
+    ('id', encode_cursor(True, 1)),
+    ('id', encode_cursor(MAX_ID + 1, MAX_ID + 1)),
+    ('title', encode_cursor('Blue', 2 ** 64)),
+    ('price', encode_cursor(2 ** 64, 1)),
+])
+def test_bad_cursors_are_a_bad_request(client, albums, sort, cursor):
+    response = client.get(f'/albums/?sort={sort}&cursor={cursor}')
+    assert response.status_code == 400
+    assert response.json['error'] == 'Invalid query parameters'
+
+
+def test_bad_search_cursor_is_a_bad_request(client, albums):
+    for cursor in ('not-a-cursor', encode_cursor('Blue', 1), encode_cursor(2 ** 64, 1)):
+        assert client.get(f'/albums/search?q=blue&cursor={cursor}').status_code == 400
@@ -0,0 +1,96 @@
+# ?expand= on the review and order lists: related records nested under their name,
+# joined into the list's one query
+from datetime import date
+from db.app import Album
+from db.instrumentation import assert_max_queries
+import pytest
+
+
+# Two albums; alice reviews and orders both, bob reviews the first
+@pytest.fixture
+def shop(db_session, client, auth_headers):
+    album_ids = []
+    for title in ('Blue', 'Hejira'):
+        album = Album(title, 'Joni Mitchell', date(1971, 6, 22), 'Folk', 10.0, 100)
+        db_session.add(album)
+        db_session.commit()
+        album_ids.append(album.id)
+    alice, bob = auth_headers('alice'), auth_headers('bob')
+    for album_id in album_ids:
+        assert client.post('/reviews/', headers=alice, json={'album_id': album_id, 'rating': 5}).status_code == 201
+        assert client.post('/orders/', headers=alice, json={'album_id': album_id, 'quantity': 2}).status_code == 201
+    assert client.post('/reviews/', headers=bob, json={'album_id': album_ids[0], 'rating': 3}).status_code == 201
+    users = {name: client.get('/users/me', headers=headers).json['id'] for name, headers in (('alice', alice), ('bob', bob))}
+    return album_ids, users
+
+
+def test_all_reviews_with_users_and_albums(client, auth_headers, shop):
+    album_ids, users = shop
+    admin = auth_headers('root', admin=True)
+    with assert_max_queries(1):
+        response = client.get('/reviews/?expand=user,album', headers=admin)
+        reviews = response.json  # Streamed: the rows are read while the body is
+    assert response.status_code == 200
+    assert [(r['user'], r['album']['id']) for r in reviews] == [
+        ({'id': users['alice'], 'username': 'alice'}, album_ids[0]),
+        ({'id': users['alice'], 'username': 'alice'}, album_ids[1]),
+        ({'id': users['bob'], 'username': 'bob'}, album_ids[0]),
+    ]
+    album = reviews[0]['album']
+    assert (album['title'], album['quantity'], album['rating_count'], album['average_rating']) == ('Blue', 98, 2, 4.0)
+    assert reviews[0]['user_id'] == users['alice'] and reviews[0]['rating'] == 5
+
+
+def test_reviews_without_expand_carry_ids_only(client, auth_headers, shop):
+    response = client.get('/reviews/', headers=auth_headers('root', admin=True))
+    assert response.status_code == 200
+    assert not any('user' in r or 'album' in r for r in response.json)
+
+
+def test_album_reviews_with_users(client, shop):
+    album_ids, users = shop
+    with assert_max_queries(1):
+        response = client.get(f'/reviews/album/{album_ids[0]}?expand=user')
+    assert response.status_code == 200
+    assert [r['user'] for r in response.json] == [
+        {'id': users['alice'], 'username': 'alice'}, {'id': users['bob'], 'username': 'bob'}
+    ]
+
+
+def test_user_reviews_with_albums(client, shop):
+    album_ids, users = shop
+    with assert_max_queries(1):
+        response = client.get(f"/reviews/user/{users['alice']}?expand=album")
+    assert response.status_code == 200
+    assert [(r['album_id'], r['album']['id'], r['album']['title']) for r in response.json] == [
+        (album_ids[0], album_ids[0], 'Blue'), (album_ids[1], album_ids[1], 'Hejira')
+    ]
+
+
+def test_all_orders_with_full_albums(client, auth_headers, shop):
+    album_ids, users = shop
+    admin = auth_headers('root', admin=True)
+    with assert_max_queries(1):
+        response = client.get('/orders/?expand=album', headers=admin)
+        orders = response.json
+    assert response.status_code == 200
+    assert [(o['username'], o['album']['id']) for o in orders] == [('alice', album_ids[0]), ('alice', album_ids[1])]
+    album = orders[0]['album']
+    assert (album['title'], album['price'], album['quantity'], album['rating_count']) == ('Blue', 10.0, 98, 2)
+    # Without expand, the album summary only
+    summary = client.get('/orders/', headers=admin).json[0]['album']
+    assert set(summary) == {'id', 'title', 'artist', 'image_url'}
+
+
+@pytest.mark.parametrize('url', [
+    '/reviews/?expand=comments',
+    '/reviews/?expand=user,orders',
+    '/reviews/album/1?expand=album',  # The album is the path already
+    '/reviews/user/1?expand=user',
+    '/orders/?expand=user',
+])
+def test_unknown_expansions_are_a_bad_request(client, auth_headers, url):
+    response = client.get(url, headers=auth_headers('root', admin=True))
+    assert response.status_code == 400
+    assert response.json['error'] == 'Invalid query parameters'
+    assert response.json['details'].startswith('expand must be one of: ')
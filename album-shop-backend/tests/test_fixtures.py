@@ -0,0 +1,49 @@
+# The fixtures in testing.py: every test's writes, including the ones jobs make,
+# are rolled back before the next test
+from datetime import date
+from sqlalchemy import func, select
+from db.app import Album, AlbumSalesDaily, Job, Order, User
+
+
+def count(db_session, model):
+    return db_session.execute(select(func.count()).select_from(model)).scalar()
+
+
+def add_album(db_session, title, quantity=5):
+    album = Album(title, 'Joni Mitchell', date(1971, 6, 22), 'Folk', 10.0, quantity)
+    db_session.add(album)
+    db_session.commit()
+    return album.id
+
+
+def test_jobs_run_in_the_test_transaction(db_session, client, auth_headers, run_jobs):
+    album_id = add_album(db_session, 'Blue')
+    response = client.post('/orders/', headers=auth_headers('alice'), json={'album_id': album_id, 'quantity': 2})
+    assert response.status_code == 201
+
+    assert run_jobs() == 1  # record-sales
+    assert run_jobs() == 0
+
+    assert db_session.execute(select(AlbumSalesDaily.units)).scalars().all() == [2]
+    assert db_session.execute(select(Job.status)).scalars().all() == ['done']
+    # The test's transaction is still usable after the jobs committed
+    add_album(db_session, 'Court and Spark')
+    response = client.post('/orders/', headers=auth_headers('alice'), json={'album_id': album_id, 'quantity': 1})
+    assert response.status_code == 201
+    assert run_jobs() == 1
+    assert db_session.execute(select(AlbumSalesDaily.units)).scalars().all() == [3]
+
+
+def test_nothing_leaks_from_earlier_tests(db_session):
+    for model in (Album, Order, User, Job, AlbumSalesDaily):
+        assert count(db_session, model) == 0
+
+
+def test_each_test_registers_its_own_users(client, auth_headers):
+    assert client.get('/orders/my', headers=auth_headers('alice')).json == []
+
+
+def test_each_request_resolves_its_own_user(client, auth_headers):
+    alice, bob = auth_headers('alice'), auth_headers('bob')
+    assert client.get('/users/me', headers=alice).json['username'] == 'alice'
+    assert client.get('/users/me', headers=bob).json['username'] == 'bob'
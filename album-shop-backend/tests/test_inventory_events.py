@@ -0,0 +1,33 @@
+# GET /albums/events: how many streams a worker process takes on
+from flask import Flask
+from auth.app import load_config
+from routes.events import inventory_feed
+
+
+def stream_limit(monkeypatch, **env):
+    for name in ('GUNICORN_WORKER_CLASS', 'GUNICORN_THREADS', 'EVENT_STREAM_MAX_SUBSCRIBERS'):
+        monkeypatch.delenv(name, raising=False)
+    for name, value in env.items():
+        monkeypatch.setenv(name, value)
+    app = Flask(__name__)
+    load_config(app)
+    return app.config['EVENT_STREAM_MAX_SUBSCRIBERS']
+
+
+def test_gthread_workers_keep_most_threads_for_requests(monkeypatch):
+    assert stream_limit(monkeypatch) == 1
+    assert stream_limit(monkeypatch, GUNICORN_THREADS='16') == 4
+    assert stream_limit(monkeypatch, GUNICORN_THREADS='2') == 0
+
+
+def test_gevent_workers_take_many_streams(monkeypatch):
+    assert stream_limit(monkeypatch, GUNICORN_WORKER_CLASS='gevent') == 1000
+    assert stream_limit(monkeypatch, GUNICORN_WORKER_CLASS='gevent', EVENT_STREAM_MAX_SUBSCRIBERS='50') == 50
+
+
+def test_streams_beyond_the_limit_are_turned_away(client, monkeypatch):
+    monkeypatch.setattr(inventory_feed, 'max_subscribers', 0)
+    response = client.get('/albums/events')
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '30'
+    assert inventory_feed.subscribers == 0
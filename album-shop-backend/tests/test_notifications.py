@@ -0,0 +1,76 @@
+# Invalidations and stock changes reaching other workers through PostgreSQL
+# LISTEN/NOTIFY (db/notifications.py); skipped without TEST_DATABASE_URL
+from datetime import date
+from sqlalchemy import create_engine, select, text
+from db.app import db, Album
+from db.notifications import notifications
+from routes.cache import response_cache, INVALIDATION_CHANNEL
+from routes.events import inventory_feed
+import json
+import pytest
+import time
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, 'timed out'
+        time.sleep(0.02)
+
+
+@pytest.fixture
+def listening_app(pg_app, monkeypatch):
+    monkeypatch.setattr(response_cache, 'ttl', 30)
+    response_cache.clear()
+    notifications.start()
+    wait_for(notifications.listening)
+    album = Album('Blue', 'Joni Mitchell', date(1971, 6, 22), 'Folk', 10.0, 5)
+    db.session.add(album)
+    db.session.commit()
+    return pg_app
+
+
+# Another worker's NOTIFY, from a connection of its own
+def notify_from_elsewhere(channel, payload):
+    engine = create_engine(db.engine.url)
+    with engine.begin() as connection:
+        connection.execute(text('SELECT pg_notify(:channel, :payload)'), {'channel': channel, 'payload': json.dumps(payload)})
+    engine.dispose()
+
+
+def test_invalidations_from_other_workers_drop_cached_responses(listening_app):
+    client = listening_app.test_client()
+    assert client.get('/albums/').headers['X-Cache'] == 'MISS'
+    assert client.get('/albums/').headers['X-Cache'] == 'HIT'
+
+    notify_from_elsewhere(INVALIDATION_CHANNEL, ['albums'])
+
+    wait_for(lambda: response_cache.snapshot()['entries'] == 0)
+    assert client.get('/albums/').headers['X-Cache'] == 'MISS'
+
+
+def test_invalidations_are_sent_to_other_workers(listening_app):
+    engine = create_engine(db.engine.url, isolation_level='AUTOCOMMIT')
+    with engine.connect() as connection:
+        driver = connection.connection.driver_connection
+        driver.execute(f'LISTEN {INVALIDATION_CHANNEL}')
+
+        response_cache.invalidate('albums', 'album:1')
+
+        received = next(driver.notifies(timeout=5, stop_after=1))
+    engine.dispose()
+    assert json.loads(received.payload) == ['albums', 'album:1']
+
+
+def test_stock_changes_reach_the_event_feed(listening_app):
+    client = listening_app.test_client()
+    client.post('/register', json={'username': 'alice', 'email': 'alice@example.com', 'password': 'password'})
+    token = client.post('/login', json={'email': 'alice@example.com', 'password': 'password'}).json['access_token']
+    album_id = db.session.execute(select(Album.id)).scalar()
+    published = inventory_feed._seq
+
+    response = client.post('/orders/', headers={'Authorization': f'Bearer {token}'}, json={'album_id': album_id, 'quantity': 2})
+    assert response.status_code == 201
+
+    wait_for(lambda: inventory_feed._seq > published)
+    assert '"quantity":3' in inventory_feed._events[-1][2]
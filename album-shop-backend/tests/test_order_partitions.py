@@ -0,0 +1,63 @@
+# Monthly order partitions (db/partitions.py) on PostgreSQL; the tests run on the
+# pg_app fixture and are skipped without TEST_DATABASE_URL. The order table starts
+# out with partitions from this month to ORDER_PARTITIONS_AHEAD months ahead.
+from datetime import date, datetime
+from sqlalchemy import func, select, text
+from db.app import db, Album, Order, OrderArchive, User
+from db.partitions import order_partitions, add_months, partition_name, DEFAULT_PARTITION
+import os
+
+
+def place_order(order_date):
+    user = db.session.execute(select(User).limit(1)).scalar() or User('alice', 'alice@example.com', password_hash='x')
+    album = db.session.execute(select(Album).limit(1)).scalar() or Album(
+        'Blue', 'Joni Mitchell', date(1971, 6, 22), 'Folk', 10.0, 100
+    )
+    db.session.add_all([user, album])
+    db.session.flush()
+    order = Order(user_id=user.id, album_id=album.id, quantity=1, total_price=10.0)
+    order.order_date = order_date
+    db.session.add(order)
+    db.session.commit()
+    return order.id
+
+
+def default_rows():
+    return db.session.execute(text(f'SELECT count(*) FROM {DEFAULT_PARTITION}')).scalar()
+
+
+def test_create_ahead_moves_orders_out_of_the_default_partition(pg_app):
+    today = date.today().replace(day=1)
+    later = add_months(today, 6)  # Past the partitions the migration created
+    order_id = place_order(datetime.combine(later.replace(day=15), datetime.min.time()))
+    assert default_rows() == 1
+
+    created = order_partitions.create_ahead(later)
+
+    assert later in created and later in order_partitions.partitions()
+    assert default_rows() == 0
+    assert db.session.execute(
+        text(f'SELECT count(*) FROM {partition_name(later)} WHERE id = :id'), {'id': order_id}
+    ).scalar() == 1
+    # Orders for the new month now go to its partition
+    place_order(datetime.combine(later.replace(day=20), datetime.min.time()))
+    assert default_rows() == 0
+
+
+def test_cold_months_include_orders_in_the_default_partition(pg_app, monkeypatch):
+    monkeypatch.setattr(order_partitions, 'archive_after', 12)
+    today = date.today().replace(day=1)
+    old = add_months(today, -24)  # Before the first partition
+    place_order(datetime.combine(old.replace(day=3), datetime.min.time()))
+    assert default_rows() == 1
+
+    assert old in order_partitions.cold_months(today)
+
+    changes = order_partitions.maintain(today)
+
+    assert changes['archived'] == {old: 1}
+    assert default_rows() == 0
+    assert db.session.execute(select(func.count()).select_from(Order)).scalar() == 0
+    assert db.session.get(OrderArchive, old).orders == 1
+    assert os.path.exists(order_partitions.archive_file(old))
+    assert order_partitions.cold_months(today) == []
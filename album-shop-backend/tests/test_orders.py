@@ -0,0 +1,162 @@
+# Placing orders: POST /orders/ and POST /orders/checkout
+from datetime import date
+from sqlalchemy import event, select, update
+from sqlalchemy.orm import Session
+from db.app import db, Album, Order
+from routes.batch import MAX_ID
+import base64
+import json
+import pytest
+
+
+def add_album(session, title='Blue', quantity=5):
+    album = Album(title, 'Joni Mitchell', date(1971, 6, 22), 'Folk', 10.0, quantity)
+    session.add(album)
+    session.commit()
+    return album.id
+
+
+def login(client, username, admin=False):
+    user = {'username': username, 'email': f'{username}@example.com', 'password': 'password'}
+    if admin:
+        user.update(role='admin', admin_code='test-admin-code')
+    client.post('/register', json=user)
+    token = client.post('/login', json={'email': user['email'], 'password': 'password'}).json['access_token']
+    return {'Authorization': f'Bearer {token}'}
+
+
+def encode(payload):
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip('=')
+
+
+def stock(session, album_id):
+    return session.execute(select(Album.quantity).where(Album.id == album_id)).scalar()
+
+
+def place_orders(client, headers, album_id, count):
+    for _ in range(count):
+        assert client.post('/orders/', headers=headers, json={'album_id': album_id, 'quantity': 1}).status_code == 201
+
+
+@pytest.mark.parametrize('order', ['asc', 'desc'])
+def test_order_history_pages_chain(db_session, client, auth_headers, order):
+    alice = auth_headers('alice')
+    place_orders(client, alice, add_album(db_session, quantity=10), 5)
+    place_orders(client, auth_headers('bob'), add_album(db_session, 'Hejira'), 1)
+
+    ids, cursor = [], None
+    while True:
+        query = f'/orders/my?limit=2&order={order}' + (f'&cursor={cursor}' if cursor else '')
+        response = client.get(query, headers=alice)
+        assert response.status_code == 200
+        ids += [o['id'] for o in response.json]
+        cursor = response.headers.get('X-Next-Cursor')
+        if not cursor:
+            break
+    assert len(ids) == 5
+    assert ids == sorted(ids, reverse=order == 'desc')
+
+
+@pytest.mark.parametrize('cursor', [
+    'not-a-cursor',
+    encode({'date': '2026-01-01'}),
+    encode(['2026-01-01T00:00:00']),
+    encode(['2026-01-01T00:00:00', 1, 2]),
+    encode(['yesterday', 1]),
+    encode([20260101, 1]),
+    encode(['2026-01-01T00:00:00', '1']),
+    encode(['2026-01-01T00:00:00', True]),
+    encode(['2026-01-01T00:00:00', 0]),
+    encode(['2026-01-01T00:00:00', MAX_ID + 1]),
+    encode(['2026-01-01T00:00:00', 2 ** 64]),
+])
+def test_bad_order_cursors_are_a_bad_request(client, auth_headers, cursor):
+    response = client.get(f'/orders/my?cursor={cursor}', headers=auth_headers('alice'))
+    assert response.status_code == 400
+    assert response.json['error'] == 'Invalid query parameters'
+
+
+# Tokens outlive their user; the order's foreign key catches it (PostgreSQL only,
+# SQLite doesn't enforce foreign keys here)
+def test_orders_from_a_deleted_user_are_refused(pg_app):
+    client = pg_app.test_client()
+    album_id = add_album(db.session)
+    admin = login(client, 'root', admin=True)
+    alice = login(client, 'alice')
+    alice_id = client.get('/users/me', headers=alice).json['id']
+    assert client.delete(f'/users/{alice_id}', headers=admin).status_code == 200
+
+    response = client.post('/orders/', headers=alice, json={'album_id': album_id, 'quantity': 1})
+    assert response.status_code == 404
+    response = client.post('/orders/checkout', headers=alice, json={'items': [{'album_id': album_id, 'quantity': 1}]})
+    assert response.status_code == 404
+    assert db.session.get(Album, album_id).quantity == 5
+
+
+def test_orders_beyond_the_stock_are_refused(db_session, client, auth_headers):
+    album_id = add_album(db_session, quantity=2)
+    response = client.post('/orders/', headers=auth_headers('alice'), json={'album_id': album_id, 'quantity': 3})
+    assert response.status_code == 400
+    assert response.json == {'error': 'Not enough stock', 'available': 2}
+    assert stock(db_session, album_id) == 2
+
+
+def test_checkout_lists_every_short_line_and_takes_nothing(db_session, client, auth_headers):
+    blue = add_album(db_session, 'Blue', quantity=5)
+    hejira = add_album(db_session, 'Hejira', quantity=1)
+    items = [{'album_id': blue, 'quantity': 2}, {'album_id': hejira, 'quantity': 2}]
+    response = client.post('/orders/checkout', headers=auth_headers('alice'), json={'items': items})
+    assert response.status_code == 400
+    assert response.json['items'] == [{'album_id': hejira, 'requested': 2, 'available': 1}]
+    assert (stock(db_session, blue), stock(db_session, hejira)) == (5, 1)
+    assert db_session.execute(select(Order)).first() is None
+
+
+# The merged line is checked against the stock, not each repeat on its own
+def test_checkout_merges_repeated_albums(db_session, client, auth_headers):
+    album_id = add_album(db_session, quantity=5)
+    headers = auth_headers('alice')
+    items = [{'album_id': album_id, 'quantity': 2}, {'album_id': album_id, 'quantity': 3}]
+    response = client.post('/orders/checkout', headers=headers, json={'items': items})
+    assert response.status_code == 201
+    assert [(o['album_id'], o['quantity']) for o in response.json['orders']] == [(album_id, 5)]
+    assert stock(db_session, album_id) == 0
+
+    items = [{'album_id': album_id, 'quantity': 1}, {'album_id': album_id, 'quantity': 1}]
+    response = client.post('/orders/checkout', headers=headers, json={'items': items})
+    assert response.json['items'] == [{'album_id': album_id, 'requested': 2, 'available': 0}]
+
+
+# Stock taken after the check but before the decrement, as on a backend that
+# ignores FOR UPDATE
+def test_checkout_conflicts_when_the_stock_goes_mid_checkout(db_session, client, auth_headers):
+    album_id = add_album(db_session, quantity=5)
+    sold_out = []
+
+    def sell_out(state):
+        if state.is_update and not sold_out:
+            sold_out.append(album_id)
+            state.session.execute(update(Album).where(Album.id == album_id).values(quantity=1))
+
+    event.listen(Session, 'do_orm_execute', sell_out)
+    try:
+        items = [{'album_id': album_id, 'quantity': 2}]
+        response = client.post('/orders/checkout', headers=auth_headers('alice'), json={'items': items})
+    finally:
+        event.remove(Session, 'do_orm_execute', sell_out)
+    assert response.status_code == 409
+    assert sold_out == [album_id]
+    assert db_session.execute(select(Order)).first() is None
+
+
+def test_deleting_an_order_restores_its_stock(db_session, client, auth_headers):
+    album_id = add_album(db_session, quantity=5)
+    alice = auth_headers('alice')
+    order = client.post('/orders/', headers=alice, json={'album_id': album_id, 'quantity': 3}).json['order']
+    assert stock(db_session, album_id) == 2
+
+    assert client.delete(f"/orders/{order['id']}", headers=auth_headers('bob')).status_code == 403
+    assert client.delete(f"/orders/{order['id']}", headers=alice).status_code == 200
+    assert stock(db_session, album_id) == 5
+    assert client.delete(f"/orders/{order['id']}", headers=alice).status_code == 404
+    assert stock(db_session, album_id) == 5
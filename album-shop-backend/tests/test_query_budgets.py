@@ -0,0 +1,67 @@
+# Statements per request for the list and checkout endpoints: each list is one
+# query however many rows it returns
+from datetime import date
+from db.app import db, Album
+from db.instrumentation import assert_max_queries
+import pytest
+
+
+# Three albums, each ordered and reviewed by alice and bob
+@pytest.fixture
+def shop(db_session, client, auth_headers):
+    album_ids = []
+    for title in ('Blue', 'Court and Spark', 'Hejira'):
+        album = Album(title, 'Joni Mitchell', date(1971, 6, 22), 'Folk', 10.0, 100)
+        db_session.add(album)
+        db_session.commit()
+        album_ids.append(album.id)
+    for username in ('alice', 'bob'):
+        headers = auth_headers(username)
+        for album_id in album_ids:
+            assert client.post('/orders/', headers=headers, json={'album_id': album_id, 'quantity': 1}).status_code == 201
+            assert client.post('/reviews/', headers=headers, json={'album_id': album_id, 'rating': 4}).status_code == 201
+    return album_ids
+
+
+def test_all_orders(client, auth_headers, shop):
+    admin = auth_headers('root', admin=True)
+    with assert_max_queries(1):
+        response = client.get('/orders/', headers=admin)
+        orders = response.json  # Streamed: the rows are read while the body is
+    assert response.status_code == 200
+    assert len(orders) == 6
+
+
+def test_my_orders(client, auth_headers, shop):
+    with assert_max_queries(1):
+        response = client.get('/orders/my', headers=auth_headers('alice'))
+    assert response.status_code == 200
+    assert len(response.json) == 3
+
+
+def test_album_reviews_with_reviewers(client, shop):
+    with assert_max_queries(1):
+        response = client.get(f'/reviews/album/{shop[0]}?expand=user')
+    assert response.status_code == 200
+    assert [review['user']['username'] for review in response.json] == ['alice', 'bob']
+
+
+def test_albums_by_ids(client, shop):
+    ids = [shop[2], shop[0], shop[1]]
+    with assert_max_queries(1):
+        response = client.get('/albums/?ids=' + ','.join(map(str, ids)))
+    assert response.status_code == 200
+    assert [album['id'] for album in response.json] == ids
+
+
+def test_checkout(client, auth_headers, shop):
+    headers = auth_headers('alice')
+    items = [{'album_id': album_id, 'quantity': 2} for album_id in shop]
+    # SQLite can't return bulk-inserted rows in order, so the order rows go in one
+    # INSERT per line there and in a single statement on PostgreSQL
+    inserts = 1 if db.engine.dialect.name == 'postgresql' else len(items)
+    # Lock the albums, take the stock, insert the orders, queue the sales job, commit
+    with assert_max_queries(4 + inserts):
+        response = client.post('/orders/checkout', headers=headers, json={'items': items})
+    assert response.status_code == 201
+    assert len(response.json['orders']) == 3
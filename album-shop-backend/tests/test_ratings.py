@@ -0,0 +1,78 @@
+# Album rating aggregates (db/ratings.py), kept in step with every review write
+from datetime import date
+from sqlalchemy import update
+from db.app import db, Album
+from db.jobs import job_queue
+from db.ratings import reconcile_ratings
+import threading
+
+
+def add_album(db_session):
+    album = Album('Blue', 'Joni Mitchell', date(1971, 6, 22), 'Folk', 10.0, 5)
+    db_session.add(album)
+    db_session.commit()
+    return album.id
+
+
+def histogram(db_session, album_id):
+    album = db_session.get(Album, album_id, populate_existing=True)
+    return album.rating_count, album.rating_sum, [getattr(album, f'rating_{r}') for r in range(1, 6)]
+
+
+def test_review_writes_update_the_histogram(db_session, client, auth_headers):
+    album_id = add_album(db_session)
+    alice, bob = auth_headers('alice'), auth_headers('bob')
+    client.post('/reviews/', headers=alice, json={'album_id': album_id, 'rating': 4})
+    client.post('/reviews/', headers=bob, json={'album_id': album_id, 'rating': 2})
+    reviews = client.get(f'/reviews/album/{album_id}').json
+    assert histogram(db_session, album_id) == (2, 6, [0, 1, 0, 1, 0])
+
+    assert client.put(f"/reviews/{reviews[0]['id']}", headers=alice, json={'rating': 5}).status_code == 200
+    assert histogram(db_session, album_id) == (2, 7, [0, 1, 0, 0, 1])
+    assert client.delete(f"/reviews/{reviews[1]['id']}", headers=bob).status_code == 200
+    assert histogram(db_session, album_id) == (1, 5, [0, 0, 0, 0, 1])
+    assert reconcile_ratings() == []
+
+
+def test_reconcile_job_fixes_drift(db_session, client, auth_headers, run_jobs):
+    album_id = add_album(db_session)
+    client.post('/reviews/', headers=auth_headers('alice'), json={'album_id': album_id, 'rating': 3})
+    db_session.execute(update(Album).values(rating_count=7, rating_3=0))
+    db_session.commit()
+    assert reconcile_ratings() == [album_id]
+
+    job_queue.enqueue('reconcile-ratings')
+    db_session.commit()
+    assert run_jobs() == 1
+
+    assert histogram(db_session, album_id) == (1, 3, [0, 0, 1, 0, 0])
+    assert reconcile_ratings() == []
+
+
+# Concurrent edits of one review, each from its own connection (PostgreSQL only)
+def test_concurrent_edits_keep_the_histogram(pg_app):
+    album_id = add_album(db.session)
+    client = pg_app.test_client()
+    client.post('/register', json={'username': 'alice', 'email': 'alice@example.com', 'password': 'password'})
+    token = client.post('/login', json={'email': 'alice@example.com', 'password': 'password'}).json['access_token']
+    alice = {'Authorization': f'Bearer {token}'}
+    client.post('/reviews/', headers=alice, json={'album_id': album_id, 'rating': 3})
+    review_id = client.get(f'/reviews/album/{album_id}').json[0]['id']
+    db.session.remove()
+
+    statuses = []
+
+    def edit(first_rating):
+        thread_client = pg_app.test_client()
+        for i in range(20):
+            rating = (first_rating + i) % 5 + 1
+            statuses.append(thread_client.put(f'/reviews/{review_id}', headers=alice, json={'rating': rating}).status_code)
+
+    threads = [threading.Thread(target=edit, args=(n,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert set(statuses) == {200}
+    assert reconcile_ratings() == []
@@ -0,0 +1,33 @@
+# Choosing a read replica (db/replicas.py) from each replica's last known status
+from sqlalchemy import create_engine
+from db.replicas import Replica, ReplicaRouter
+import time
+
+
+def router_with(*statuses):
+    router = ReplicaRouter(max_lag=5.0, check_interval=60)
+    for i, (up, lag) in enumerate(statuses, 1):
+        replica = Replica(f'replica{i}', create_engine('sqlite://'))
+        replica.up, replica.lag = up, lag
+        replica.checked_at = time.monotonic()  # Fresh: choose() won't re-check it
+        router.replicas.append(replica)
+    return router
+
+
+def test_healthy_replicas_take_turns():
+    router = router_with((True, 0.0), (True, 1.0))
+    chosen = [router.choose()[0].name for _ in range(4)]
+    assert sorted(chosen) == ['replica1', 'replica1', 'replica2', 'replica2']
+
+
+def test_replicas_that_are_down_or_behind_are_skipped():
+    assert router_with((False, None), (True, 9.0)).choose() == (None, 'lag')
+    assert router_with((False, None)).choose() == (None, 'unavailable')
+    assert router_with((False, None), (True, 0.5)).choose()[0].name == 'replica2'
+
+
+# A concurrent check that fails sets up = False and then lag = None; a choose()
+# in between sees the replica up with no lag
+def test_replica_without_a_known_lag_is_unavailable():
+    assert router_with((True, None)).choose() == (None, 'unavailable')
+    assert router_with((True, None), (True, 0.0)).choose()[0].name == 'replica2'
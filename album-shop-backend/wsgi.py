@@ -0,0 +1,37 @@
+# Production entry point: gunicorn -c gunicorn.conf.py wsgi:app
+from sqlalchemy import text
+from run import create_app
+from db.app import db
+from auth.blocklist import revoked_tokens
+from auth.passwords import password_hasher
+from db.jobs import job_queue
+import logging
+
+logger = logging.getLogger(__name__)
+
+app = create_app()
+
+
+# Open a pooled connection and prime the in-process caches before taking traffic
+def warm_up():
+    with app.app_context():
+        with db.engine.connect() as conn:
+            conn.execute(text('SELECT 1'))
+        revoked_tokens.start()
+    password_hasher.start()
+    job_queue.start()
+    with app.test_client() as client:
+        client.get('/albums/')
+
+
+# Connections inherited from the master process must not be shared across workers
+def reset_pool():
+    with app.app_context():
+        db.engine.dispose(close=False)
+
+
+def close_pool():
+    job_queue.shutdown()
+    with app.app_context():
+        db.engine.dispose()
+    password_hasher.shutdown()
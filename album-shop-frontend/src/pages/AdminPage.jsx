@@ -1,7 +1,7 @@
 import { useState, useEffect } from "react";
 import { Button } from "../components/ui/Button";
 import { useNavigate } from "react-router-dom";
-import { fetchAlbums, deleteAlbum } from "../services/albumService";
+import { fetchAllAlbums, deleteAlbum } from "../services/albumService";
 import { fetchAllOrders } from "../services/orderService";
 import { fetchAllReviews } from "../services/reviewService";
 
@@ -42,7 +42,7 @@ export default function AdminPage() {
 
       try {
         const [albumData, orderData, reviewData] = await Promise.all([
-          fetchAlbums(token),
+          fetchAllAlbums(),
           fetchAllOrders(token),
           fetchAllReviews(token),
         ]);
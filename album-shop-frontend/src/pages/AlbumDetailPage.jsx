@@ -8,13 +8,19 @@ import {
   deleteReview,
 } from "../services/reviewService";
 import { createOrder } from "../services/orderService";
-import { fetchUserById } from "@/services/authService";
+import { subscribeToInventory, fetchRecommendations } from "../services/albumService";
+import { consistentFetch } from "../services/consistency";
+
+// Reviews arrive with their reviewer inlined (expand=user)
+const withUsernames = (reviews) =>
+  reviews.map((review) => ({ ...review, username: review.user?.username ?? "Unknown" }));
 
 export default function AlbumDetailPage({ isAdmin: isAdminProp }) {
   const { id } = useParams();
   const [album, setAlbum] = useState(null);
   const [quantity, setQuantity] = useState(1);
   const [reviews, setReviews] = useState([]);
+  const [alsoBought, setAlsoBought] = useState([]);
   const [currentUser, setCurrentUser] = useState(null);
   const [newReview, setNewReview] = useState({ rating: "", comment: "" });
   const [editingReviewId, setEditingReviewId] = useState(null);
@@ -26,24 +32,11 @@ export default function AlbumDetailPage({ isAdmin: isAdminProp }) {
   useEffect(() => {
     const fetchData = async () => {
       try {
-        const albumRes = await fetch(`http://localhost:5000/albums/${id}`);
+        const albumRes = await consistentFetch(`http://localhost:5000/albums/${id}`);
         const albumData = await albumRes.json();
         setAlbum(albumData);
 
-        const reviewData = await fetchReviewsForAlbum(id);
-
-        // Enrich reviews with usernames
-        const enrichedReviews = await Promise.all(
-          reviewData.map(async (review) => {
-            try {
-              const user = await fetchUserById(review.user_id);
-              return { ...review, username: user.username };
-            } catch {
-              return { ...review, username: "Unknown" };
-            }
-          })
-        );
-        setReviews(enrichedReviews);
+        setReviews(withUsernames(await fetchReviewsForAlbum(id)));
 
         if (token) {
           const userRes = await fetch("http://localhost:5000/users/me", {
@@ -62,19 +55,20 @@ export default function AlbumDetailPage({ isAdmin: isAdminProp }) {
     fetchData();
   }, [id, token]);
 
-  const refreshReviews = async () => {
-    const reviewData = await fetchReviewsForAlbum(id);
-    const enriched = await Promise.all(
-      reviewData.map(async (review) => {
-        try {
-          const user = await fetchUserById(review.user_id);
-          return { ...review, username: user.username };
-        } catch {
-          return { ...review, username: "Unknown" };
-        }
-      })
+  // Recommendations are optional; the section is simply left out if they fail
+  useEffect(() => {
+    fetchRecommendations(id).then(setAlsoBought).catch(() => setAlsoBought([]));
+  }, [id]);
+
+  // Keep stock and price current while the page is open
+  useEffect(() => {
+    return subscribeToInventory([id], ({ quantity, price }) =>
+      setAlbum((current) => (current ? { ...current, quantity, price } : current))
     );
-    setReviews(enriched);
+  }, [id]);
+
+  const refreshReviews = async () => {
+    setReviews(withUsernames(await fetchReviewsForAlbum(id)));
   };
 
   const handleLogout = () => {
@@ -202,6 +196,27 @@ export default function AlbumDetailPage({ isAdmin: isAdminProp }) {
           <Button onClick={handleOrder} className="bg-indigo-600 text-white">Order Now</Button>
         </div>
 
+        {alsoBought.length > 0 && (
+          <section className="mt-12">
+            <h3 className="text-2xl font-semibold text-indigo-700 mb-4">Customers also bought</h3>
+            <ul className="grid grid-cols-2 sm:grid-cols-5 gap-4">
+              {alsoBought.map((other) => (
+                <li
+                  key={other.id}
+                  onClick={() => navigate(`/albums/${other.id}`)}
+                  className="cursor-pointer p-2 border rounded-md bg-white shadow-sm hover:shadow"
+                >
+                  {other.image_url && (
+                    <img src={other.image_url} alt={`${other.title} cover`} className="w-full aspect-square object-cover rounded" />
+                  )}
+                  <p className="mt-1 text-sm font-semibold text-indigo-800 truncate">{other.title}</p>
+                  <p className="text-xs text-gray-600 truncate">{other.artist}</p>
+                </li>
+              ))}
+            </ul>
+          </section>
+        )}
+
         <section className="mt-12">
           <h3 className="text-2xl font-semibold text-indigo-700 mb-4">Reviews</h3>
 
@@ -1,13 +1,10 @@
 import { useEffect, useState } from "react";
 import { useNavigate } from "react-router-dom";
 import { fetchAllOrders } from "../services/orderService";
-import { fetchUserById } from "@/services/authService";
 import { Button } from "@/components/ui/button";
 
 export default function AllOrdersPage() {
   const [orders, setOrders] = useState([]);
-  const [albums, setAlbums] = useState([]);
-  const [enrichedOrders, setEnrichedOrders] = useState([]);
   const [username, setUsername] = useState(null);
   const token = localStorage.getItem("token");
   const navigate = useNavigate();
@@ -18,36 +15,16 @@ export default function AllOrdersPage() {
 
     const loadData = async () => {
       try {
-        const [orderData, albumData] = await Promise.all([
-          fetchAllOrders(token),
-          fetch("http://localhost:5000/albums/").then((res) => res.json()),
-        ]);
-        setOrders(orderData);
-        setAlbums(albumData);
-
-        // Enrich orders with usernames
-        const ordersWithUsernames = await Promise.all(
-          orderData.map(async (order) => {
-            try {
-              const user = await fetchUserById(order.user_id);
-              return { ...order, username: user.username };
-            } catch {
-              return { ...order, username: "Unknown" };
-            }
-          })
-        );
-        setEnrichedOrders(ordersWithUsernames);
+        // Orders come back with the buyer's username and album details inline
+        setOrders(await fetchAllOrders(token));
       } catch (err) {
-        console.error("Failed to load orders or albums", err);
+        console.error("Failed to load orders", err);
       }
     };
 
     loadData();
   }, []);
 
-  const getAlbumDetails = (albumId) =>
-    albums.find((a) => a.id === albumId) || {};
-
   const handleLogout = () => {
     localStorage.clear();
     setUsername(null);
@@ -87,12 +64,12 @@ export default function AllOrdersPage() {
           All Orders (Admin)
         </h2>
 
-        {enrichedOrders.length === 0 ? (
+        {orders.length === 0 ? (
           <p className="text-gray-600">No orders found.</p>
         ) : (
           <ul className="space-y-6">
-            {enrichedOrders.map((order) => {
-              const album = getAlbumDetails(order.album_id);
+            {orders.map((order) => {
+              const album = order.album || {};
               return (
                 <li
                   key={order.id}
@@ -2,6 +2,7 @@ import { useState, useEffect } from "react";
 import { Button } from "@/components/ui/button";
 import { useNavigate, useParams } from "react-router-dom";
 import { updateAlbum } from "../services/albumService";
+import { consistentFetch } from "../services/consistency";
 
 export default function EditAlbumPage() {
   const [albumData, setAlbumData] = useState({
@@ -22,7 +23,7 @@ export default function EditAlbumPage() {
     const fetchAlbum = async () => {
       const token = localStorage.getItem("token");
       try {
-        const res = await fetch(`http://localhost:5000/albums/${id}`, {
+        const res = await consistentFetch(`http://localhost:5000/albums/${id}`, {
           headers: { Authorization: `Bearer ${token}` },
         });
         const data = await res.json();
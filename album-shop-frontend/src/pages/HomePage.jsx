@@ -1,10 +1,12 @@
 import { useEffect, useState } from "react";
 import { Button } from "@/components/ui/button";
 import { useNavigate } from "react-router-dom";
+import { fetchAlbums } from "../services/albumService";
 
 export default function Home({ isAdmin, isLoggedIn }) {
   const [username, setUsername] = useState(null);
   const [albums, setAlbums] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
   const navigate = useNavigate();
 
   useEffect(() => {
@@ -14,20 +16,30 @@ export default function Home({ isAdmin, isLoggedIn }) {
       setUsername(storedUsername);
     }
 
-    // Always fetch albums for display
-    const fetchAlbums = async () => {
+    // Always fetch albums for display, one page at a time
+    const loadAlbums = async () => {
       try {
-        const res = await fetch("http://localhost:5000/albums/");
-        const data = await res.json();
-        setAlbums(data);
+        const page = await fetchAlbums();
+        setAlbums(page.albums);
+        setNextCursor(page.nextCursor);
       } catch (err) {
         console.error("Failed to fetch albums", err);
       }
     };
 
-    fetchAlbums();
+    loadAlbums();
   }, []);
 
+  const loadMore = async () => {
+    try {
+      const page = await fetchAlbums(nextCursor);
+      setAlbums((current) => [...current, ...page.albums]);
+      setNextCursor(page.nextCursor);
+    } catch (err) {
+      console.error("Failed to load more albums", err);
+    }
+  };
+
   const handleLogout = () => {
     localStorage.removeItem("token");
     localStorage.removeItem("username");
@@ -111,6 +123,13 @@ export default function Home({ isAdmin, isLoggedIn }) {
             </div>
           ))}
         </div>
+        {nextCursor && (
+          <div className="text-center">
+            <Button onClick={loadMore} variant="outline" className="mt-6">
+              Load more
+            </Button>
+          </div>
+        )}
       </main>
     </div>
   );
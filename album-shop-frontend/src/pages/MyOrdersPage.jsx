@@ -5,7 +5,7 @@ import { Button } from "@/components/ui/button";
 
 export default function MyOrdersPage() {
   const [orders, setOrders] = useState([]);
-  const [albums, setAlbums] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
   const [username, setUsername] = useState(null);
   const token = localStorage.getItem("token");
   const navigate = useNavigate();
@@ -18,12 +18,9 @@ export default function MyOrdersPage() {
 
     const loadData = async () => {
       try {
-        const [orderData, albumRes] = await Promise.all([
-          fetchMyOrders(token),
-          fetch("http://localhost:5000/albums/").then((res) => res.json()),
-        ]);
-        setOrders(orderData);
-        setAlbums(albumRes);
+        const page = await fetchMyOrders(token);
+        setOrders(page.orders);
+        setNextCursor(page.nextCursor);
       } catch (err) {
         console.error("Failed to load data", err);
       }
@@ -32,6 +29,16 @@ export default function MyOrdersPage() {
     loadData();
   }, []);
 
+  const loadMore = async () => {
+    try {
+      const page = await fetchMyOrders(token, nextCursor);
+      setOrders((current) => [...current, ...page.orders]);
+      setNextCursor(page.nextCursor);
+    } catch (err) {
+      console.error("Failed to load more orders", err);
+    }
+  };
+
   const handleDelete = async (id) => {
     try {
       await deleteOrder(id, token);
@@ -41,10 +48,6 @@ export default function MyOrdersPage() {
     }
   };
 
-  const getAlbumDetails = (albumId) => {
-    return albums.find((a) => a.id === albumId) || {};
-  };
-
   const handleLogout = () => {
     localStorage.clear();
     setUsername(null);
@@ -93,7 +96,7 @@ export default function MyOrdersPage() {
         ) : (
           <ul className="space-y-6">
             {orders.map((order) => {
-              const album = getAlbumDetails(order.album_id);
+              const album = order.album || {};
               return (
                 <li key={order.id} className="bg-white border p-4 rounded-xl shadow flex gap-4">
                   {/* Album Image */}
@@ -146,6 +149,11 @@ export default function MyOrdersPage() {
             })}
           </ul>
         )}
+        {nextCursor && (
+          <Button onClick={loadMore} variant="outline" className="mt-6">
+            Load more
+          </Button>
+        )}
       </main>
     </div>
   );
@@ -1,19 +1,79 @@
+import { consistentFetch } from "./consistency";
+
 const BASE_URL = "http://localhost:5000"; // adjust if needed
 
-export async function fetchAlbums() {
-  const res = await fetch(`${BASE_URL}/albums/`);
+// Fetch one page of the catalog. Pass the previous page's nextCursor to
+// continue; it is null on the last page.
+export async function fetchAlbums(cursor = null, limit = 50) {
+  const params = new URLSearchParams({ limit });
+  if (cursor) params.set("cursor", cursor);
+  const res = await consistentFetch(`${BASE_URL}/albums/?${params}`);
   if (!res.ok) throw await res.json(); // Optional: consistent error handling
+  return { albums: await res.json(), nextCursor: res.headers.get("X-Next-Cursor") };
+}
+
+// Every album, following the cursor page by page (for the admin dashboard)
+export async function fetchAllAlbums() {
+  const albums = [];
+  let cursor = null;
+  do {
+    const page = await fetchAlbums(cursor, 200);
+    albums.push(...page.albums);
+    cursor = page.nextCursor;
+  } while (cursor);
+  return albums;
+}
+
+export async function searchAlbums(query, limit = 20) {
+  const params = new URLSearchParams({ q: query, limit });
+  const res = await consistentFetch(`${BASE_URL}/albums/search?${params}`);
+  if (!res.ok) throw await res.json();
   return res.json();
 }
 
+// Live stock/price changes (server-sent events). Calls onChange with
+// {album_id, quantity, price, low_stock}; returns a function that closes the stream.
+// EventSource gives up when the server turns it away (503 once a worker serves its
+// share of streams), so try again after a while.
+const INVENTORY_RETRY_MS = 30000;
+
+export function subscribeToInventory(albumIds, onChange) {
+  const params = albumIds?.length ? `?album_id=${albumIds.join(",")}` : "";
+  let source;
+  let retry;
+  const connect = () => {
+    source = new EventSource(`${BASE_URL}/albums/events${params}`);
+    source.addEventListener("inventory", (e) => onChange(JSON.parse(e.data)));
+    source.onerror = () => {
+      if (source.readyState === EventSource.CLOSED) retry = setTimeout(connect, INVENTORY_RETRY_MS);
+    };
+  };
+  connect();
+  return () => {
+    clearTimeout(retry);
+    source.close();
+  };
+}
+
+// "Customers also bought": the recommended ids, then their details in one batch request
+export async function fetchRecommendations(albumId, limit = 5) {
+  const res = await consistentFetch(`${BASE_URL}/albums/${albumId}/recommendations?limit=${limit}`);
+  if (!res.ok) throw await res.json();
+  const { recommendations } = await res.json();
+  if (recommendations.length === 0) return [];
+  const albums = await consistentFetch(`${BASE_URL}/albums/?ids=${recommendations.map((r) => r.album_id).join(",")}`);
+  if (!albums.ok) throw await albums.json();
+  return albums.json();
+}
+
 export async function getAlbumById(id) {
-  const res = await fetch(`${BASE_URL}/albums/${id}`);
+  const res = await consistentFetch(`${BASE_URL}/albums/${id}`);
   if (!res.ok) throw await res.json();
   return res.json();
 }
 
 export async function createAlbum(data, token) {
-  const res = await fetch(`${BASE_URL}/albums/`, {
+  const res = await consistentFetch(`${BASE_URL}/albums/`, {
     method: "POST",
     headers: {
       "Content-Type": "application/json",
@@ -26,7 +86,7 @@ export async function createAlbum(data, token) {
 }
 
 export async function updateAlbum(id, data, token) {
-  const res = await fetch(`${BASE_URL}/albums/${id}`, {
+  const res = await consistentFetch(`${BASE_URL}/albums/${id}`, {
     method: "PUT",
     headers: {
       "Content-Type": "application/json",
@@ -39,7 +99,7 @@ export async function updateAlbum(id, data, token) {
 }
 
 export async function deleteAlbum(id, token) {
-  const res = await fetch(`${BASE_URL}/albums/${id}`, {
+  const res = await consistentFetch(`${BASE_URL}/albums/${id}`, {
     method: "DELETE",
     headers: {
       Authorization: `Bearer ${token}`,
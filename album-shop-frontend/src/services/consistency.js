@@ -0,0 +1,18 @@
+// Read-your-writes with read replicas: the backend answers each write with an
+// X-Read-Consistency token; sending the latest one back on reads keeps them off
+// replicas that haven't caught up with that write yet.
+const HEADER = "X-Read-Consistency";
+const STORAGE_KEY = "readConsistency";
+
+// Drop-in replacement for fetch() for calls to the backend
+export async function consistentFetch(url, options = {}) {
+  const method = (options.method || "GET").toUpperCase();
+  const token = localStorage.getItem(STORAGE_KEY);
+  if (token && method === "GET") {
+    options = { ...options, headers: { ...options.headers, [HEADER]: token } };
+  }
+  const res = await fetch(url, options);
+  const written = res.headers.get(HEADER);
+  if (written) localStorage.setItem(STORAGE_KEY, written);
+  return res;
+}
@@ -1,8 +1,10 @@
+import { consistentFetch } from "./consistency";
+
 const BASE_URL = "http://localhost:5000"; // adjust if needed
 
 // Create a new order
 export async function createOrder(orderData, token) {
-  const res = await fetch(`${BASE_URL}/orders/`, {
+  const res = await consistentFetch(`${BASE_URL}/orders/`, {
     method: "POST",
     headers: {
       "Content-Type": "application/json",
@@ -16,7 +18,7 @@ export async function createOrder(orderData, token) {
 
 // Fetch all orders (admin only)
 export async function fetchAllOrders(token) {
-  const res = await fetch(`${BASE_URL}/orders/`, {
+  const res = await consistentFetch(`${BASE_URL}/orders/`, {
     headers: {
       Authorization: `Bearer ${token}`,
     },
@@ -25,20 +27,23 @@ export async function fetchAllOrders(token) {
   return res.json();
 }
 
-// Fetch orders for the current user
-export async function fetchMyOrders(token) {
-  const res = await fetch(`${BASE_URL}/orders/my`, {
+// Fetch one page of the current user's orders (album details included).
+// Pass the previous page's nextCursor to continue; it is null on the last page.
+export async function fetchMyOrders(token, cursor = null) {
+  const params = new URLSearchParams({ order: "desc" });
+  if (cursor) params.set("cursor", cursor);
+  const res = await consistentFetch(`${BASE_URL}/orders/my?${params}`, {
     headers: {
       Authorization: `Bearer ${token}`,
     },
   });
   if (!res.ok) throw await res.json();
-  return res.json();
+  return { orders: await res.json(), nextCursor: res.headers.get("X-Next-Cursor") };
 }
 
 // Delete an order by ID
 export async function deleteOrder(orderId, token) {
-  const res = await fetch(`${BASE_URL}/orders/${orderId}`, {
+  const res = await consistentFetch(`${BASE_URL}/orders/${orderId}`, {
     method: "DELETE",
     headers: {
       Authorization: `Bearer ${token}`,
@@ -47,3 +52,17 @@ export async function deleteOrder(orderId, token) {
   if (!res.ok) throw await res.json();
   return res.json();
 }
+
+// Check out a whole cart ([{ album_id, quantity }, ...]) in one request
+export async function checkoutCart(items, token) {
+  const res = await consistentFetch(`${BASE_URL}/orders/checkout`, {
+    method: "POST",
+    headers: {
+      "Content-Type": "application/json",
+      Authorization: `Bearer ${token}`,
+    },
+    body: JSON.stringify({ items }),
+  });
+  if (!res.ok) throw await res.json();
+  return res.json();
+}
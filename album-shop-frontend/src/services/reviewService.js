@@ -1,8 +1,10 @@
+import { consistentFetch } from "./consistency";
+
 const BASE_URL = "http://localhost:5000"; // Update if your server address changes
 
 // Create a new review
 export async function createReview(reviewData, token) {
-  const res = await fetch(`${BASE_URL}/reviews/`, {
+  const res = await consistentFetch(`${BASE_URL}/reviews/`, {
     method: "POST",
     headers: {
       "Content-Type": "application/json",
@@ -14,22 +16,22 @@ export async function createReview(reviewData, token) {
   return res.json();
 }
 
-// Get all reviews for a specific album
+// Get all reviews for a specific album, each with its reviewer's { id, username }
 export async function fetchReviewsForAlbum(albumId) {
-  const res = await fetch(`${BASE_URL}/reviews/album/${albumId}`);
+  const res = await consistentFetch(`${BASE_URL}/reviews/album/${albumId}?expand=user`);
   if (!res.ok) throw await res.json();
   return res.json();
 }
 
 // Get all reviews by a specific user
 export async function fetchReviewsByUser(userId) {
-  const res = await fetch(`${BASE_URL}/reviews/user/${userId}`);
+  const res = await consistentFetch(`${BASE_URL}/reviews/user/${userId}`);
   if (!res.ok) throw await res.json();
   return res.json();
 }
 
 export async function fetchAllReviews(token) {
-  const res = await fetch(`${BASE_URL}/reviews/`, {
+  const res = await consistentFetch(`${BASE_URL}/reviews/`, {
     headers: {
       Authorization: `Bearer ${token}`,
     },
@@ -40,7 +42,7 @@ export async function fetchAllReviews(token) {
 
 // Update a review
 export async function updateReview(reviewId, updatedData, token) {
-  const res = await fetch(`${BASE_URL}/reviews/${reviewId}`, {
+  const res = await consistentFetch(`${BASE_URL}/reviews/${reviewId}`, {
     method: "PUT",
     headers: {
       "Content-Type": "application/json",
@@ -54,7 +56,7 @@ export async function updateReview(reviewId, updatedData, token) {
 
 // Delete a review
 export async function deleteReview(reviewId, token) {
-  const res = await fetch(`${BASE_URL}/reviews/${reviewId}`, {
+  const res = await consistentFetch(`${BASE_URL}/reviews/${reviewId}`, {
     method: "DELETE",
     headers: {
       Authorization: `Bearer ${token}`,